@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Agregação de Fretes Normalizados
+--------------------------------
+Alternativa à média simples dos fretes similares seguida de um único ajuste
+pela quantidade média: cada frete candidato é normalizado individualmente
+para a cotação (corrigido pela inflação desde a sua data e escalado por
+(alvo/base) ** EXPOENTE_ESCALA com a sua própria quantidade) e só então os
+valores são agregados, por média ponderada pela similaridade ou por média
+aparada.
+
+O núcleo é vetorizado com NumPy e atende milhares de candidatos por
+cotação. O resultado é decomposto nas mesmas parcelas do cálculo com a
+média simples (valor médio original, ajuste de inflação e ajuste de
+quantidade), usando os mesmos pesos e os mesmos fretes mantidos nas três.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+
+# Expoente da economia de escala (mesmo de _ajustar_por_modulos/_ajustar_por_peso)
+EXPOENTE_ESCALA = 0.9
+
+# Fração dos fretes descartada em cada ponta na média aparada
+FRACAO_APARADA = 0.1
+
+# Peso atribuído a um critério de similaridade sem informação (quantidade ou distância ausente)
+SIMILARIDADE_SEM_INFORMACAO = 0.5
+
+
+class AgregacaoFretes(NamedTuple):
+    """Parcelas do valor agregado: valor_medio + ajuste_inflacao + ajuste_quantidade."""
+    quantidade: int
+    valor_medio: float
+    ajuste_inflacao: float
+    ajuste_quantidade: float
+
+
+def fatores_escala(quantidades_base, alvo):
+    """
+    Fator (alvo/base) ** EXPOENTE_ESCALA de cada frete.
+
+    Fretes sem quantidade base (ausente ou zero) e cotações sem alvo não são escalados (fator 1).
+    """
+    quantidades_base = np.asarray(quantidades_base, dtype=np.float64)
+    if alvo is None:
+        return np.ones(len(quantidades_base))
+    validos = np.isfinite(quantidades_base) & (quantidades_base > 0)
+    razoes = np.divide(alvo, quantidades_base, out=np.ones(len(quantidades_base)), where=validos)
+    return razoes ** EXPOENTE_ESCALA
+
+
+def _razao_similaridade(valores, alvo):
+    """min/max entre cada valor e o alvo (1 = iguais); SIMILARIDADE_SEM_INFORMACAO se faltar um dos dois."""
+    valores = np.asarray(valores, dtype=np.float64)
+    if alvo is None or not alvo > 0:
+        return np.full(len(valores), SIMILARIDADE_SEM_INFORMACAO)
+    validos = np.isfinite(valores) & (valores > 0)
+    razoes = np.full(len(valores), SIMILARIDADE_SEM_INFORMACAO)
+    razoes[validos] = np.minimum(valores[validos], alvo) / np.maximum(valores[validos], alvo)
+    return razoes
+
+
+def pesos_similaridade(quantidades_base, alvo, distancias, distancia):
+    """
+    Peso de cada frete pela semelhança de quantidade e de distância com a cotação.
+
+    Cada critério vale min/max entre o valor do frete e o da cotação; o peso
+    é o produto dos dois.
+    """
+    return _razao_similaridade(quantidades_base, alvo) * _razao_similaridade(distancias, distancia)
+
+
+def _media(valores, pesos):
+    return float(np.average(valores, weights=pesos)) if pesos is not None else float(np.mean(valores))
+
+
+def agregar(valores, fatores_inflacao, fatores_quantidade, pesos=None, fracao_aparada=0.0):
+    """
+    Agrega os fretes normalizados.
+
+    Args:
+        valores: Valor original de cada frete
+        fatores_inflacao: Fator de correção de cada frete pela sua data
+        fatores_quantidade: Fator de escala de cada frete (ver fatores_escala)
+        pesos: Peso de cada frete (None = pesos iguais)
+        fracao_aparada: Fração dos fretes descartada em cada ponta, pela
+            ordem do valor normalizado (0 = sem aparar)
+
+    Returns:
+        AgregacaoFretes ou None se não houver fretes
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    corrigidos = valores * fatores_inflacao
+    normalizados = corrigidos * fatores_quantidade
+
+    mantidos = np.isfinite(normalizados)
+    if pesos is not None:
+        pesos = np.asarray(pesos, dtype=np.float64)
+        mantidos &= pesos > 0
+    posicoes = np.flatnonzero(mantidos)
+    if len(posicoes) == 0:
+        return None
+
+    descartados = int(len(posicoes) * fracao_aparada)
+    if descartados > 0:
+        ordem = posicoes[np.argsort(normalizados[posicoes], kind='stable')]
+        posicoes = ordem[descartados:len(ordem) - descartados]
+
+    pesos = pesos[posicoes] if pesos is not None else None
+    valor_medio = _media(valores[posicoes], pesos)
+    valor_corrigido = _media(corrigidos[posicoes], pesos)
+    valor_normalizado = _media(normalizados[posicoes], pesos)
+    return AgregacaoFretes(
+        quantidade=len(posicoes),
+        valor_medio=valor_medio,
+        ajuste_inflacao=valor_corrigido - valor_medio,
+        ajuste_quantidade=valor_normalizado - valor_corrigido
+    )
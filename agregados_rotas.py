@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Agregados por Rota
+------------------
+Somas acumuladas dos fretes de cada rota (coluna de quantidade, origem,
+destino), calculadas na carga do histórico. Permitem responder às cotações
+de rotas conhecidas sem filtrar o histórico a cada cotação.
+
+Os fretes de cada rota ficam ordenados pela quantidade (módulos ou peso),
+com as somas acumuladas ao lado. A faixa de quantidade da cotação é a mesma
+da busca em cascata (metade ao dobro da quantidade cotada, ver
+CalculadoraFrete._faixa_quantidade), e as somas dos fretes dentro dela saem
+de duas buscas binárias e uma subtração.
+
+Além das somas usadas na precificação, cada rota guarda a soma dos
+quadrados dos fretes e a soma das datas, e `estatisticas` devolve média,
+desvio padrão, mínimo/máximo e datas dos fretes de uma faixa.
+
+Os agregados são atualizados de forma incremental com `adicionar`: os
+fretes novos são inseridos na ordem de quantidade das suas rotas e só as
+somas acumuladas dessas rotas são refeitas (`construir` é a primeira
+inserção, com o histórico inteiro).
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+
+from historico import chave_cidade
+
+# Colunas das somas acumuladas de cada rota
+(SOMA_FRETE, SOMA_FRETE2, SOMA_FRETE_DEFLACIONADO, SOMA_FRETE_SEM_DATA,
+ SOMA_MODULOS, CONTAGEM_MODULOS, SOMA_PESO, CONTAGEM_PESO,
+ SOMA_DIAS, CONTAGEM_DIAS) = range(10)
+NUM_CAMPOS = 10
+
+# Colunas de quantidade pelas quais os fretes são agregados
+COLUNAS_QUANTIDADE = ('Núm. Módulos', 'Peso real (kg)')
+
+
+class ResumoFretes(NamedTuple):
+    """Resumo de um conjunto de fretes usado pela precificação."""
+    quantidade: int
+    valor_medio: float
+    modulos_medio: float
+    peso_medio: float
+    ajuste_inflacao: float
+    # Ajuste de quantidade já calculado frete a frete (ver agregacao); None = ajustar pela quantidade média
+    ajuste_quantidade: float = None
+    # Posições dos fretes resumidos no histórico (base dos intervalos, ver intervalos)
+    posicoes: np.ndarray = None
+    # Pesos da busca (knn) de cada frete; None = todos com o mesmo peso
+    pesos: np.ndarray = None
+
+
+class EstatisticasFretes(NamedTuple):
+    """Estatísticas descritivas dos fretes de uma rota dentro de uma faixa."""
+    quantidade: int
+    valor_medio: float
+    # Desvio padrão amostral (NaN com um único frete)
+    desvio_padrao: float
+    valor_minimo: float
+    valor_maximo: float
+    # Datas de referência (datetime64[D]); NaT se nenhum frete tiver data
+    data_media: np.datetime64
+    data_minima: np.datetime64
+    data_maxima: np.datetime64
+
+
+class FaixaQuantidade(NamedTuple):
+    """Faixa de quantidade dos fretes comparáveis a uma cotação (limites inclusivos)."""
+    coluna: str
+    limite_inferior: float
+    limite_superior: float
+
+
+class RotaAgregada(NamedTuple):
+    """Fretes de uma rota ordenados pela quantidade, com as somas acumuladas."""
+    # Quantidade de cada frete, em ordem crescente
+    quantidades: np.ndarray
+    # Posição de cada frete no histórico, na mesma ordem
+    posicoes: np.ndarray
+    # Campos de cada frete (n × NUM_CAMPOS), base das inserções e dos mínimos/máximos
+    campos: np.ndarray
+    # Somas acumuladas (n + 1 linhas × NUM_CAMPOS): linha k soma os k primeiros fretes
+    acumulados: np.ndarray
+
+
+class AgregadosRotas:
+    """Somas acumuladas por (coluna de quantidade, origem, destino)."""
+
+    def __init__(self, inflacao, rotas):
+        """
+        Args:
+            inflacao: IndiceInflacao usado para deflacionar os fretes na agregação
+            rotas: Dicionário (coluna, origem, destino) -> RotaAgregada
+        """
+        self.inflacao = inflacao
+        self.rotas = rotas
+
+    def __len__(self):
+        return len(self.rotas)
+
+    @classmethod
+    def construir(cls, historico, inflacao, indice_cidades=None):
+        """
+        Agrega todas as linhas de um HistoricoFretes.
+
+        Com `indice_cidades`, as grafias de uma mesma cidade são agregadas
+        sob a chave da cidade canônica.
+        """
+        if indice_cidades is not None:
+            chaves = indice_cidades.chaves_vocabulario()
+        else:
+            chaves = [chave_cidade(c) for c in historico.vocabularios['Cidade/Estado']]
+        numericas = historico.numericas
+        agregados = cls(inflacao, {})
+        agregados.adicionar(
+            np.array(chaves + [None], dtype=object)[historico.codigos['Cidade/Estado']],
+            historico.destinos_referencia(),
+            numericas['(R$) Frete'],
+            numericas['Núm. Módulos'],
+            numericas['Peso real (kg)'],
+            historico.datas_referencia(),
+            np.arange(len(historico))
+        )
+        return agregados
+
+    def _campos(self, fretes, modulos, pesos, datas):
+        """Campos somados de cada frete (n × NUM_CAMPOS)."""
+        sem_data = np.isnat(datas)
+        # Fretes sem data são corrigidos na consulta, a partir da data de hoje
+        meses = np.where(sem_data, np.datetime64('today', 'M'), datas.astype('datetime64[M]'))
+        deflacionados = np.where(sem_data, 0, fretes / self.inflacao.indice(meses.astype(np.int64)))
+
+        campos = np.zeros((len(fretes), NUM_CAMPOS))
+        campos[:, SOMA_FRETE] = fretes
+        campos[:, SOMA_FRETE2] = fretes * fretes
+        campos[:, SOMA_FRETE_DEFLACIONADO] = deflacionados
+        campos[:, SOMA_FRETE_SEM_DATA] = np.where(sem_data, fretes, 0)
+        campos[:, SOMA_MODULOS] = np.nan_to_num(modulos)
+        campos[:, CONTAGEM_MODULOS] = np.isfinite(modulos)
+        campos[:, SOMA_PESO] = np.nan_to_num(pesos)
+        campos[:, CONTAGEM_PESO] = np.isfinite(pesos)
+        campos[:, SOMA_DIAS] = np.where(sem_data, 0, datas.astype('datetime64[D]').astype(np.int64))
+        campos[:, CONTAGEM_DIAS] = ~sem_data
+        return campos
+
+    def adicionar(self, origens, destinos, fretes, modulos, pesos, datas, posicoes):
+        """
+        Acrescenta fretes aos agregados.
+
+        Cada frete entra na posição da sua quantidade dentro da rota; só as
+        somas acumuladas das rotas que receberam fretes são refeitas.
+
+        Args:
+            origens: Chave normalizada da origem de cada frete ("cidade/uf"; None = sem origem)
+            destinos: Chave do destino de referência de cada frete (None = desconhecido)
+            fretes: Valores dos fretes
+            modulos: Número de módulos (NaN se ausente)
+            pesos: Peso em kg (NaN se ausente)
+            datas: Data de referência de cada frete (NaT se ausente)
+            posicoes: Posição de cada frete no histórico
+        """
+        origens = np.asarray(origens, dtype=object)
+        destinos = np.asarray(destinos, dtype=object)
+        fretes = np.asarray(fretes, dtype=np.float64)
+        datas = np.asarray(datas, dtype='datetime64[ns]')
+        posicoes = np.asarray(posicoes, dtype=np.intp)
+        quantidades_colunas = {
+            'Núm. Módulos': np.asarray(modulos, dtype=np.float64),
+            'Peso real (kg)': np.asarray(pesos, dtype=np.float64)
+        }
+        campos = self._campos(fretes, *quantidades_colunas.values(), datas)
+
+        validos = np.array([o is not None and d is not None for o, d in zip(origens, destinos)], dtype=bool)
+        validos &= np.isfinite(fretes)
+        if not validos.any():
+            return
+        # Código de cada rota (origem, destino) distinta
+        _, codigos_rota = np.unique(np.array([f'{o}\0{d}' for o, d in zip(origens, destinos)]), return_inverse=True)
+
+        for coluna in COLUNAS_QUANTIDADE:
+            quantidades = quantidades_colunas[coluna]
+            selecionados = np.flatnonzero(validos & np.isfinite(quantidades))
+            if len(selecionados) == 0:
+                continue
+            # Uma única ordenação: por rota e, dentro da rota, pela quantidade
+            selecionados = selecionados[np.lexsort((quantidades[selecionados], codigos_rota[selecionados]))]
+            inicio_grupo = np.flatnonzero(np.r_[True, np.diff(codigos_rota[selecionados]) != 0])
+            for grupo in np.split(selecionados, inicio_grupo[1:]):
+                chave = (coluna, origens[grupo[0]], destinos[grupo[0]])
+                self.rotas[chave] = _inserir(self.rotas.get(chave), quantidades[grupo], posicoes[grupo], campos[grupo])
+
+    def _intervalo(self, faixa, origem, destino):
+        """Rota e intervalo [inicio, fim) dos seus fretes dentro da faixa (None se vazio)."""
+        rota = self.rotas.get((faixa.coluna, origem, destino))
+        if rota is None:
+            return None
+        inicio = np.searchsorted(rota.quantidades, faixa.limite_inferior, side='left')
+        fim = np.searchsorted(rota.quantidades, faixa.limite_superior, side='right')
+        if fim <= inicio:
+            return None
+        return rota, inicio, fim
+
+    def resumir(self, faixa, origem, destino):
+        """
+        Resume os fretes da rota com quantidade dentro da faixa da cotação.
+
+        Args:
+            faixa: FaixaQuantidade da cotação
+            origem: Chave normalizada da origem ("cidade/uf", ver historico.chave_cidade)
+            destino: Chave do destino de referência (ver geografia.identificar_destino)
+
+        Returns:
+            ResumoFretes ou None se a rota não tiver fretes na faixa
+        """
+        intervalo = self._intervalo(faixa, origem, destino)
+        if intervalo is None:
+            return None
+        rota, inicio, fim = intervalo
+        n = fim - inicio
+
+        somas = rota.acumulados[fim] - rota.acumulados[inicio]
+        valor_medio = somas[SOMA_FRETE] / n
+        indice_hoje = self.inflacao.indice(np.array([np.datetime64('today', 'M').astype(np.int64)]))[0]
+        fator_sem_data = self.inflacao.fatores(np.array(['NaT'], dtype='datetime64[ns]'))[0]
+        valor_corrigido = (indice_hoje * somas[SOMA_FRETE_DEFLACIONADO] + fator_sem_data * somas[SOMA_FRETE_SEM_DATA]) / n
+
+        modulos_medio = somas[SOMA_MODULOS] / somas[CONTAGEM_MODULOS] if somas[CONTAGEM_MODULOS] else np.nan
+        peso_medio = somas[SOMA_PESO] / somas[CONTAGEM_PESO] if somas[CONTAGEM_PESO] else np.nan
+        return ResumoFretes(int(n), float(valor_medio), float(modulos_medio), float(peso_medio),
+                            float(valor_corrigido - valor_medio), posicoes=rota.posicoes[inicio:fim])
+
+    def estatisticas(self, faixa, origem, destino):
+        """
+        Estatísticas descritivas dos fretes da rota dentro da faixa.
+
+        Média e desvio padrão saem das somas acumuladas; mínimos e máximos,
+        dos fretes da faixa.
+
+        Args:
+            faixa: FaixaQuantidade da cotação
+            origem: Chave normalizada da origem
+            destino: Chave do destino de referência
+
+        Returns:
+            EstatisticasFretes ou None se a rota não tiver fretes na faixa
+        """
+        intervalo = self._intervalo(faixa, origem, destino)
+        if intervalo is None:
+            return None
+        rota, inicio, fim = intervalo
+        n = fim - inicio
+        somas = rota.acumulados[fim] - rota.acumulados[inicio]
+        media = somas[SOMA_FRETE] / n
+        desvio = np.sqrt(max(somas[SOMA_FRETE2] - n * media * media, 0) / (n - 1)) if n > 1 else np.nan
+
+        fretes = rota.campos[inicio:fim, SOMA_FRETE]
+        com_data = rota.campos[inicio:fim, CONTAGEM_DIAS] > 0
+        dias = rota.campos[inicio:fim, SOMA_DIAS][com_data].astype(np.int64)
+        nat = np.datetime64('NaT', 'D')
+        if len(dias):
+            data_media = np.datetime64(int(round(somas[SOMA_DIAS] / somas[CONTAGEM_DIAS])), 'D')
+            data_minima, data_maxima = dias.min().astype('datetime64[D]'), dias.max().astype('datetime64[D]')
+        else:
+            data_media = data_minima = data_maxima = nat
+        return EstatisticasFretes(int(n), float(media), float(desvio), float(fretes.min()), float(fretes.max()),
+                                  data_media, data_minima, data_maxima)
+
+
+def _inserir(rota, quantidades, posicoes, campos):
+    """
+    Insere fretes em uma rota (None = rota nova), mantendo a ordem de quantidade.
+
+    Fretes com a mesma quantidade ficam na ordem de chegada: os já agregados
+    antes dos novos.
+
+    Returns:
+        RotaAgregada com as somas acumuladas refeitas
+    """
+    if rota is not None:
+        quantidades = np.concatenate([rota.quantidades, quantidades])
+        posicoes = np.concatenate([rota.posicoes, posicoes])
+        campos = np.concatenate([rota.campos, campos])
+    ordem = np.argsort(quantidades, kind='stable')
+    campos = campos[ordem]
+    acumulados = np.zeros((len(campos) + 1, NUM_CAMPOS))
+    np.cumsum(campos, axis=0, out=acumulados[1:])
+    return RotaAgregada(np.ascontiguousarray(quantidades[ordem]), posicoes[ordem], campos, acumulados)
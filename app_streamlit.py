@@ -16,6 +16,7 @@ import sys
 import re
 import requests
 import io
+import tempfile
 
 # Importar a calculadora de fretes
 sys.path.append(os.path.dirname(__file__))
@@ -24,6 +25,13 @@ try:
 except ImportError:
     # Fallback para o caso de o arquivo estar no mesmo diretório
     from calculadora_frete import CalculadoraFrete
+from instantaneo import gravacao_vencida
+
+# Instantâneo do estado derivado: evita baixar o Excel e geocodificar de novo a cada cálculo
+ARQUIVO_INSTANTANEO = os.environ.get(
+    'CALCULADORA_INSTANTANEO',
+    os.path.join(tempfile.gettempdir(), 'calculadora_frete_instantaneo.bin')
+)
 
 # Configuração da página
 st.set_page_config(
@@ -137,7 +145,7 @@ if st.button("Calcular Frete", type="primary", use_container_width=True):
         st.error("Por favor, preencha os campos de origem e destino.")
     else:
         # Inicializar a calculadora
-        calculadora = CalculadoraFrete(usar_url=True)
+        calculadora = CalculadoraFrete(usar_url=True, arquivo_instantaneo=ARQUIVO_INSTANTANEO)
         
         # Calcular o frete
         resultado = calculadora.calcular_frete(
@@ -148,6 +156,13 @@ if st.button("Calcular Frete", type="primary", use_container_width=True):
             data_prevista=data_prevista,
             modo_calculo="modulos" if modo_calculo == "Por módulos" else "peso"
         )
+        # A calculadora é recriada a cada cálculo: grava o instantâneo com as coordenadas novas,
+        # no máximo uma vez por intervalo de gravação (ou se ele foi descartado nesta carga)
+        if not calculadora.instantaneo_restaurado or gravacao_vencida(ARQUIVO_INSTANTANEO):
+            try:
+                calculadora.salvar_instantaneo()
+            except OSError:
+                pass
         
         # Exibir o resultado
         if resultado['status'] == 'sucesso':
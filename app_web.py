@@ -11,13 +11,52 @@ permitindo o uso por múltiplos usuários sem necessidade de linha de comando.
 import os
 import sys
 import json
-from datetime import datetime
+import logging
+import tempfile
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
 from flask import Flask, request, render_template, jsonify
 from calculadora_frete import CalculadoraFrete
+from configuracao_logs import configurar_logging
+from diario_cotacoes import COTACOES_POR_PAGINA, DiarioCotacoes
+from historico import chave_cidade
+from instantaneo import GravacaoPeriodica
 
 app = Flask(__name__)
 calculadora = None
 
+# Logs da calculadora gravados por uma thread em segundo plano, fora das requisições
+configurar_logging(
+    getattr(logging, os.environ.get('CALCULADORA_LOG_NIVEL', 'INFO').upper(), logging.INFO),
+    formato_json=os.environ.get('CALCULADORA_LOG_JSON', '').lower() in ('1', 'true', 'sim')
+)
+
+# Histórico mapeado em memória compartilhado por todos os workers
+ARQUIVO_HISTORICO = os.environ.get(
+    'CALCULADORA_HISTORICO',
+    os.path.join(tempfile.gettempdir(), 'calculadora_frete_historico.bin')
+)
+
+# Rastreamento das cotações (consultável em /rastros/<id_cotacao>)
+RASTREAR_COTACOES = os.environ.get('CALCULADORA_RASTREAR', '').lower() in ('1', 'true', 'sim')
+
+# Percentis P10/P50/P90 do valor estimados por bootstrap em cada cotação
+INTERVALOS_COTACOES = os.environ.get('CALCULADORA_INTERVALOS', '').lower() in ('1', 'true', 'sim')
+
+# Diário SQLite com todas as cotações calculadas (consultado em /historico)
+ARQUIVO_DIARIO = os.environ.get(
+    'CALCULADORA_DIARIO',
+    os.path.join(tempfile.gettempdir(), 'calculadora_frete_cotacoes.db')
+)
+diario = DiarioCotacoes(ARQUIVO_DIARIO)
+
+# Instantâneo do estado derivado, gravado periodicamente e ao encerrar; restaurado na inicialização
+ARQUIVO_INSTANTANEO = os.environ.get(
+    'CALCULADORA_INSTANTANEO',
+    os.path.join(tempfile.gettempdir(), 'calculadora_frete_instantaneo.bin')
+)
+gravacao_instantaneo = None
+
 @app.route('/')
 def index():
     """Renderiza a página inicial com o formulário de cotação."""
@@ -32,6 +71,7 @@ def calcular():
         destino = request.form.get('destino', '')
         modulos = request.form.get('modulos', '0')
         data_str = request.form.get('data', '')
+        cliente = request.form.get('cliente', '').strip() or None
         
         # Validar dados
         if not origem or not destino:
@@ -65,12 +105,15 @@ def calcular():
                 })
         
         # Calcular frete
-        global calculadora
+        global calculadora, gravacao_instantaneo
         if calculadora is None:
-            calculadora = CalculadoraFrete()
+            calculadora = CalculadoraFrete(arquivo_historico=ARQUIVO_HISTORICO, rastrear=RASTREAR_COTACOES,
+                                           diario=diario, arquivo_instantaneo=ARQUIVO_INSTANTANEO,
+                                           intervalos=INTERVALOS_COTACOES)
+            gravacao_instantaneo = GravacaoPeriodica(calculadora.salvar_instantaneo)
         
-        resultado = calculadora.calcular_frete(origem, destino, modulos, data)
-        return jsonify(resultado)
+        resultado = calculadora.calcular_frete(origem, destino, modulos, data_prevista=data, cliente=cliente)
+        return app.response_class(resultado.to_json(), mimetype='application/json')
     
     except Exception as e:
         return jsonify({
@@ -78,12 +121,77 @@ def calcular():
             "mensagem": f"Erro ao processar requisição: {str(e)}"
         })
 
+@app.route('/rastros/<id_cotacao>')
+def rastro(id_cotacao):
+    """Retorna o rastro de cálculo de uma cotação."""
+    if calculadora is None or calculadora.rastros is None:
+        return jsonify({"status": "erro", "mensagem": "Rastreamento de cotações desativado"}), 404
+    
+    rastro_cotacao = calculadora.obter_rastro(id_cotacao)
+    if rastro_cotacao is None:
+        return jsonify({"status": "erro", "mensagem": "Rastro não encontrado (cotação inexistente ou descartada)"}), 404
+    return jsonify(rastro_cotacao)
+
+@app.route('/rastros')
+def rastros_recentes():
+    """Lista os identificadores das cotações rastreadas mais recentes."""
+    if calculadora is None or calculadora.rastros is None:
+        return jsonify([])
+    limite = request.args.get('limite', 50, type=int)
+    return jsonify([
+        {"id_cotacao": r.id_cotacao, "inicio": r.inicio, "origem": r.entradas.get('origem'), "destino": r.entradas.get('destino')}
+        for r in calculadora.rastros.recentes(limite)
+    ])
+
+def _chave_rota(texto):
+    """Chave normalizada de uma cidade do filtro, a mesma gravada no diário."""
+    if not texto:
+        return None
+    if calculadora is not None:
+        return calculadora._endereco(texto).chave
+    return chave_cidade(texto)
+
+def _data_filtro(texto, dias=0):
+    """Converte a data do filtro (YYYY-MM-DD), somando `dias`; None se vazia ou inválida."""
+    try:
+        return datetime.strptime(texto, '%Y-%m-%d') + timedelta(days=dias) if texto else None
+    except ValueError:
+        return None
+
 @app.route('/historico')
 def historico():
-    """Renderiza a página de histórico de cotações."""
-    # Em uma implementação completa, isso buscaria do banco de dados
-    # Por enquanto, apenas renderiza a página vazia
-    return render_template('historico.html', cotacoes=[])
+    """
+    Renderiza a página de histórico de cotações, paginada.
+    
+    Filtros opcionais na query string: origem, destino, cliente, inicio e fim
+    (YYYY-MM-DD, fim inclusive), além de pagina e por_pagina.
+    """
+    filtros = {chave: request.args.get(chave, '').strip() for chave in ('origem', 'destino', 'cliente', 'inicio', 'fim')}
+    pagina = diario.consultar(
+        pagina=request.args.get('pagina', 1, type=int),
+        por_pagina=min(request.args.get('por_pagina', COTACOES_POR_PAGINA, type=int), 500),
+        inicio=_data_filtro(filtros['inicio']),
+        fim=_data_filtro(filtros['fim'], dias=1),
+        chave_origem=_chave_rota(filtros['origem']),
+        chave_destino=_chave_rota(filtros['destino']),
+        cliente=filtros['cliente'] or None
+    )
+    cotacoes = [
+        {
+            'data': datetime.fromtimestamp(c['momento']).strftime('%d/%m/%Y %H:%M'),
+            'origem': c['origem'],
+            'destino': c['destino'],
+            'cliente': c['cliente'] or '',
+            'modulos': int(c['num_modulos']) if c['num_modulos'] is not None else '',
+            'valor': f"{c['valor_estimado']:.2f}",
+            'status': c['status'],
+            'id_cotacao': c['id_cotacao']
+        }
+        for c in pagina.cotacoes
+    ]
+    # Filtros preenchidos repetidos nos links de paginação
+    consulta = urlencode({chave: valor for chave, valor in filtros.items() if valor})
+    return render_template('historico.html', cotacoes=cotacoes, pagina=pagina, filtros=filtros, consulta=consulta)
 
 def criar_estrutura_pastas():
     """Cria a estrutura de pastas necessária para a aplicação."""
@@ -189,6 +297,11 @@ def criar_estrutura_pastas():
                                min="1" step="1" required>
                     </div>
                     
+                    <div class="mb-3">
+                        <label for="cliente" class="form-label">Cliente (opcional):</label>
+                        <input type="text" class="form-control" id="cliente" name="cliente">
+                    </div>
+                    
                     <div class="mb-3">
                         <label for="data" class="form-label">Data Prevista (opcional):</label>
                         <input type="date" class="form-control" id="data" name="data">
@@ -275,6 +388,7 @@ document.getElementById('freteForm').addEventListener('submit', function(e) {
                             <h4>Valor Estimado</h4>
                             <div class="display-4 text-primary">R$ ${data.valor_estimado.toFixed(2)}</div>
                             <p class="text-muted">Baseado em ${data.fretes_base} fretes similares</p>
+                            ${data.valor_p10 !== undefined ? `<p class="text-muted">Faixa provável (P10-P90): R$ ${data.valor_p10.toFixed(2)} a R$ ${data.valor_p90.toFixed(2)}</p>` : ''}
                         </div>
                         
                         <h5>Detalhes do Cálculo</h5>
@@ -330,6 +444,14 @@ document.getElementById('freteForm').addEventListener('submit', function(e) {
         <h2 class="card-title mb-0">Histórico de Cotações</h2>
     </div>
     <div class="card-body">
+        <form class="row g-2 mb-3" method="get" action="/historico">
+            <div class="col-md-3"><input type="text" class="form-control" name="origem" placeholder="Origem" value="{{ filtros.origem }}"></div>
+            <div class="col-md-3"><input type="text" class="form-control" name="destino" placeholder="Destino" value="{{ filtros.destino }}"></div>
+            <div class="col-md-2"><input type="text" class="form-control" name="cliente" placeholder="Cliente" value="{{ filtros.cliente }}"></div>
+            <div class="col-md-1"><input type="date" class="form-control" name="inicio" value="{{ filtros.inicio }}"></div>
+            <div class="col-md-1"><input type="date" class="form-control" name="fim" value="{{ filtros.fim }}"></div>
+            <div class="col-md-2 d-grid"><button type="submit" class="btn btn-primary">Filtrar</button></div>
+        </form>
         {% if cotacoes %}
             <div class="table-responsive">
                 <table class="table table-striped">
@@ -338,6 +460,7 @@ document.getElementById('freteForm').addEventListener('submit', function(e) {
                             <th>Data</th>
                             <th>Origem</th>
                             <th>Destino</th>
+                            <th>Cliente</th>
                             <th>Módulos</th>
                             <th>Valor</th>
                             <th>Ações</th>
@@ -349,16 +472,30 @@ document.getElementById('freteForm').addEventListener('submit', function(e) {
                             <td>{{ cotacao.data }}</td>
                             <td>{{ cotacao.origem }}</td>
                             <td>{{ cotacao.destino }}</td>
+                            <td>{{ cotacao.cliente }}</td>
                             <td>{{ cotacao.modulos }}</td>
-                            <td>R$ {{ cotacao.valor }}</td>
+                            <td>{% if cotacao.status == 'sucesso' %}R$ {{ cotacao.valor }}{% else %}-{% endif %}</td>
                             <td>
-                                <button class="btn btn-sm btn-primary">Detalhes</button>
+                                {% if cotacao.id_cotacao %}
+                                <a class="btn btn-sm btn-primary" href="/rastros/{{ cotacao.id_cotacao }}">Detalhes</a>
+                                {% endif %}
                             </td>
                         </tr>
                         {% endfor %}
                     </tbody>
                 </table>
             </div>
+            <nav class="d-flex justify-content-between align-items-center">
+                <span>{{ pagina.total }} cotações - página {{ pagina.pagina }} de {{ pagina.paginas }}</span>
+                <ul class="pagination mb-0">
+                    {% if pagina.pagina > 1 %}
+                    <li class="page-item"><a class="page-link" href="/historico?pagina={{ pagina.pagina - 1 }}&{{ consulta }}">Anterior</a></li>
+                    {% endif %}
+                    {% if pagina.pagina < pagina.paginas %}
+                    <li class="page-item"><a class="page-link" href="/historico?pagina={{ pagina.pagina + 1 }}&{{ consulta }}">Próxima</a></li>
+                    {% endif %}
+                </ul>
+            </nav>
         {% else %}
             <div class="alert alert-info">
                 <p>Nenhuma cotação realizada ainda. <a href="/">Faça sua primeira cotação</a>.</p>
@@ -450,5 +587,13 @@ document.addEventListener('DOMContentLoaded', function() {
     console.log('Calculadora de Fretes inicializada');
     
     // Definir data mínima como hoje para o campo de data
-  
-(Content truncated due to size limit. Use line ranges to read in chunks)
\ No newline at end of file
+    const campoData = document.getElementById('data');
+    if (campoData) {
+        campoData.min = new Date().toISOString().split('T')[0];
+    }
+});
+""")
+
+if __name__ == '__main__':
+    criar_estrutura_pastas()
+    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
@@ -15,77 +15,66 @@ import datetime
 import os
 import sys
 import re
+import threading
+import time
 from geopy.distance import geodesic
 from geopy.geocoders import Nominatim
 import numpy as np
 from datetime import datetime, timedelta
 import io
+import itertools
+import logging
 import requests
 
+import agregacao
+from agregados_rotas import AgregadosRotas, FaixaQuantidade, ResumoFretes
+from ceps import IndiceCep
+from configuracao_logs import configurar_logging
+from distancias_rotas import DistanciasRotas
+from enderecos import NormalizadorEnderecos
+from frete_curto import LIMITE_FRETE_CURTO_KM, PESO_PADRAO, QUANTIDADE_PADRAO, RotasLocais, precificar_curto, precificar_curtos
+from geocodificacao import ORCAMENTO_COTACAO_S, Geocodificador, GeocodificadorIndisponivel
+from geografia import REGIAO_POR_UF, coordenadas_aproximadas, coordenadas_cidade, distancia_haversine_km
+from historico import HistoricoFretes, chave_cidade
+from inflacao import IndiceInflacao
+from indice_cidades import IndiceCidades
+from indice_espacial import IndiceEspacial, RAIO_PROXIMIDADE_KM
+from indice_similaridade import PESO_POR_MODULO_KG, IndiceSimilaridade
+import instantaneo
+import intervalos
+from outliers import mascara_fretes_tipicos
+from politica_precos import ARQUIVO_POLITICA, FontePolitica, carregar_tabelas, codigo_localidade
+from rastreamento import RegistroRastros
+from resultado_cotacao import ResultadoCotacao
+
+logger_dados = logging.getLogger('calculadora.dados')
+logger_geocodificacao = logging.getLogger('calculadora.geocodificacao')
+
 # Configurações
 # URL do arquivo Excel no GitHub (formato raw)
 ARQUIVO_EXCEL_URL = "https://raw.githubusercontent.com/biancaneves-sunr/calcute/main/Banco%20de%20Dados%20-%20Logistica.xlsx"
 
-TAXA_INFLACAO_ANUAL = 0.045  # 4.5% ao ano (média IPCA)
-MARGEM_ADICIONAL = 0.10  # 10% de margem adicional
+# Timeout da consulta (HEAD), feita em segundo plano, que verifica se a planilha da URL mudou desde a
+# gravação do instantâneo ou do histórico restaurado (s)
+TIMEOUT_IMPRESSAO_DADOS_S = 5
 
-# Valores de referência para fretes curtos (menos de 10km)
-VALOR_MEDIO_FRETE_CURTO = 800  # Valor médio para fretes curtos conforme informado pelo usuário
-VALOR_POR_KM_PADRAO = 100  # Valor por km padrão para fretes curtos
+TAXA_INFLACAO_ANUAL = 0.045  # 4.5% ao ano (média IPCA), usada fora da tabela mensal do IPCA
 
-# Valores de referência por faixa de distância (recalibrados com base na análise)
-VALORES_REFERENCIA_DISTANCIA = {
-    '0-10': {'valor_medio': 800, 'valor_por_km': 100},
-    '10-50': {'valor_medio': 1500, 'valor_por_km': 40},
-    '50-100': {'valor_medio': 4000, 'valor_por_km': 50},
-    '100-500': {'valor_medio': 12000, 'valor_por_km': 30},
-    '500-1000': {'valor_medio': 25000, 'valor_por_km': 30},
-    '1000+': {'valor_medio': 50000, 'valor_por_km': 40}
-}
+# Estratégias de busca de fretes similares no histórico
+ESTRATEGIAS_BUSCA = ('filtros', 'knn')
 
-# Valores de referência por faixa de módulos (recalibrados com base na análise)
-VALORES_REFERENCIA_MODULOS = {
-    '0-50': {'valor_medio': 1500, 'valor_por_modulo': 50},
-    '50-100': {'valor_medio': 3000, 'valor_por_modulo': 40},
-    '100-200': {'valor_medio': 5000, 'valor_por_modulo': 30},
-    '200-500': {'valor_medio': 10000, 'valor_por_modulo': 25},
-    '500-1000': {'valor_medio': 20000, 'valor_por_modulo': 22},
-    '1000+': {'valor_medio': 40000, 'valor_por_modulo': 15}
-}
+# Estratégias de agregação dos fretes similares: média simples com ajuste pela quantidade
+# média, ou fretes normalizados um a um (ver agregacao) com média ponderada ou aparada
+ESTRATEGIAS_AGREGACAO = ('media', 'ponderada', 'aparada')
 
-# Valores de referência por faixa de peso (recalibrados com base na análise)
-VALORES_REFERENCIA_PESO = {
-    '0-1000': {'valor_medio': 3000, 'valor_por_kg': 3.5},
-    '1000-5000': {'valor_medio': 8000, 'valor_por_kg': 2.0},
-    '5000-10000': {'valor_medio': 15000, 'valor_por_kg': 1.8},
-    '10000-20000': {'valor_medio': 25000, 'valor_por_kg': 1.5},
-    '20000-50000': {'valor_medio': 40000, 'valor_por_kg': 1.0},
-    '50000+': {'valor_medio': 70000, 'valor_por_kg': 0.8}
-}
+# Cotações agrupadas por micro-lote na API de streaming
+TAMANHO_LOTE_STREAM = 64
 
-# Multiplicadores regionais (ajustados após validação)
-MULTIPLICADORES_REGIONAIS = {
-    'Nordeste->Sudeste': 2.0,  # Reduzido de 7.5 para evitar sobreestimação
-    'Nordeste->Nordeste': 1.0,
-    'Sudeste->Nordeste': 1.5,
-    'Sudeste->Sudeste': 1.0,  # Base, ajustado por distância
-    'Centro-Oeste->Sudeste': 1.2,
-    'Sudeste->Centro-Oeste': 1.2,
-    'Sul->Sudeste': 1.1,
-    'Sudeste->Sul': 1.1,
-    'Norte->Sudeste': 2.5,  # Reduzido de 8.0 para evitar sobreestimação
-    'Sudeste->Norte': 2.5   # Reduzido de 8.0 para evitar sobreestimação
-}
+# Limite de endereços mantidos no cache de coordenadas
+TAMANHO_CACHE_COORDENADAS = 4096
 
-# Multiplicadores por distância para Sudeste->Sudeste (ajustados após validação)
-MULTIPLICADORES_DISTANCIA_SUDESTE = {
-    '0-10': 0.8,    # Aumentado de 0.5 para evitar subestimação
-    '10-50': 0.9,   # Aumentado de 0.7 para evitar subestimação
-    '50-100': 1.0,
-    '100-500': 1.0,  # Base
-    '500-1000': 1.2, # Reduzido de 1.5 para evitar sobreestimação
-    '1000+': 1.5     # Reduzido de 2.8 para evitar sobreestimação
-}
+# Validade das coordenadas aproximadas (offline) usadas com o geocodificador indisponível (s)
+VALIDADE_COORDENADAS_APROXIMADAS_S = 60
 
 # Fatores de correção específicos para rotas conhecidas (ajustados após validação)
 FATORES_CORRECAO_ROTAS = {
@@ -106,17 +95,294 @@ VALORES_ABSOLUTOS = {
     'Limoeiro do Norte->Montes Claros': 267000
 }
 
+# Política de preços padrão: as tabelas do arquivo distribuído (politica_precos.json),
+# única fonte dos valores de referência; completam as chaves ausentes de outro arquivo de política
+POLITICA_PADRAO = carregar_tabelas(ARQUIVO_POLITICA)
+
+
+def _normalizar_rotas(rotas):
+    """Separa as chaves 'Origem->Destino' em cidades sem acentos e minúsculas: lista (origem, destino, valor)."""
+    return [(*(chave_cidade(cidade) for cidade in rota.split('->')), valor) for rota, valor in rotas.items()]
+
+_ROTAS_FATORES_CORRECAO = _normalizar_rotas(FATORES_CORRECAO_ROTAS)
+_ROTAS_VALORES_ABSOLUTOS = _normalizar_rotas(VALORES_ABSOLUTOS)
+
 class CalculadoraFrete:
-    def __init__(self, arquivo_excel=None, usar_url=True):
+    def __init__(self, arquivo_excel=None, usar_url=True, arquivo_historico=None, estrategia_busca="filtros",
+                 distancia_exata=False, arquivo_politica=ARQUIVO_POLITICA, rastrear=False, diario=None,
+                 arquivo_instantaneo=None, estrategia_agregacao="media", intervalos=False):
         """
         Inicializa a calculadora de fretes.
         
         Args:
             arquivo_excel: Caminho local do arquivo Excel ou None para usar URL
             usar_url: Se True, ignora arquivo_excel e usa a URL do GitHub
+            arquivo_historico: Caminho do histórico mapeado em memória. Se existir,
+                é mapeado em modo somente leitura; se não existir, é criado a partir
+                do Excel para que os próximos processos o reutilizem.
+            estrategia_busca: "filtros" (filtros em cascata por cidade, origem e
+                distância) ou "knn" (k fretes mais similares, ponderados pela distância)
+            distancia_exata: Se True, calcula distâncias pela geodésica exata (geopy);
+                por padrão usa a haversine vetorizada (erro máximo de 0,6%)
+            arquivo_politica: Arquivo JSON da política de preços, recarregado
+                automaticamente quando alterado (se não existir, usa POLITICA_PADRAO)
+            rastrear: Se True, registra o rastro de cada cotação (ramo do cálculo,
+                fretes usados e valores intermediários), consultável por id_cotacao
+            diario: DiarioCotacoes em que cada cotação calculada é registrada (opcional);
+                as distâncias das cotações recentes do diário aquecem o cache de distâncias
+            arquivo_instantaneo: Instantâneo do estado derivado (ver instantaneo). Se
+                existir, o histórico, as cidades canônicas, as distâncias das rotas e as
+                coordenadas são restaurados dele, sem carregar o Excel nem o histórico;
+                `salvar_instantaneo` o grava
+            estrategia_agregacao: "media" (média dos fretes similares e um ajuste pela
+                quantidade média), "ponderada" (fretes normalizados um a um, em média
+                ponderada pela similaridade de quantidade e distância) ou "aparada"
+                (fretes normalizados, descartando 10% em cada ponta)
+            intervalos: Se True, as cotações precificadas pelo histórico trazem
+                também os percentis P10/P50/P90 do valor, estimados por bootstrap
+                dos fretes candidatos dentro de um orçamento de tempo (ver intervalos)
         """
-        self.dados = self._carregar_dados(arquivo_excel, usar_url)
+        if estrategia_busca not in ESTRATEGIAS_BUSCA:
+            raise ValueError(f"Estratégia de busca inválida: {estrategia_busca}")
+        if estrategia_agregacao not in ESTRATEGIAS_AGREGACAO:
+            raise ValueError(f"Estratégia de agregação inválida: {estrategia_agregacao}")
+        self.estrategia_busca = estrategia_busca
+        self.estrategia_agregacao = estrategia_agregacao
+        self.intervalos = intervalos
+        self.distancia_exata = distancia_exata
+        self.arquivo_instantaneo = arquivo_instantaneo
+        # Instantâneo e histórico gravados de outra versão dos dados são descartados. A
+        # impressão digital do arquivo local sai do sistema de arquivos; a da URL exige uma
+        # consulta HEAD, feita em segundo plano depois de o estado ser restaurado
+        impressao_atual = None
+        verificar_url = False
+        if any(caminho and os.path.exists(caminho) for caminho in (arquivo_instantaneo, arquivo_historico)):
+            if usar_url:
+                verificar_url = True
+            else:
+                impressao_atual = self._impressao_arquivo(arquivo_excel)
+        estado = self._carregar_instantaneo(arquivo_instantaneo, impressao_atual)
+        if estado is not None:
+            historico, impressao_dados = estado.historico, impressao_atual or estado.impressao_dados
+        else:
+            historico, impressao_dados = self._carregar_historico(arquivo_excel, usar_url, arquivo_historico,
+                                                                  impressao_atual)
+        self.inflacao = IndiceInflacao.carregar(TAXA_INFLACAO_ANUAL)
+        self.fonte_politica = FontePolitica(arquivo_politica, POLITICA_PADRAO)
+        self.rastros = RegistroRastros() if rastrear else None
+        self.__dict__.update(self._estado_dados(historico, impressao_dados, estado))
+        self._cache_coordenadas = dict(estado.coordenadas) if estado is not None else {}
+        # Endereço -> (coordenadas aproximadas, validade), para não insistir no provedor indisponível
+        self._cache_aproximadas = {}
+        # Estado do micro-lote em andamento em calcular_fretes_stream, por thread (a mesma
+        # calculadora atende requisições concorrentes no Flask): `distancias` pré-calculadas
+        # por rota, `coordenadas` dos endereços já geocodificados (None se não encontrados)
+        # e `intervalos` pendentes, estimados de uma vez no fim do lote
+        self._lote = threading.local()
+        self.diario = diario
+        # (origem, destino) -> distância das rotas já cotadas, recuperadas do diário na inicialização
+        self._distancias_diario = {}
+        if diario is not None:
+            self._distancias_diario = diario.distancias_recentes(TAMANHO_CACHE_COORDENADAS)
         self.geolocator = Nominatim(user_agent="calculadora_frete")
+        self.geocodificador = Geocodificador(self.geolocator)
+        # Verificação em segundo plano da planilha da URL (None se não houver o que verificar)
+        self.verificacao_dados = None
+        if verificar_url:
+            self.verificacao_dados = threading.Thread(
+                target=self._verificar_dados_origem, args=(arquivo_excel, arquivo_historico),
+                name='verificacao-dados', daemon=True
+            )
+            self.verificacao_dados.start()
+    
+    def _estado_dados(self, historico, impressao_dados, estado=None):
+        """
+        Monta os atributos derivados do histórico (índices, agregados e rotas).
+        
+        Os atributos são retornados em um dicionário, e não atribuídos um a um,
+        para que a recarga em segundo plano os troque de uma só vez.
+        
+        Args:
+            historico: HistoricoFretes ou None (sem dados: valores de referência)
+            impressao_dados: Impressão digital dos dados de origem do histórico
+            estado: EstadoCalculadora restaurado do instantâneo, de onde vêm as
+                cidades canônicas e as distâncias das rotas (opcional)
+        
+        Returns:
+            Dicionário atributo -> valor
+        """
+        atributos = {
+            'historico': historico,
+            # Impressão digital dos dados de origem do histórico em uso, gravada com o instantâneo
+            'impressao_dados': impressao_dados,
+            'instantaneo_restaurado': estado is not None,
+            'dados': historico.para_dataframe() if historico is not None else None,
+            'indice_cep': IndiceCep.construir(historico),
+            'indice_espacial': None,
+            'agregados_rotas': None,
+            'distancias_rotas': None,
+            'indice_cidades': None,
+            '_datas_referencia': None,
+            '_distancias_historico': None,
+            '_tem_peso': False,
+            'indice_similaridade': None,
+        }
+        if historico is not None:
+            if estado is not None:
+                indice_cidades, distancias_rotas = estado.indice_cidades, estado.distancias_rotas
+            else:
+                indice_cidades = IndiceCidades.construir(historico)
+                distancias_rotas = DistanciasRotas.construir(historico, indice_cidades)
+            atributos.update(
+                _datas_referencia=historico.datas_referencia(),
+                _distancias_historico=historico.distancias_rota(),
+                _tem_peso=bool(np.isfinite(historico.numericas['Peso real (kg)']).any()),
+                indice_cidades=indice_cidades,
+                distancias_rotas=distancias_rotas,
+                indice_espacial=IndiceEspacial.construir(historico, indice_cidades),
+                agregados_rotas=AgregadosRotas.construir(historico, self.inflacao, indice_cidades),
+            )
+            if self.estrategia_busca == "knn":
+                atributos['indice_similaridade'] = IndiceSimilaridade.construir(historico, indice_cidades)
+        atributos['enderecos'] = NormalizadorEnderecos(atributos['indice_cep'], atributos['indice_cidades'])
+        atributos['rotas_locais'] = RotasLocais.construir(atributos['distancias_rotas'])
+        return atributos
+    
+    def _verificar_dados_origem(self, arquivo_excel, arquivo_historico):
+        """
+        Confere se a planilha da URL mudou desde a gravação do estado restaurado.
+        
+        Executada em segundo plano na inicialização: se a impressão digital atual
+        for diferente, o histórico é refeito e os atributos derivados dele são
+        trocados de uma só vez (o instantâneo, se configurado, é regravado). Até
+        lá, as cotações usam o estado restaurado.
+        """
+        impressao_atual = self._impressao_fonte(arquivo_excel, usar_url=True)
+        if impressao_atual is None or impressao_atual == self.impressao_dados:
+            return
+        logger_dados.info("Dados de origem alterados desde a gravação do estado restaurado; refazendo o histórico")
+        try:
+            historico, impressao_dados = self._carregar_historico(arquivo_excel, True, arquivo_historico,
+                                                                  impressao_atual)
+            if historico is None:
+                return
+            self.__dict__.update(self._estado_dados(historico, impressao_dados))
+            if self.arquivo_instantaneo:
+                self.salvar_instantaneo()
+        except Exception as e:
+            logger_dados.exception("Erro ao refazer o histórico com os dados alterados: %s", e)
+    
+    def _impressao_fonte(self, arquivo_excel, usar_url=True):
+        """
+        Impressão digital da fonte de dados atual, obtida sem baixá-la.
+        
+        Segue a ordem de _carregar_dados: ETag da URL (consulta HEAD) e, se a
+        URL não responder, tamanho e data de modificação do arquivo local.
+        
+        Returns:
+            Texto da impressão digital ou None se nenhuma fonte puder ser verificada
+        """
+        if usar_url:
+            try:
+                resposta = requests.head(ARQUIVO_EXCEL_URL, timeout=TIMEOUT_IMPRESSAO_DADOS_S, allow_redirects=True)
+                resposta.raise_for_status()
+                return self._impressao_resposta(resposta)
+            except Exception as e:
+                logger_dados.warning("Erro ao verificar a versão dos dados na URL: %s", e)
+        return self._impressao_arquivo(arquivo_excel)
+    
+    @staticmethod
+    def _impressao_resposta(resposta):
+        """Impressão digital da planilha servida pela URL (ETag ou data de modificação e tamanho)."""
+        etag = resposta.headers.get('ETag')
+        if etag:
+            return f"url:{etag}"
+        modificacao = resposta.headers.get('Last-Modified')
+        if modificacao:
+            return f"url:{modificacao}:{resposta.headers.get('Content-Length')}"
+        return None
+    
+    @staticmethod
+    def _impressao_arquivo(arquivo_excel):
+        """Impressão digital do arquivo local (tamanho e data de modificação); None se não existir."""
+        if not arquivo_excel or not os.path.exists(arquivo_excel):
+            return None
+        estatisticas = os.stat(arquivo_excel)
+        return f"arquivo:{estatisticas.st_size}:{estatisticas.st_mtime_ns}"
+    
+    def _carregar_instantaneo(self, arquivo_instantaneo, impressao_dados=None):
+        """
+        Mapeia o instantâneo, se houver (None se não existir, não puder ser lido ou
+        tiver sido gravado a partir de dados diferentes de `impressao_dados`).
+        """
+        if not arquivo_instantaneo or not os.path.exists(arquivo_instantaneo):
+            return None
+        try:
+            estado = instantaneo.carregar(arquivo_instantaneo, impressao_dados)
+            logger_dados.info("Estado restaurado do instantâneo: %s", arquivo_instantaneo)
+            return estado
+        except Exception as e:
+            logger_dados.warning("Erro ao restaurar instantâneo de %s: %s", arquivo_instantaneo, e)
+            return None
+    
+    def salvar_instantaneo(self, caminho=None):
+        """
+        Grava o estado derivado (histórico, cidades canônicas, distâncias das
+        rotas e coordenadas geocodificadas) no instantâneo.
+        
+        Args:
+            caminho: Arquivo de destino (padrão: arquivo_instantaneo da inicialização)
+        
+        Returns:
+            True se o instantâneo foi gravado; False sem histórico ou sem caminho
+        """
+        caminho = caminho or self.arquivo_instantaneo
+        if not caminho or self.historico is None:
+            return False
+        instantaneo.salvar(caminho, instantaneo.EstadoCalculadora(
+            self.historico, self.indice_cidades, self.distancias_rotas, dict(self._cache_coordenadas),
+            self.impressao_dados
+        ))
+        return True
+    
+    def _carregar_historico(self, arquivo_excel, usar_url=True, arquivo_historico=None, impressao_dados=None):
+        """
+        Obtém o histórico de fretes, preferindo o arquivo mapeado em memória.
+        
+        O arquivo só é reaproveitado se tiver sido gravado a partir dos dados
+        de `impressao_dados` (ou se ela for desconhecida); senão é refeito.
+        
+        Returns:
+            Tupla (HistoricoFretes com as colunas de precificação ou None em caso de
+            erro, impressão digital dos dados de origem)
+        """
+        if arquivo_historico and os.path.exists(arquivo_historico):
+            try:
+                historico = HistoricoFretes.mapear(arquivo_historico, impressao_dados)
+                logger_dados.info("Histórico mapeado do arquivo: %s", arquivo_historico)
+                return historico, impressao_dados or historico.impressao_dados
+            except Exception as e:
+                logger_dados.warning("Erro ao mapear histórico de %s: %s", arquivo_historico, e)
+        
+        df, impressao_dados = self._carregar_dados(arquivo_excel, usar_url)
+        if df is None:
+            return None, None
+        
+        historico = HistoricoFretes.de_dataframe(df)
+        # Fretes atípicos para o segmento (faixa de distância x faixa de módulos), removidos uma única vez
+        tipicos = mascara_fretes_tipicos(historico.numericas['(R$) Frete'], historico.distancias_rota(),
+                                         historico.numericas['Núm. Módulos'])
+        logger_dados.info("Fretes atípicos removidos do histórico: %d de %d", len(historico) - int(tipicos.sum()),
+                          len(historico))
+        historico = historico.filtrar(tipicos)
+        if arquivo_historico:
+            try:
+                historico.salvar(arquivo_historico, impressao_dados)
+                # Mapeia o arquivo recém-gravado para compartilhar as páginas com os outros processos
+                historico = HistoricoFretes.mapear(arquivo_historico)
+            except Exception as e:
+                logger_dados.error("Erro ao gravar histórico em %s: %s", arquivo_historico, e)
+        return historico, impressao_dados
         
     def _carregar_dados(self, arquivo_excel, usar_url=True):
         """
@@ -127,133 +393,193 @@ class CalculadoraFrete:
             usar_url: Se True, ignora arquivo_excel e usa a URL do GitHub
         
         Returns:
-            DataFrame com os dados carregados ou None em caso de erro
+            Tupla (DataFrame com os dados carregados ou None em caso de erro,
+            impressão digital da fonte de onde foram carregados)
         """
         try:
             if usar_url:
                 # Tenta carregar da URL do GitHub
                 try:
-                    print(f"Tentando carregar dados da URL: {ARQUIVO_EXCEL_URL}")
+                    logger_dados.info("Tentando carregar dados da URL: %s", ARQUIVO_EXCEL_URL)
                     response = requests.get(ARQUIVO_EXCEL_URL)
                     response.raise_for_status()  # Levanta exceção para códigos de erro HTTP
                     df = pd.read_excel(io.BytesIO(response.content))
-                    print("Dados carregados com sucesso da URL do GitHub")
+                    impressao_dados = self._impressao_resposta(response)
+                    logger_dados.info("Dados carregados com sucesso da URL do GitHub", extra={'linhas': len(df)})
                 except Exception as e:
-                    print(f"Erro ao carregar dados da URL: {e}")
+                    logger_dados.warning("Erro ao carregar dados da URL: %s", e)
                     # Tenta caminho local como fallback
                     if arquivo_excel and os.path.exists(arquivo_excel):
-                        print(f"Tentando carregar do arquivo local: {arquivo_excel}")
+                        logger_dados.info("Tentando carregar do arquivo local: %s", arquivo_excel)
                         df = pd.read_excel(arquivo_excel)
-                        print("Dados carregados com sucesso do arquivo local")
+                        impressao_dados = self._impressao_arquivo(arquivo_excel)
+                        logger_dados.info("Dados carregados com sucesso do arquivo local", extra={'linhas': len(df)})
                     else:
-                        print("Arquivo local não encontrado. Usando valores de referência.")
-                        return None
+                        logger_dados.warning("Arquivo local não encontrado. Usando valores de referência.")
+                        return None, None
             elif arquivo_excel and os.path.exists(arquivo_excel):
                 # Carrega do caminho local se especificado e existir
-                print(f"Carregando dados do arquivo local: {arquivo_excel}")
+                logger_dados.info("Carregando dados do arquivo local: %s", arquivo_excel)
                 df = pd.read_excel(arquivo_excel)
-                print("Dados carregados com sucesso do arquivo local")
+                impressao_dados = self._impressao_arquivo(arquivo_excel)
+                logger_dados.info("Dados carregados com sucesso do arquivo local", extra={'linhas': len(df)})
             else:
-                print("Arquivo não especificado ou não encontrado. Usando valores de referência.")
-                return None
+                logger_dados.warning("Arquivo não especificado ou não encontrado. Usando valores de referência.")
+                return None, None
             
             # Filtrar apenas registros com valor de frete válido (não nulo e maior que zero)
             df = df[(df['(R$) Frete'].notna()) & (df['(R$) Frete'] > 0)]
             
-            # Remover outliers extremos (valores acima do percentil 95)
-            percentil_95 = df['(R$) Frete'].quantile(0.95)
-            df = df[df['(R$) Frete'] <= percentil_95]
-            
             # Converter datas para datetime
             for col in ['Data Envio Proposta', 'Data de Orçamento', 'Previsão para descarte']:
                 if col in df.columns:
                     df[col] = pd.to_datetime(df[col], errors='coerce')
             
-            return df
+            return df, impressao_dados
         except Exception as e:
-            print(f"Erro ao carregar dados: {e}")
+            logger_dados.exception("Erro ao carregar dados: %s", e)
             # Em vez de encerrar, retorna None e usa valores de referência
-            return None
+            return None, None
     
-    def _obter_coordenadas(self, endereco):
-        """Obtém as coordenadas geográficas a partir de um endereço."""
+    def _obter_coordenadas(self, endereco, prazo=None):
+        """
+        Obtém as coordenadas geográficas a partir de um endereço (com cache).
+        
+        Se o geocodificador estiver indisponível ou o prazo se esgotar, usa a
+        posição aproximada da tabela offline (cidade conhecida ou capital da UF).
+        
+        Args:
+            endereco: Texto do endereço
+            prazo: Instante (time.monotonic) limite para a geocodificação
+        """
+        if endereco in self._cache_coordenadas:
+            return self._cache_coordenadas[endereco]
+        # No micro-lote, os endereços já consultados (inclusive os não encontrados) não voltam ao provedor
+        coordenadas_lote = getattr(self._lote, 'coordenadas', None)
+        if coordenadas_lote is not None and endereco in coordenadas_lote:
+            return coordenadas_lote[endereco]
+        
+        # Endereço com CEP de cidade conhecida: usa o centro da cidade, sem consultar o provedor
+        centroide = self._endereco(endereco).centroide
+        if centroide is not None:
+            self._guardar_coordenadas(endereco, centroide)
+            return centroide
+        
+        aproximada = self._cache_aproximadas.get(endereco)
+        if aproximada is not None and aproximada[1] > time.monotonic():
+            return aproximada[0]
+        
         try:
-            location = self.geolocator.geocode(endereco, timeout=15)  # Aumentado timeout para evitar erros
-            if location:
-                return (location.latitude, location.longitude)
-            return None
-        except Exception as e:
-            print(f"Erro ao obter coordenadas para {endereco}: {e}")
+            coordenadas = self._geocodificar(endereco, prazo)
+        except GeocodificadorIndisponivel as e:
+            coordenadas = coordenadas_aproximadas(endereco)
+            logger_geocodificacao.info("Geocodificador indisponível (%s); usando posição aproximada para %s",
+                                       e, endereco, extra={'endereco': endereco, 'aproximada': coordenadas is not None})
+            if len(self._cache_aproximadas) >= TAMANHO_CACHE_COORDENADAS:
+                self._cache_aproximadas.pop(next(iter(self._cache_aproximadas)))
+            self._cache_aproximadas[endereco] = (coordenadas, time.monotonic() + VALIDADE_COORDENADAS_APROXIMADAS_S)
+            return coordenadas
+        
+        if coordenadas is not None:
+            self._guardar_coordenadas(endereco, coordenadas)
+        return coordenadas
+    
+    def _guardar_coordenadas(self, endereco, coordenadas):
+        """Guarda as coordenadas no cache, descartando o endereço mais antigo se estiver cheio."""
+        if len(self._cache_coordenadas) >= TAMANHO_CACHE_COORDENADAS:
+            self._cache_coordenadas.pop(next(iter(self._cache_coordenadas)))
+        self._cache_coordenadas[endereco] = coordenadas
+    
+    def _geocodificar(self, endereco, prazo=None):
+        """
+        Consulta o geocodificador para obter as coordenadas de um endereço.
+        
+        Raises:
+            GeocodificadorIndisponivel: se o provedor não puder ser consultado
+        """
+        return self.geocodificador.localizar(endereco, prazo)
+    
+    def _distancia_historica(self, origem, destino):
+        """Retorna a distância registrada no histórico para a rota (None se a rota for nova)."""
+        if self.distancias_rotas is None:
             return None
+        return self.distancias_rotas.distancia(self._endereco(origem), self._endereco(destino))
+    
+    def _calcular_distancia(self, origem, destino, prazo=None):
+        """
+        Calcula a distância entre origem e destino.
+        
+        Rotas curtas conhecidas usam a tabela de rotas locais, rotas já
+        presentes no histórico usam a distância registrada, rotas cotadas
+        antes do reinício usam a distância do diário e as demais são
+        geocodificadas.
+        
+        Args:
+            prazo: Instante (time.monotonic) limite da geocodificação; por padrão,
+                ORCAMENTO_COTACAO_S a partir de agora
+        """
+        distancia = self._distancia_conhecida(origem, destino)
+        if distancia is not None:
+            return distancia
+        if prazo is None:
+            prazo = time.monotonic() + ORCAMENTO_COTACAO_S
+        return self._distancia_geocodificada(origem, destino, prazo)
     
-    def _calcular_distancia(self, origem, destino):
-        """Calcula a distância entre dois pontos geográficos."""
-        coord_origem = self._obter_coordenadas(origem)
-        coord_destino = self._obter_coordenadas(destino)
+    def _distancia_conhecida(self, origem, destino):
+        """Distância da rota sem consultar o geocodificador (micro-lote, rotas locais, histórico ou diário); None se a rota for nova."""
+        distancias_lote = getattr(self._lote, 'distancias', None)
+        if distancias_lote and (origem, destino) in distancias_lote:
+            return distancias_lote[(origem, destino)]
+        distancia = self.rotas_locais.distancia(self._endereco(origem), self._endereco(destino))
+        if distancia is not None:
+            return distancia
+        distancia = self._distancia_historica(origem, destino)
+        if distancia is not None:
+            return distancia
+        return self._distancias_diario.get((origem, destino))
+    
+    def _distancia_geocodificada(self, origem, destino, prazo):
+        """Distância pelas coordenadas dos dois endereços, geocodificados dentro do mesmo prazo."""
+        coord_origem = self._obter_coordenadas(origem, prazo)
+        coord_destino = self._obter_coordenadas(destino, prazo)
         
         if coord_origem and coord_destino:
-            distancia = geodesic(coord_origem, coord_destino).kilometers
+            if self.distancia_exata:
+                distancia = geodesic(coord_origem, coord_destino).kilometers
+            else:
+                distancia = float(distancia_haversine_km(*coord_origem, *coord_destino))
             return round(distancia, 2)
         return None
     
-    def _extrair_cidade_estado(self, endereco):
-        """Extrai cidade e estado de um endereço completo."""
-        # Padrão simples para extrair cidade/estado
-        padrao = r'([A-Za-zÀ-ÖØ-öø-ÿ\s]+)[,-/]?\s*([A-Z]{2})'
-        match = re.search(padrao, endereco)
-        if match:
-            cidade = match.group(1).strip()
-            estado = match.group(2).strip()
-            return f"{cidade}/{estado}"
-        return endereco  # Retorna o endereço original se não conseguir extrair
-    
-    def _obter_faixa_distancia(self, distancia):
-        """Retorna a faixa de distância correspondente."""
-        if distancia < 10:
-            return '0-10'
-        elif distancia < 50:
-            return '10-50'
-        elif distancia < 100:
-            return '50-100'
-        elif distancia < 500:
-            return '100-500'
-        elif distancia < 1000:
-            return '500-1000'
-        else:
-            return '1000+'
-    
-    def _obter_faixa_modulos(self, modulos):
-        """Retorna a faixa de módulos correspondente."""
-        if modulos < 50:
-            return '0-50'
-        elif modulos < 100:
-            return '50-100'
-        elif modulos < 200:
-            return '100-200'
-        elif modulos < 500:
-            return '200-500'
-        elif modulos < 1000:
-            return '500-1000'
-        else:
-            return '1000+'
-    
-    def _obter_faixa_peso(self, peso):
-        """Retorna a faixa de peso correspondente."""
-        if peso < 1000:
-            return '0-1000'
-        elif peso < 5000:
-            return '1000-5000'
-        elif peso < 10000:
-            return '5000-10000'
-        elif peso < 20000:
-            return '10000-20000'
-        elif peso < 50000:
-            return '20000-50000'
+    def calcular_distancias(self, coords_origem, coords_destino):
+        """
+        Calcula as distâncias de vários pares de coordenadas de uma só vez.
+        
+        Args:
+            coords_origem: Array (n, 2) com latitude e longitude das origens
+            coords_destino: Array (n, 2) com latitude e longitude dos destinos
+        
+        Returns:
+            Array com as distâncias em km, arredondadas em 2 casas
+        """
+        coords_origem = np.asarray(coords_origem, dtype=np.float64)
+        coords_destino = np.asarray(coords_destino, dtype=np.float64)
+        if self.distancia_exata:
+            distancias = np.array([geodesic(o, d).kilometers for o, d in zip(coords_origem, coords_destino)])
         else:
-            return '50000+'
+            distancias = distancia_haversine_km(coords_origem[:, 0], coords_origem[:, 1], coords_destino[:, 0], coords_destino[:, 1])
+        return np.round(distancias, 2)
+    
+    def _endereco(self, texto):
+        """Retorna o Endereco analisado do texto (cada texto distinto é analisado uma única vez)."""
+        return self.enderecos.normalizar(texto)
     
     def _determinar_regiao(self, cidade_estado):
         """Determina a região com base na cidade/estado."""
+        uf = self._endereco(cidade_estado).uf
+        if uf is not None:
+            return REGIAO_POR_UF[uf]
+        
         # Simplificação para as principais regiões
         if re.search(r'SP|São Paulo|Jundiai|Valinhos|Campinas|Santos|Ribeirão|Sorocaba', cidade_estado, re.IGNORECASE):
             return 'Sudeste'
@@ -312,265 +638,376 @@ class CalculadoraFrete:
         else:
             return 'Indefinida'
     
-    def _obter_multiplicador_regional(self, origem, destino):
-        """Obtém o multiplicador regional com base nas regiões de origem e destino."""
-        regiao_origem = self._determinar_regiao(origem)
-        regiao_destino = self._determinar_regiao(destino)
-        
-        chave = f"{regiao_origem}->{regiao_destino}"
-        if chave in MULTIPLICADORES_REGIONAIS:
-            return MULTIPLICADORES_REGIONAIS[chave]
+    def _codigo_localidade(self, endereco):
+        """Retorna o código da UF do endereço (ou da região, se a UF não for identificada)."""
+        return codigo_localidade(self._endereco(endereco).uf, self._determinar_regiao(endereco))
+    
+    def _buscar_rota_conhecida(self, rotas, origem, destino):
+        """
+        Procura a rota da cotação em uma tabela de rotas conhecidas já normalizada.
         
-        # Se não encontrar a combinação exata, tenta inverter
-        chave_inversa = f"{regiao_destino}->{regiao_origem}"
-        if chave_inversa in MULTIPLICADORES_REGIONAIS:
-            return MULTIPLICADORES_REGIONAIS[chave_inversa]
+        As cidades são comparadas sem acentos e em minúsculas; uma contida
+        na outra também conta como a mesma cidade.
         
-        # Se ainda não encontrar, retorna o valor padrão
-        return 1.0
-    
-    def _obter_multiplicador_distancia_sudeste(self, distancia):
-        """Obtém o multiplicador por distância para rotas Sudeste->Sudeste."""
-        faixa = self._obter_faixa_distancia(distancia)
-        if faixa in MULTIPLICADORES_DISTANCIA_SUDESTE:
-            return MULTIPLICADORES_DISTANCIA_SUDESTE[faixa]
-        return 1.0
+        Returns:
+            Valor da tabela para a rota ou None se ela não for conhecida
+        """
+        cidade_origem = self._endereco(origem).nome
+        cidade_destino = self._endereco(destino).nome
+        if not cidade_origem or not cidade_destino:
+            return None
+        for rota_origem, rota_destino, valor in rotas:
+            if (rota_origem in cidade_origem or cidade_origem in rota_origem) and \
+               (rota_destino in cidade_destino or cidade_destino in rota_destino):
+                return valor
+        return None
     
     def _obter_fator_correcao_rota(self, origem, destino):
         """Obtém o fator de correção específico para uma rota conhecida."""
-        # Extrair apenas o nome da cidade
-        cidade_origem = origem.split('/')[0].strip() if '/' in origem else origem.split(',')[0].strip()
-        cidade_destino = destino.split('/')[0].strip() if '/' in destino else destino.split(',')[0].strip()
-        
-        # Normalizar nomes (remover acentos, converter para minúsculas)
-        cidade_origem = cidade_origem.lower()
-        cidade_destino = cidade_destino.lower()
-        
-        # Verificar rotas conhecidas
-        chave = f"{cidade_origem}->{cidade_destino}"
-        for rota, fator in FATORES_CORRECAO_ROTAS.items():
-            rota_origem, rota_destino = rota.lower().split('->')
-            if (rota_origem in cidade_origem or cidade_origem in rota_origem) and \
-               (rota_destino in cidade_destino or cidade_destino in rota_destino):
-                return fator
-        
-        return 1.0
+        fator = self._buscar_rota_conhecida(_ROTAS_FATORES_CORRECAO, origem, destino)
+        return fator if fator is not None else 1.0
     
     def _verificar_valor_absoluto(self, origem, destino, num_modulos=None):
         """Verifica se existe um valor absoluto definido para esta rota e quantidade de módulos."""
-        # Extrair apenas o nome da cidade
-        cidade_origem = origem.split('/')[0].strip() if '/' in origem else origem.split(',')[0].strip()
-        cidade_destino = destino.split('/')[0].strip() if '/' in destino else destino.split(',')[0].strip()
-        
-        # Normalizar nomes (remover acentos, converter para minúsculas)
-        cidade_origem = cidade_origem.lower()
-        cidade_destino = cidade_destino.lower()
-        
-        # Verificar rotas conhecidas
-        chave = f"{cidade_origem}->{cidade_destino}"
-        for rota, valor in VALORES_ABSOLUTOS.items():
-            rota_origem, rota_destino = rota.lower().split('->')
-            if (rota_origem in cidade_origem or cidade_origem in rota_origem) and \
-               (rota_destino in cidade_destino or cidade_destino in rota_destino):
-                # Se for um dicionário por módulos, verifica a quantidade
-                if isinstance(valor, dict) and num_modulos is not None:
-                    # Converte para string para comparação
-                    str_modulos = str(num_modulos)
-                    if str_modulos in valor:
-                        return valor[str_modulos]
-                    # Se não encontrar exato, busca o mais próximo
-                    modulos_disponiveis = [int(m) for m in valor.keys()]
-                    if modulos_disponiveis:
-                        mais_proximo = min(modulos_disponiveis, key=lambda x: abs(x - num_modulos))
-                        if abs(mais_proximo - num_modulos) / num_modulos < 0.2:  # Se diferença for menor que 20%
-                            return valor[str(mais_proximo)]
-                else:
-                    # Se for um valor único para a rota
-                    return valor
+        valor = self._buscar_rota_conhecida(_ROTAS_VALORES_ABSOLUTOS, origem, destino)
+        if valor is None:
+            return None
         
+        # Se for um dicionário por módulos, verifica a quantidade
+        if isinstance(valor, dict) and num_modulos is not None:
+            # Converte para string para comparação
+            str_modulos = str(num_modulos)
+            if str_modulos in valor:
+                return valor[str_modulos]
+            # Se não encontrar exato, busca o mais próximo
+            modulos_disponiveis = [int(m) for m in valor.keys()]
+            if modulos_disponiveis:
+                mais_proximo = min(modulos_disponiveis, key=lambda x: abs(x - num_modulos))
+                if abs(mais_proximo - num_modulos) / num_modulos < 0.2:  # Se diferença for menor que 20%
+                    return valor[str(mais_proximo)]
+            return None
+        
+        # Se for um valor único para a rota
+        return valor
+    
+    def _mascara_contem(self, coluna, trecho):
+        """
+        Marca as linhas cuja coluna de texto contém o trecho (sem diferenciar maiúsculas).
+        
+        A comparação é feita uma vez por valor distinto do vocabulário e
+        expandida para as linhas pelos códigos, sem varrer strings linha a linha.
+        """
+        trecho = trecho.lower()
+        vocabulario = self.historico.vocabularios[coluna]
+        contem = np.array([trecho in valor.lower() for valor in vocabulario] + [False], dtype=bool)
+        # Código -1 (valor vazio) aponta para o último elemento, False
+        return contem[self.historico.codigos[coluna]]
+    
+    def _mascara_origem(self, endereco):
+        """Marca as linhas cuja origem é a mesma cidade canônica do endereço."""
+        if endereco.id_cidade is None:
+            return np.zeros(len(self.historico), dtype=bool)
+        return self.indice_cidades.ids_linhas == endereco.id_cidade
+    
+    def _faixa_quantidade(self, num_modulos=None, peso_kg=None, modo_calculo="modulos"):
+        """Faixa de quantidade (metade ao dobro da cotação) dos fretes comparáveis; None = sem filtro."""
+        if modo_calculo == "modulos" and num_modulos is not None:
+            return FaixaQuantidade('Núm. Módulos', max(1, num_modulos * 0.5),
+                                   min(num_modulos * 2, 5000))  # Evitar valores extremos
+        if modo_calculo == "peso" and peso_kg is not None:
+            if self._tem_peso:
+                return FaixaQuantidade('Peso real (kg)', max(1, peso_kg * 0.5),
+                                       min(peso_kg * 2, 50000))  # Evitar valores extremos
+            # Se não tiver peso base, estima com base em módulos (30kg por módulo)
+            modulos_estimados = max(1, round(peso_kg / 30))
+            return FaixaQuantidade('Núm. Módulos', max(1, modulos_estimados * 0.5), min(modulos_estimados * 2, 5000))
         return None
     
-    def _buscar_fretes_similares(self, cidade_origem, cidade_destino, num_modulos=None, peso_kg=None, distancia=None, modo_calculo="modulos"):
-        """Busca fretes similares na base de dados com filtros recalibrados."""
-        # Se não tiver dados carregados, retorna um DataFrame vazio
-        if self.dados is None:
-            return pd.DataFrame()
+    def _mascara_quantidade(self, num_modulos=None, peso_kg=None, modo_calculo="modulos"):
+        """Marca as linhas com quantidade dentro de _faixa_quantidade (None = sem filtro)."""
+        faixa = self._faixa_quantidade(num_modulos, peso_kg, modo_calculo)
+        if faixa is None:
+            return None
+        quantidades = self.historico.numericas[faixa.coluna]
+        return (quantidades >= faixa.limite_inferior) & (quantidades <= faixa.limite_superior)
+    
+    def _coordenadas_busca(self, endereco, prazo_geocodificacao=None):
+        """
+        Coordenadas de um endereço para as buscas por proximidade e por vizinhos.
+        
+        Sem prazo (rota de distância conhecida), o geocodificador não é
+        consultado: valem só as coordenadas já conhecidas (cache, centro da
+        cidade do CEP ou tabela offline de cidades).
+        """
+        if prazo_geocodificacao is not None:
+            return self._obter_coordenadas(endereco, prazo_geocodificacao)
+        coordenadas = self._cache_coordenadas.get(endereco)
+        if coordenadas is None:
+            dados = self._endereco(endereco)
+            coordenadas = dados.centroide or coordenadas_cidade(dados.cidade, dados.uf)
+        return coordenadas
+    
+    def _buscar_fretes_similares(self, cidade_origem, cidade_destino, num_modulos=None, peso_kg=None, distancia=None, modo_calculo="modulos", rastro=None,
+                                 prazo_geocodificacao=None):
+        """
+        Busca fretes similares na base de dados com filtros recalibrados.
+        
+        Se `rastro` for informado, registra a etapa da cascata que encontrou os fretes.
+        A busca por proximidade só geocodifica com `prazo_geocodificacao` (ver _coordenadas_busca).
+        
+        Returns:
+            Array com as posições dos fretes no histórico (vazio se não encontrar)
+        """
+        vazio = np.empty(0, dtype=np.intp)
+        # Se não tiver dados carregados, retorna um array vazio
+        if self.historico is None:
+            return vazio
+        
+        numericas = self.historico.numericas
         
         # Extrair cidade e estado
-        cidade_origem_formatada = self._extrair_cidade_estado(cidade_origem)
-        cidade_destino_formatada = self._extrair_cidade_estado(cidade_destino)
-        
-        # Verificar se é um frete curto (menos de 10km)
-        is_frete_curto = distancia is not None and distancia < 10
-        
-        # Para fretes curtos, priorizar correspondências exatas de cidade
-        if is_frete_curto:
-            # Buscar correspondência exata de origem e destino
-            fretes_exatos_cidade = self.dados[
-                (self.dados['Cidade/Estado'].str.contains(cidade_origem_formatada.split('/')[0], case=False, na=False)) &
-                (self.dados['Destino'].str.contains(cidade_destino_formatada.split('/')[0], case=False, na=False))
-            ]
-            
-            # Se encontrou correspondências exatas, filtrar por distância similar
-            if not fretes_exatos_cidade.empty:
-                # Filtrar por distância similar (até 50% maior ou menor)
-                fretes_distancia_similar = fretes_exatos_cidade[
-                    (fretes_exatos_cidade['Distancia Valinhos (km)'] > 0) &
-                    (fretes_exatos_cidade['Distancia Valinhos (km)'] < 15)  # Fretes curtos
-                ]
-                
-                if not fretes_distancia_similar.empty:
-                    return fretes_distancia_similar
-            
-            # Se não encontrou correspondências exatas, buscar fretes curtos similares
-            fretes_curtos = self.dados[
-                (self.dados['Distancia Valinhos (km)'] > 0) &
-                (self.dados['Distancia Valinhos (km)'] < 15)  # Fretes curtos
-            ]
-            
-            if not fretes_curtos.empty:
-                return fretes_curtos
-            
-            # Se ainda não encontrou, criar um DataFrame com um valor padrão
-            # baseado na informação do usuário (R$ 800 para fretes curtos)
-            return pd.DataFrame({
-                '(R$) Frete': [VALOR_MEDIO_FRETE_CURTO],
-                'Distancia Valinhos (km)': [distancia if distancia else 7],
-                'Núm. Módulos': [num_modulos if num_modulos else 200],
-                'Peso real (kg)': [peso_kg if peso_kg else 6000],
-                'Data Envio Proposta': [datetime.now() - timedelta(days=30)]
-            })
-        
-        # Para fretes normais (não curtos), usar a lógica padrão com filtros mais rigorosos
-        # Filtro base por origem e destino
-        filtro_base = (
-            (self.dados['Cidade/Estado'].str.contains(cidade_origem_formatada.split('/')[0], case=False, na=False)) &
-            (self.dados['Destino'].str.contains(cidade_destino_formatada.split('/')[0], case=False, na=False))
-        )
+        endereco_origem = self._endereco(cidade_origem)
+        endereco_destino = self._endereco(cidade_destino)
+        filtro_base = self._mascara_origem(endereco_origem) & self._mascara_contem('Destino', endereco_destino.cidade)
         
+        # Fretes curtos não chegam aqui (ver _calcular_frete_curto); usar filtros rigorosos
         # Adicionar filtro por módulos ou peso conforme o modo de cálculo
-        if modo_calculo == "modulos" and num_modulos is not None:
-            # Limitar a faixa de módulos para evitar outliers
-            limite_inferior = max(1, num_modulos * 0.5)
-            limite_superior = min(num_modulos * 2, 5000)  # Evitar valores extremos
-            
-            filtro_modulos = self.dados['Núm. Módulos'].between(limite_inferior, limite_superior)
-            fretes_exatos = self.dados[filtro_base & filtro_modulos]
-        elif modo_calculo == "peso" and peso_kg is not None:
-            # Verificar se há dados de peso disponíveis
-            if 'Peso real (kg)' in self.dados.columns and self.dados['Peso real (kg)'].notna().any():
-                # Limitar a faixa de peso para evitar outliers
-                limite_inferior = max(1, peso_kg * 0.5)
-                limite_superior = min(peso_kg * 2, 50000)  # Evitar valores extremos
-                
-                filtro_peso = self.dados['Peso real (kg)'].between(limite_inferior, limite_superior)
-                fretes_exatos = self.dados[filtro_base & filtro_peso]
-            else:
-                # Se não tiver peso base, estima com base em módulos (30kg por módulo)
-                modulos_estimados = max(1, round(peso_kg / 30))
-                limite_inferior = max(1, modulos_estimados * 0.5)
-                limite_superior = min(modulos_estimados * 2, 5000)
-                
-                filtro_modulos = self.dados['Núm. Módulos'].between(limite_inferior, limite_superior)
-                fretes_exatos = self.dados[filtro_base & filtro_modulos]
-        else:
-            fretes_exatos = self.dados[filtro_base]
+        filtro_quantidade = self._mascara_quantidade(num_modulos, peso_kg, modo_calculo)
+        if filtro_quantidade is not None:
+            filtro_base &= filtro_quantidade
         
-        if not fretes_exatos.empty:
+        fretes_exatos = np.flatnonzero(filtro_base)
+        if len(fretes_exatos) > 0:
+            if rastro is not None:
+                rastro.registrar('busca', criterio='cidade')
             return fretes_exatos
         
-        # Busca por proximidade (apenas origem)
-        if cidade_origem_formatada.find('/') > 0:
-            cidade_origem_simples = cidade_origem_formatada.split('/')[0]
-            filtro_origem = self.dados['Cidade/Estado'].str.contains(cidade_origem_simples, case=False, na=False)
-            
-            if modo_calculo == "modulos" and num_modulos is not None:
-                limite_inferior = max(1, num_modulos * 0.5)
-                limite_superior = min(num_modulos * 2, 5000)
-                
-                filtro_modulos = self.dados['Núm. Módulos'].between(limite_inferior, limite_superior)
-                fretes_origem = self.dados[filtro_origem & filtro_modulos]
-            elif modo_calculo == "peso" and peso_kg is not None:
-                if 'Peso real (kg)' in self.dados.columns and self.dados['Peso real (kg)'].notna().any():
-                    limite_inferior = max(1, peso_kg * 0.5)
-                    limite_superior = min(peso_kg * 2, 50000)
-                    
-                    filtro_peso = self.dados['Peso real (kg)'].between(limite_inferior, limite_superior)
-                    fretes_origem = self.dados[filtro_origem & filtro_peso]
-                else:
-                    modulos_estimados = max(1, round(peso_kg / 30))
-                    limite_inferior = max(1, modulos_estimados * 0.5)
-                    limite_superior = min(modulos_estimados * 2, 5000)
-                    
-                    filtro_modulos = self.dados['Núm. Módulos'].between(limite_inferior, limite_superior)
-                    fretes_origem = self.dados[filtro_origem & filtro_modulos]
-            else:
-                fretes_origem = self.dados[filtro_origem]
-            
-            if not fretes_origem.empty:
-                return fretes_origem
+        # Busca por proximidade: origem e destino a até RAIO_PROXIMIDADE_KM da cotação
+        coord_origem = self._coordenadas_busca(cidade_origem, prazo_geocodificacao)
+        coord_destino = self._coordenadas_busca(cidade_destino, prazo_geocodificacao)
+        if self.indice_espacial is not None and coord_origem and coord_destino:
+            posicoes = self.indice_espacial.buscar_raio(coord_origem, coord_destino, RAIO_PROXIMIDADE_KM)
+            if filtro_quantidade is not None:
+                posicoes = posicoes[filtro_quantidade[posicoes]]
+            if len(posicoes) > 0:
+                if rastro is not None:
+                    rastro.registrar('busca', criterio='raio', raio_km=RAIO_PROXIMIDADE_KM)
+                return posicoes
         
         # Busca por distância similar
         if distancia:
             # Verificar qual coluna de distância usar (Valinhos ou MC)
-            if cidade_destino_formatada.lower().find('valinhos') >= 0:
+            if 'valinhos' in endereco_destino.chave:
                 coluna_distancia = 'Distancia Valinhos (km)'
             else:
                 # Usar MC como padrão ou verificar qual está mais preenchida
                 coluna_distancia = 'Distancia-MC (km)'
             
-            # Filtrar por distância similar
-            if coluna_distancia in self.dados.columns:
-                # Limitar a faixa de distância para evitar outliers
-                limite_inferior = max(1, distancia * 0.5)
-                limite_superior = min(distancia * 2, 2000)  # Evitar distâncias extremas
-                
-                filtro_distancia = self.dados[coluna_distancia].between(limite_inferior, limite_superior)
-                
-                if modo_calculo == "modulos" and num_modulos is not None:
-                    limite_inferior = max(1, num_modulos * 0.5)
-                    limite_superior = min(num_modulos * 2, 5000)
-                    
-                    filtro_modulos = self.dados['Núm. Módulos'].between(limite_inferior, limite_superior)
-                    fretes_distancia = self.dados[filtro_distancia & filtro_modulos]
-                elif modo_calculo == "peso" and peso_kg is not None:
-                    if 'Peso real (kg)' in self.dados.columns and self.dados['Peso real (kg)'].notna().any():
-                        limite_inferior = max(1, peso_kg * 0.5)
-                        limite_superior = min(peso_kg * 2, 50000)
-                        
-                        filtro_peso = self.dados['Peso real (kg)'].between(limite_inferior, limite_superior)
-                        fretes_distancia = self.dados[filtro_distancia & filtro_peso]
-                    else:
-                        modulos_estimados = max(1, round(peso_kg / 30))
-                        limite_inferior = max(1, modulos_estimados * 0.5)
-                        limite_superior = min(modulos_estimados * 2, 5000)
-                        
-                        filtro_modulos = self.dados['Núm. Módulos'].between(limite_inferior, limite_superior)
-                        fretes_distancia = self.dados[filtro_distancia & filtro_modulos]
-                else:
-                    fretes_distancia = self.dados[filtro_distancia]
-                
-                if not fretes_distancia.empty:
-                    return fretes_distancia
+            # Limitar a faixa de distância para evitar outliers
+            limite_inferior = max(1, distancia * 0.5)
+            limite_superior = min(distancia * 2, 2000)  # Evitar distâncias extremas
+            
+            distancias = numericas[coluna_distancia]
+            filtro_distancia = (distancias >= limite_inferior) & (distancias <= limite_superior)
+            if filtro_quantidade is not None:
+                filtro_distancia &= filtro_quantidade
+            
+            fretes_distancia = np.flatnonzero(filtro_distancia)
+            if len(fretes_distancia) > 0:
+                if rastro is not None:
+                    rastro.registrar('busca', criterio='distancia', coluna=coluna_distancia,
+                                     faixa_km=(limite_inferior, limite_superior))
+                return fretes_distancia
         
-        # Retorna DataFrame vazio se não encontrar nada
-        return pd.DataFrame()
+        # Retorna vazio se não encontrar nada
+        return vazio
     
-    def _calcular_ajuste_inflacao(self, valor, data_referencia):
-        """Calcula o ajuste de inflação com base na data de referência."""
-        hoje = datetime.now()
+    def _buscar_fretes_vizinhos(self, origem, destino, num_modulos=None, peso_kg=None, distancia=None, modo_calculo="modulos",
+                                prazo_geocodificacao=None):
+        """
+        Busca os fretes históricos mais similares no índice de vizinhos.
+        
+        Só geocodifica com `prazo_geocodificacao` (ver _coordenadas_busca).
+        
+        Returns:
+            Tupla (posições dos vizinhos no histórico, pesos de cada vizinho); vazia se não houver
+        """
+        vazio = (np.empty(0, dtype=np.intp), None)
+        if self.indice_similaridade is None or distancia is None:
+            return vazio
+        
+        coord_origem = self._coordenadas_busca(origem, prazo_geocodificacao)
+        coord_destino = self._coordenadas_busca(destino, prazo_geocodificacao)
+        if not coord_origem or not coord_destino:
+            return vazio
         
-        if pd.isna(data_referencia):
-            # Se não tiver data, assume 1 ano de inflação
-            anos = 1
+        if modo_calculo == "peso":
+            quantidade = peso_kg
         else:
-            # Calcula a diferença em anos
-            delta = hoje - data_referencia
-            anos = delta.days / 365
+            quantidade = num_modulos
+        
+        # Só a distância registrada no histórico é rodoviária; as demais saem das coordenadas (linha reta)
+        rodoviaria = self._distancia_historica(origem, destino) is not None
+        posicoes, pesos = self.indice_similaridade.buscar(coord_origem, coord_destino, distancia, quantidade, modo_calculo,
+                                                          distancia_rodoviaria=rodoviaria)
+        if len(posicoes) == 0:
+            return vazio
+        return posicoes, pesos
+    
+    def _obter_resumo_fretes(self, origem, destino, num_modulos=None, peso_kg=None, distancia=None, modo_calculo="modulos", rastro=None,
+                             prazo_geocodificacao=None):
+        """
+        Resume os fretes históricos similares à cotação.
         
-        # Aplica a inflação composta
-        fator_inflacao = (1 + TAXA_INFLACAO_ANUAL) ** anos
-        return valor * (fator_inflacao - 1)  # Retorna apenas o incremento
+        No modo de filtros, rotas conhecidas são respondidas pelos agregados
+        pré-calculados; as demais seguem a busca em cascata.
+        
+        Args:
+            prazo_geocodificacao: Instante limite para geocodificar nas buscas
+                (None = não geocodificar, ver _coordenadas_busca)
+        
+        Returns:
+            ResumoFretes ou None se não houver fretes similares
+        """
+        quantidade = peso_kg if modo_calculo == "peso" else num_modulos
+        if self.estrategia_busca == "knn":
+            posicoes, pesos = self._buscar_fretes_vizinhos(origem, destino, num_modulos, peso_kg, distancia, modo_calculo,
+                                                           prazo_geocodificacao)
+            if rastro is not None:
+                rastro.registrar('candidatos', fonte='knn', posicoes=posicoes, pesos=pesos)
+            if self.estrategia_agregacao != "media":
+                return self._agregar_fretes(posicoes, quantidade, distancia, modo_calculo, pesos)
+            return self._resumir_fretes(posicoes, pesos)
+        
+        # Os agregados por rota só guardam somas, que não permitem normalizar frete a frete
+        faixa = self._faixa_quantidade(num_modulos, peso_kg, modo_calculo)
+        if self.agregados_rotas is not None and self.estrategia_agregacao == "media" and faixa is not None:
+            endereco_origem = self._endereco(origem)
+            resumo = self.agregados_rotas.resumir(faixa, endereco_origem.chave, self._endereco(destino).destino)
+            if resumo is not None:
+                if rastro is not None:
+                    rastro.registrar('candidatos', fonte='agregados', origem=endereco_origem.cidade_estado, quantidade=quantidade)
+                return resumo
+        
+        posicoes = self._buscar_fretes_similares(origem, destino, num_modulos, peso_kg, distancia, modo_calculo, rastro,
+                                                 prazo_geocodificacao)
+        if rastro is not None:
+            rastro.registrar('candidatos', fonte='filtros', posicoes=posicoes)
+        if self.estrategia_agregacao != "media":
+            return self._agregar_fretes(posicoes, quantidade, distancia, modo_calculo)
+        return self._resumir_fretes(posicoes)
+    
+    def _quantidades_base(self, posicoes, modo_calculo):
+        """
+        Quantidade de cada frete na unidade da cotação.
+        
+        No modo peso, fretes sem peso usam os módulos (30 kg por módulo) e, sem
+        módulos, a carga padrão (como _ajustar_por_peso).
+        """
+        numericas = self.historico.numericas
+        modulos = numericas['Núm. Módulos'][posicoes]
+        if modo_calculo != "peso":
+            return modulos
+        pesos = numericas['Peso real (kg)'][posicoes]
+        estimados = np.where(np.isfinite(modulos) & (modulos > 0), modulos * PESO_POR_MODULO_KG, PESO_PADRAO)
+        return np.where(np.isfinite(pesos) & (pesos > 0), pesos, estimados)
+    
+    def _agregar_fretes(self, posicoes, quantidade, distancia, modo_calculo, pesos=None):
+        """
+        Resume os fretes normalizando cada um para a cotação (ver agregacao).
+        
+        Na estratégia "ponderada", os pesos de similaridade multiplicam os pesos
+        da busca (knn), quando houver; na "aparada", os pesos da busca são
+        ignorados.
+        
+        Returns:
+            ResumoFretes com o ajuste de quantidade já calculado, ou None se não houver fretes
+        """
+        if len(posicoes) == 0:
+            return None
+        
+        quantidades_base = self._quantidades_base(posicoes, modo_calculo)
+        resultado = agregacao.agregar(
+            self.historico.numericas['(R$) Frete'][posicoes],
+            self.inflacao.fatores(self._datas_referencia[posicoes]),
+            agregacao.fatores_escala(quantidades_base, quantidade),
+            self._pesos_agregacao(posicoes, quantidades_base, quantidade, distancia, pesos),
+            self._fracao_aparada()
+        )
+        if resultado is None:
+            return None
+        return ResumoFretes(
+            quantidade=resultado.quantidade,
+            valor_medio=resultado.valor_medio,
+            modulos_medio=np.nan,
+            peso_medio=np.nan,
+            ajuste_inflacao=resultado.ajuste_inflacao,
+            ajuste_quantidade=resultado.ajuste_quantidade,
+            posicoes=posicoes,
+            pesos=pesos
+        )
+    
+    def _pesos_agregacao(self, posicoes, quantidades_base, quantidade, distancia, pesos=None):
+        """Pesos dos fretes na agregação: similaridade × pesos da busca na "ponderada", nenhum na "aparada"."""
+        if self.estrategia_agregacao == "ponderada":
+            similaridade = agregacao.pesos_similaridade(quantidades_base, quantidade, self._distancias_historico[posicoes], distancia)
+            return similaridade * pesos if pesos is not None else similaridade
+        if self.estrategia_agregacao == "aparada":
+            return None
+        return pesos
+    
+    def _fracao_aparada(self):
+        return agregacao.FRACAO_APARADA if self.estrategia_agregacao == "aparada" else 0.0
+    
+    def _resumir_fretes(self, posicoes, pesos=None):
+        """
+        Resume os fretes nas posições indicadas (média, quantidades médias e ajuste de inflação).
+        
+        Lê apenas as colunas necessárias, direto dos arrays do histórico.
+        """
+        if len(posicoes) == 0:
+            return None
+        
+        numericas = self.historico.numericas
+        valores = numericas['(R$) Frete'][posicoes]
+        datas = self._datas_referencia[posicoes]
+        
+        return ResumoFretes(
+            quantidade=len(posicoes),
+            valor_medio=self._media(valores, pesos),
+            modulos_medio=self._media(numericas['Núm. Módulos'][posicoes], pesos),
+            peso_medio=self._media(numericas['Peso real (kg)'][posicoes], pesos),
+            # Cada frete corrigido pela sua própria data
+            ajuste_inflacao=self._calcular_ajuste_inflacao(valores, datas, pesos),
+            posicoes=posicoes,
+            pesos=pesos
+        )
+    
+    def _media(self, valores, pesos=None):
+        """Média dos valores preenchidos, ponderada pelos pesos quando informados."""
+        valores = np.asarray(valores, dtype=np.float64)
+        preenchidos = np.isfinite(valores)
+        if not preenchidos.any():
+            return np.nan
+        if pesos is None:
+            return float(np.mean(valores[preenchidos]))
+        return float(np.average(valores[preenchidos], weights=pesos[preenchidos]))
+    
+    def _calcular_ajuste_inflacao(self, valores, datas, pesos=None):
+        """
+        Calcula o ajuste de inflação corrigindo cada frete pela sua própria data.
+        
+        Args:
+            valores: Array com os valores históricos dos fretes
+            datas: Array datetime64 com a data de cada frete (NaT = um ano atrás)
+            pesos: Pesos de cada frete na média (opcional)
+        
+        Returns:
+            Incremento da média corrigida em relação à média original
+        """
+        valores = np.asarray(valores, dtype=np.float64)
+        fatores = self.inflacao.fatores(datas)
+        return self._media(valores * fatores, pesos) - self._media(valores, pesos)
     
     def _ajustar_por_modulos(self, valor_base, modulos_base, modulos_alvo):
         """Ajusta o valor com base na diferença de módulos."""
@@ -596,156 +1033,127 @@ class CalculadoraFrete:
         ajuste = valor_base * (fator - 1)
         return ajuste
     
-    def _calcular_valor_referencia(self, distancia, num_modulos=None, peso_kg=None, modo_calculo="modulos"):
-        """Calcula o valor de referência com base nas tabelas estatísticas."""
-        faixa_distancia = self._obter_faixa_distancia(distancia)
-        valor_ref_distancia = VALORES_REFERENCIA_DISTANCIA[faixa_distancia]['valor_medio']
-        
-        if modo_calculo == "modulos" and num_modulos is not None:
-            faixa_modulos = self._obter_faixa_modulos(num_modulos)
-            valor_ref_modulos = VALORES_REFERENCIA_MODULOS[faixa_modulos]['valor_medio']
-            
-            # Média ponderada: 60% distância, 40% módulos
-            valor_referencia = (valor_ref_distancia * 0.6) + (valor_ref_modulos * 0.4)
-            
-            # Ajuste fino por módulos
-            valor_por_modulo = VALORES_REFERENCIA_MODULOS[faixa_modulos]['valor_por_modulo']
-            modulos_base = {'0-50': 25, '50-100': 75, '100-200': 150, '200-500': 350, '500-1000': 750, '1000+': 1500}[faixa_modulos]
-            ajuste_modulos = (num_modulos - modulos_base) * valor_por_modulo * 0.1  # 10% do valor por módulo
-            
-            return valor_referencia + ajuste_modulos
-            
-        elif modo_calculo == "peso" and peso_kg is not None:
-            faixa_peso = self._obter_faixa_peso(peso_kg)
-            valor_ref_peso = VALORES_REFERENCIA_PESO[faixa_peso]['valor_medio']
-            
-            # Média ponderada: 60% distância, 40% peso
-            valor_referencia = (valor_ref_distancia * 0.6) + (valor_ref_peso * 0.4)
-            
-            # Ajuste fino por peso
-            valor_por_kg = VALORES_REFERENCIA_PESO[faixa_peso]['valor_por_kg']
-            peso_base = {'0-1000': 500, '1000-5000': 3000, '5000-10000': 7500, '10000-20000': 15000, '20000-50000': 35000, '50000+': 75000}[faixa_peso]
-            ajuste_peso = (peso_kg - peso_base) * valor_por_kg * 0.1  # 10% do valor por kg
-            
-            return valor_referencia + ajuste_peso
+    def _calcular_valor_referencia(self, distancia, num_modulos=None, peso_kg=None, modo_calculo="modulos", politica=None):
+        """Calcula o valor de referência com base nas tabelas da política de preços."""
+        politica = politica or self.fonte_politica.atual()
+        quantidade = num_modulos if modo_calculo == "modulos" else peso_kg
+        return float(politica.valor_referencia(distancia, quantidade, modo_calculo))
+    
+    def calcular_frete(self, origem, destino, num_modulos=None, peso_kg=None, data_prevista=None, modo_calculo="modulos",
+                       cliente=None):
+        """
+        Calcula o valor estimado do frete com base nos parâmetros fornecidos.
         
+        `cliente` apenas identifica a cotação no diário (não altera o valor).
+        """
+        if self.rastros is None:
+            resultado = self._calcular_frete(origem, destino, num_modulos, peso_kg, data_prevista, modo_calculo)
         else:
-            # Se não tiver módulos nem peso, usa apenas distância
-            return valor_ref_distancia
-    
-    def calcular_frete(self, origem, destino, num_modulos=None, peso_kg=None, data_prevista=None, modo_calculo="modulos"):
-        """Calcula o valor estimado do frete com base nos parâmetros fornecidos."""
-        resultado = {
-            'status': 'erro',
-            'mensagem': 'Erro ao calcular frete',
-            'valor_estimado': 0,
-            'valor_por_km': 0,
-            'distancia_km': 0,
-            'origem': origem,
-            'destino': destino,
-            'modo_calculo': modo_calculo,
-            'valor_medio_original': 0,
-            'ajuste_quantidade': 0,
-            'ajuste_inflacao': 0,
-            'margem_aplicada': 0,
-            'multiplicador_regional': 1.0,
-            'fator_correcao_rota': 1.0,
-            'valor_absoluto': False
-        }
+            rastro = self.rastros.novo(origem=origem, destino=destino, num_modulos=num_modulos, peso_kg=peso_kg,
+                                       modo_calculo=modo_calculo, estrategia_busca=self.estrategia_busca,
+                                       estrategia_agregacao=self.estrategia_agregacao)
+            resultado = self._calcular_frete(origem, destino, num_modulos, peso_kg, data_prevista, modo_calculo, rastro)
+            rastro.concluir(resultado)
+            resultado.id_cotacao = rastro.id_cotacao
+        self._registrar_diario(resultado, num_modulos, peso_kg, cliente)
+        return resultado
+    
+    def _registrar_diario(self, resultado, num_modulos=None, peso_kg=None, cliente=None):
+        """Enfileira a cotação no diário, se houver (a gravação ocorre em segundo plano)."""
+        if self.diario is None:
+            return
+        self.diario.registrar(resultado, num_modulos, peso_kg, cliente,
+                              self._endereco(resultado.origem).chave, self._endereco(resultado.destino).chave,
+                              not self._distancia_exata(resultado.origem, resultado.destino))
+    
+    def _distancia_exata(self, origem, destino):
+        """
+        Indica se a distância da rota não depende de posições aproximadas.
+        
+        Posições aproximadas (geocodificador indisponível) nunca entram em
+        _cache_coordenadas; a distância é exata se as duas pontas estiverem
+        nele ou se a rota tiver distância conhecida sem geocodificação.
+        """
+        if origem in self._cache_coordenadas and destino in self._cache_coordenadas:
+            return True
+        return (self.rotas_locais.distancia(self._endereco(origem), self._endereco(destino)) is not None
+                or self._distancia_historica(origem, destino) is not None
+                or (origem, destino) in self._distancias_diario)
+    
+    def obter_rastro(self, id_cotacao):
+        """Retorna o rastro de uma cotação como dicionário (None se não houver)."""
+        if self.rastros is None:
+            return None
+        rastro = self.rastros.obter(id_cotacao)
+        return rastro.to_dict() if rastro is not None else None
+    
+    def _calcular_frete(self, origem, destino, num_modulos, peso_kg, data_prevista, modo_calculo, rastro=None):
+        """Executa o cálculo de calcular_frete, registrando as etapas em `rastro` quando informado."""
+        resultado = ResultadoCotacao(origem=origem, destino=destino, modo_calculo=modo_calculo)
+        # A mesma versão da política vale para toda a cotação, mesmo se recarregada no meio
+        politica = self.fonte_politica.atual()
         
         # Verificar se existe um valor absoluto definido para esta rota
         valor_absoluto = self._verificar_valor_absoluto(origem, destino, num_modulos)
         if valor_absoluto is not None:
             # Se encontrou um valor absoluto, usa-o diretamente
-            resultado['status'] = 'sucesso'
-            resultado['mensagem'] = 'Frete calculado com base em valor absoluto conhecido'
-            resultado['valor_estimado'] = valor_absoluto
-            resultado['valor_absoluto'] = True
+            resultado.status = 'sucesso'
+            resultado.mensagem = 'Frete calculado com base em valor absoluto conhecido'
+            resultado.valor_estimado = valor_absoluto
+            resultado.valor_absoluto = True
+            if rastro is not None:
+                rastro.registrar('calculo', ramo='valor_absoluto', valor=valor_absoluto)
             
             # Calcular distância apenas para informação
             distancia = self._calcular_distancia(origem, destino)
             if distancia:
-                resultado['distancia_km'] = distancia
-                resultado['valor_por_km'] = valor_absoluto / distancia if distancia > 0 else 0
+                resultado.distancia_km = distancia
+                resultado.valor_por_km = valor_absoluto / distancia if distancia > 0 else 0
             
             return resultado
         
-        # Calcular distância
-        distancia = self._calcular_distancia(origem, destino)
+        # Calcular distância; rotas de distância conhecida não consultam o geocodificador em
+        # nenhuma etapa, e as novas dividem um único orçamento de tempo entre todas elas
+        distancia = self._distancia_conhecida(origem, destino)
+        prazo_geocodificacao = None
+        if distancia is None:
+            prazo_geocodificacao = time.monotonic() + ORCAMENTO_COTACAO_S
+            distancia = self._distancia_geocodificada(origem, destino, prazo_geocodificacao)
         if not distancia:
-            resultado['mensagem'] = 'Não foi possível calcular a distância entre origem e destino'
+            resultado.mensagem = 'Não foi possível calcular a distância entre origem e destino'
+            if rastro is not None:
+                rastro.registrar('calculo', ramo='sem_distancia')
             return resultado
         
-        resultado['distancia_km'] = distancia
+        resultado.distancia_km = distancia
         
         # Obter multiplicador regional
-        multiplicador_regional = self._obter_multiplicador_regional(origem, destino)
-        resultado['multiplicador_regional'] = multiplicador_regional
+        codigo_origem = self._codigo_localidade(origem)
+        codigo_destino = self._codigo_localidade(destino)
+        multiplicador_regional = float(politica.multiplicador_regional(codigo_origem, codigo_destino))
+        resultado.multiplicador_regional = multiplicador_regional
         
         # Obter fator de correção específico para a rota
         fator_correcao_rota = self._obter_fator_correcao_rota(origem, destino)
-        resultado['fator_correcao_rota'] = fator_correcao_rota
+        resultado.fator_correcao_rota = fator_correcao_rota
+        if rastro is not None:
+            rastro.registrar('multiplicadores', distancia_km=distancia, codigo_origem=codigo_origem,
+                             codigo_destino=codigo_destino, multiplicador_regional=multiplicador_regional,
+                             fator_correcao_rota=fator_correcao_rota, politica=politica.versao)
         
-        # Para fretes curtos (menos de 10km), usar lógica específica
-        if distancia < 10:
-            # Usar valor base para fretes curtos
-            valor_base = VALOR_MEDIO_FRETE_CURTO
-            
-            # Ajuste por módulos ou peso
-            if modo_calculo == "modulos" and num_modulos is not None:
-                # Ajuste por módulos: 200 módulos é o padrão
-                modulos_padrao = 200
-                ajuste_quantidade = self._ajustar_por_modulos(valor_base, modulos_padrao, num_modulos)
-            elif modo_calculo == "peso" and peso_kg is not None:
-                # Ajuste por peso: 6000kg é o padrão (200 módulos * 30kg)
-                peso_padrao = 6000
-                ajuste_quantidade = self._ajustar_por_peso(valor_base, peso_padrao, peso_kg)
-            else:
-                ajuste_quantidade = 0
-            
-            # Sem ajuste de inflação para fretes curtos
-            ajuste_inflacao = 0
-            
-            # Valor final antes da margem
-            valor_final = valor_base + ajuste_quantidade + ajuste_inflacao
-            
-            # Aplicar multiplicador regional e fator de correção de rota
-            if self._determinar_regiao(origem) == 'Sudeste' and self._determinar_regiao(destino) == 'Sudeste':
-                # Para Sudeste->Sudeste, aplicar multiplicador específico por distância
-                multiplicador_distancia = self._obter_multiplicador_distancia_sudeste(distancia)
-                valor_final *= multiplicador_distancia
-            else:
-                # Para outras regiões, aplicar multiplicador regional
-                valor_final *= multiplicador_regional
-            
-            # Aplicar fator de correção específico para a rota
-            valor_final *= fator_correcao_rota
-            
-            # Aplicar margem adicional
-            margem = valor_final * MARGEM_ADICIONAL
-            valor_estimado = valor_final + margem
-            
-            # Calcular valor por km
-            valor_por_km = valor_estimado / distancia if distancia > 0 else 0
-            
-            # Preencher resultado
-            resultado['status'] = 'sucesso'
-            resultado['mensagem'] = 'Frete calculado com sucesso'
-            resultado['valor_estimado'] = round(valor_estimado, 2)
-            resultado['valor_por_km'] = round(valor_por_km, 2)
-            resultado['valor_medio_original'] = round(valor_base, 2)
-            resultado['ajuste_quantidade'] = round(ajuste_quantidade, 2)
-            resultado['ajuste_inflacao'] = round(ajuste_inflacao, 2)
-            resultado['margem_aplicada'] = round(margem, 2)
-            
-            return resultado
+        # Para fretes curtos (menos de 10km), usar lógica específica, sem o histórico
+        if distancia < LIMITE_FRETE_CURTO_KM:
+            multiplicador = float(politica.multiplicador(codigo_origem, codigo_destino, distancia))
+            return self._calcular_frete_curto(resultado, distancia, num_modulos, peso_kg, modo_calculo,
+                                              multiplicador, fator_correcao_rota, politica, rastro)
         
         # Para fretes normais (não curtos), buscar fretes similares
-        fretes_similares = self._buscar_fretes_similares(origem, destino, num_modulos, peso_kg, distancia, modo_calculo)
+        resumo = self._obter_resumo_fretes(origem, destino, num_modulos, peso_kg, distancia, modo_calculo, rastro,
+                                           prazo_geocodificacao)
         
         # Se não encontrou fretes similares, usar valores de referência
-        if fretes_similares.empty:
-            valor_base = self._calcular_valor_referencia(distancia, num_modulos, peso_kg, modo_calculo)
+        if resumo is None:
+            valor_base = self._calcular_valor_referencia(distancia, num_modulos, peso_kg, modo_calculo, politica)
             
             # Sem ajustes adicionais, pois o valor de referência já considera módulos/peso
             ajuste_quantidade = 0
@@ -754,103 +1162,327 @@ class CalculadoraFrete:
             # Valor final antes da margem
             valor_final = valor_base
             
-            # Aplicar multiplicador regional e fator de correção de rota
-            if self._determinar_regiao(origem) == 'Sudeste' and self._determinar_regiao(destino) == 'Sudeste':
-                # Para Sudeste->Sudeste, aplicar multiplicador específico por distância
-                multiplicador_distancia = self._obter_multiplicador_distancia_sudeste(distancia)
-                valor_final *= multiplicador_distancia
-            else:
-                # Para outras regiões, aplicar multiplicador regional
-                valor_final *= multiplicador_regional
+            # Aplicar multiplicador (por distância em Sudeste->Sudeste, regional nas demais rotas)
+            multiplicador = float(politica.multiplicador(codigo_origem, codigo_destino, distancia))
+            valor_final *= multiplicador
             
             # Aplicar fator de correção específico para a rota
             valor_final *= fator_correcao_rota
             
             # Aplicar margem adicional
-            margem = valor_final * MARGEM_ADICIONAL
+            margem = valor_final * politica.margem_adicional
             valor_estimado = valor_final + margem
             
             # Calcular valor por km
             valor_por_km = valor_estimado / distancia if distancia > 0 else 0
             
+            if rastro is not None:
+                rastro.registrar('calculo', ramo='referencia', valor_base=valor_base, ajuste_quantidade=ajuste_quantidade,
+                                 ajuste_inflacao=ajuste_inflacao, multiplicador=multiplicador, valor_final=valor_final, margem=margem)
+            
             # Preencher resultado
-            resultado['status'] = 'sucesso'
-            resultado['mensagem'] = 'Frete calculado com base em valores de referência'
-            resultado['valor_estimado'] = round(valor_estimado, 2)
-            resultado['valor_por_km'] = round(valor_por_km, 2)
-            resultado['valor_medio_original'] = round(valor_base, 2)
-            resultado['ajuste_quantidade'] = round(ajuste_quantidade, 2)
-            resultado['ajuste_inflacao'] = round(ajuste_inflacao, 2)
-            resultado['margem_aplicada'] = round(margem, 2)
+            resultado.status = 'sucesso'
+            resultado.mensagem = 'Frete calculado com base em valores de referência'
+            resultado.valor_estimado = round(valor_estimado, 2)
+            resultado.valor_por_km = round(valor_por_km, 2)
+            resultado.valor_medio_original = round(valor_base, 2)
+            resultado.ajuste_quantidade = round(ajuste_quantidade, 2)
+            resultado.ajuste_inflacao = round(ajuste_inflacao, 2)
+            resultado.margem_aplicada = round(margem, 2)
             
             return resultado
         
-        # Calcular valor médio dos fretes similares
-        valor_medio = fretes_similares['(R$) Frete'].mean()
+        valor_medio = resumo.valor_medio
+        ajuste_inflacao = resumo.ajuste_inflacao
         
         # Calcular ajuste por módulos ou peso
-        if modo_calculo == "modulos" and num_modulos is not None:
-            modulos_medio = fretes_similares['Núm. Módulos'].mean()
-            ajuste_quantidade = self._ajustar_por_modulos(valor_medio, modulos_medio, num_modulos)
+        if resumo.ajuste_quantidade is not None:
+            # Já calculado frete a frete pela estratégia de agregação
+            ajuste_quantidade = resumo.ajuste_quantidade
+        elif modo_calculo == "modulos" and num_modulos is not None:
+            ajuste_quantidade = self._ajustar_por_modulos(valor_medio, resumo.modulos_medio, num_modulos)
         elif modo_calculo == "peso" and peso_kg is not None:
-            if 'Peso real (kg)' in fretes_similares.columns and fretes_similares['Peso real (kg)'].notna().any():
-                peso_medio = fretes_similares['Peso real (kg)'].mean()
-                ajuste_quantidade = self._ajustar_por_peso(valor_medio, peso_medio, peso_kg)
+            if not pd.isna(resumo.peso_medio):
+                ajuste_quantidade = self._ajustar_por_peso(valor_medio, resumo.peso_medio, peso_kg)
             else:
                 # Se não tiver peso, estima com base em módulos (30kg por módulo)
-                modulos_medio = fretes_similares['Núm. Módulos'].mean()
-                peso_medio = modulos_medio * 30
+                peso_medio = resumo.modulos_medio * 30
                 ajuste_quantidade = self._ajustar_por_peso(valor_medio, peso_medio, peso_kg)
         else:
             ajuste_quantidade = 0
         
-        # Calcular ajuste de inflação
-        data_referencia = None
-        for col in ['Data Envio Proposta', 'Data de Orçamento', 'Previsão para descarte']:
-            if col in fretes_similares.columns and fretes_similares[col].notna().any():
-                data_referencia = fretes_similares[col].mean()
-                break
-        
-        ajuste_inflacao = self._calcular_ajuste_inflacao(valor_medio, data_referencia)
-        
         # Valor final antes da margem
         valor_final = valor_medio + ajuste_quantidade + ajuste_inflacao
         
-        # Aplicar multiplicador regional e fator de correção de rota
-        if self._determinar_regiao(origem) == 'Sudeste' and self._determinar_regiao(destino) == 'Sudeste':
-            # Para Sudeste->Sudeste, aplicar multiplicador específico por distância
-            multiplicador_distancia = self._obter_multiplicador_distancia_sudeste(distancia)
-            valor_final *= multiplicador_distancia
-        else:
-            # Para outras regiões, aplicar multiplicador regional
-            valor_final *= multiplicador_regional
+        # Aplicar multiplicador (por distância em Sudeste->Sudeste, regional nas demais rotas)
+        multiplicador = float(politica.multiplicador(codigo_origem, codigo_destino, distancia))
+        valor_final *= multiplicador
         
         # Aplicar fator de correção específico para a rota
         valor_final *= fator_correcao_rota
         
         # Aplicar margem adicional
-        margem = valor_final * MARGEM_ADICIONAL
+        margem = valor_final * politica.margem_adicional
         valor_estimado = valor_final + margem
         
         # Calcular valor por km
         valor_por_km = valor_estimado / distancia if distancia > 0 else 0
         
+        if rastro is not None:
+            rastro.registrar('calculo', ramo='historico', fretes_base=resumo.quantidade, resumo=resumo,
+                             valor_base=valor_medio, ajuste_quantidade=ajuste_quantidade, ajuste_inflacao=ajuste_inflacao,
+                             multiplicador=multiplicador, valor_final=valor_final, margem=margem)
+        
         # Preencher resultado
-        resultado['status'] = 'sucesso'
-        resultado['mensagem'] = 'Frete calculado com sucesso'
-        resultado['valor_estimado'] = round(valor_estimado, 2)
-        resultado['valor_por_km'] = round(valor_por_km, 2)
-        resultado['valor_medio_original'] = round(valor_medio, 2)
-        resultado['ajuste_quantidade'] = round(ajuste_quantidade, 2)
-        resultado['ajuste_inflacao'] = round(ajuste_inflacao, 2)
-        resultado['margem_aplicada'] = round(margem, 2)
-        resultado['fretes_base'] = len(fretes_similares)
+        resultado.status = 'sucesso'
+        resultado.mensagem = 'Frete calculado com sucesso'
+        resultado.valor_estimado = round(valor_estimado, 2)
+        resultado.valor_por_km = round(valor_por_km, 2)
+        resultado.valor_medio_original = round(valor_medio, 2)
+        resultado.ajuste_quantidade = round(ajuste_quantidade, 2)
+        resultado.ajuste_inflacao = round(ajuste_inflacao, 2)
+        resultado.margem_aplicada = round(margem, 2)
+        resultado.fretes_base = resumo.quantidade
+        
+        if self.intervalos:
+            self._estimar_intervalo(resultado, valor_estimado, resumo, num_modulos, peso_kg, distancia, modo_calculo)
+        
+        return resultado
+    
+    def _estimar_intervalo(self, resultado, valor_estimado, resumo, num_modulos, peso_kg, distancia, modo_calculo):
+        """
+        Estima os percentis do valor pelo bootstrap dos fretes candidatos (ver intervalos).
+        
+        Os candidatos são os mesmos fretes que formaram o valor (resumo.posicoes),
+        inclusive quando ele veio dos agregados por rota. Os fretes são normalizados para a cotação (inflação e escala de quantidade,
+        como em agregacao) e os percentis, relativos à estatística da amostra,
+        são aplicados ao valor estimado. Dentro de calcular_fretes_stream a
+        estimativa fica pendente e é feita para o micro-lote inteiro de uma vez.
+        """
+        posicoes, pesos = resumo.posicoes, resumo.pesos
+        quantidade = peso_kg if modo_calculo == "peso" else num_modulos
+        quantidades_base = self._quantidades_base(posicoes, modo_calculo)
+        normalizados = (self.historico.numericas['(R$) Frete'][posicoes]
+                        * self.inflacao.fatores(self._datas_referencia[posicoes])
+                        * agregacao.fatores_escala(quantidades_base, quantidade))
+        conjunto = (normalizados, self._pesos_agregacao(posicoes, quantidades_base, quantidade, distancia, pesos))
+        
+        pendente = (resultado, valor_estimado, conjunto)
+        pendentes_lote = getattr(self._lote, 'intervalos', None)
+        if pendentes_lote is not None:
+            pendentes_lote.append(pendente)
+        else:
+            self._preencher_intervalos([pendente])
+    
+    def _preencher_intervalos(self, pendentes):
+        """Estima de uma vez os intervalos pendentes (resultado, valor estimado, candidatos) e preenche os resultados."""
+        razoes = intervalos.percentis_lote([conjunto for _, _, conjunto in pendentes], self._fracao_aparada())
+        for (resultado, valor_estimado, _), razoes_cotacao in zip(pendentes, razoes):
+            if razoes_cotacao is None:
+                continue
+            resultado.valor_p10, resultado.valor_p50, resultado.valor_p90 = (
+                round(float(valor_estimado * razao), 2) for razao in razoes_cotacao
+            )
+
+    def _quantidade_frete_curto(self, num_modulos, peso_kg, modo_calculo):
+        """Retorna (quantidade da cotação ou None, carga padrão) para o ajuste dos fretes curtos."""
+        if modo_calculo == "modulos" and num_modulos is not None:
+            return num_modulos, QUANTIDADE_PADRAO['modulos']
+        if modo_calculo == "peso" and peso_kg is not None:
+            return peso_kg, QUANTIDADE_PADRAO['peso']
+        return None, QUANTIDADE_PADRAO['modulos']
+    
+    def _calcular_frete_curto(self, resultado, distancia, num_modulos, peso_kg, modo_calculo,
+                              multiplicador, fator_correcao_rota, politica, rastro=None):
+        """
+        Precifica um frete curto a partir do valor base da política (sem ajuste de inflação).
         
+        Args:
+            resultado: ResultadoCotacao a preencher
+            multiplicador: Multiplicador da rota (por distância ou regional)
+            fator_correcao_rota: Fator de correção específico da rota
+            politica: Versão da política de preços usada na cotação
+        """
+        valor_base = politica.valor_medio_frete_curto
+        quantidade, quantidade_padrao = self._quantidade_frete_curto(num_modulos, peso_kg, modo_calculo)
+        ajuste_quantidade, valor_final, margem, valor_estimado = precificar_curto(
+            valor_base, quantidade, quantidade_padrao, multiplicador, fator_correcao_rota, politica.margem_adicional
+        )
+        if rastro is not None:
+            rastro.registrar('calculo', ramo='frete_curto', valor_base=valor_base, ajuste_quantidade=ajuste_quantidade,
+                             ajuste_inflacao=0, multiplicador=multiplicador, valor_final=valor_final, margem=margem)
+        self._preencher_frete_curto(resultado, distancia, valor_base, ajuste_quantidade, margem, valor_estimado)
         return resultado
+    
+    def _preencher_frete_curto(self, resultado, distancia, valor_base, ajuste_quantidade, margem, valor_estimado):
+        """Preenche o resultado de um frete curto já precificado."""
+        resultado.status = 'sucesso'
+        resultado.mensagem = 'Frete calculado com sucesso'
+        resultado.valor_estimado = round(float(valor_estimado), 2)
+        resultado.valor_por_km = round(float(valor_estimado) / distancia, 2) if distancia > 0 else 0
+        resultado.valor_medio_original = round(valor_base, 2)
+        resultado.ajuste_quantidade = round(float(ajuste_quantidade), 2)
+        resultado.ajuste_inflacao = 0
+        resultado.margem_aplicada = round(float(margem), 2)
+    
+    def _precificar_curtos_lote(self, lote):
+        """
+        Precifica de uma só vez os fretes curtos de um micro-lote.
+        
+        As cotações com valor absoluto ou distância a partir de
+        LIMITE_FRETE_CURTO_KM ficam de fora e seguem o cálculo normal.
+        
+        Returns:
+            Dicionário posição no lote -> ResultadoCotacao
+        """
+        politica = self.fonte_politica.atual()
+        curtos = []
+        for posicao, requisicao in enumerate(lote):
+            origem, destino = requisicao['origem'], requisicao['destino']
+            num_modulos = requisicao.get('num_modulos')
+            if self._verificar_valor_absoluto(origem, destino, num_modulos) is not None:
+                continue
+            # Distância já resolvida pelo micro-lote (None se a rota não pôde ser geocodificada)
+            distancia = self._lote.distancias[(origem, destino)]
+            if not distancia or distancia >= LIMITE_FRETE_CURTO_KM:
+                continue
+            modo_calculo = requisicao.get('modo_calculo', 'modulos')
+            quantidade, quantidade_padrao = self._quantidade_frete_curto(num_modulos, requisicao.get('peso_kg'), modo_calculo)
+            curtos.append((
+                posicao, distancia, self._codigo_localidade(origem), self._codigo_localidade(destino),
+                self._obter_fator_correcao_rota(origem, destino), np.nan if quantidade is None else quantidade,
+                quantidade_padrao
+            ))
+        if not curtos:
+            return {}
+        
+        posicoes, distancias, codigos_origem, codigos_destino, fatores, quantidades, padroes = (np.array(c) for c in zip(*curtos))
+        codigos_origem = codigos_origem.astype(np.intp)
+        codigos_destino = codigos_destino.astype(np.intp)
+        multiplicadores = politica.multiplicador(codigos_origem, codigos_destino, distancias)
+        multiplicadores_regionais = politica.multiplicador_regional(codigos_origem, codigos_destino)
+        valor_base = politica.valor_medio_frete_curto
+        ajustes, _, margens, valores_estimados = precificar_curtos(
+            valor_base, quantidades, padroes, multiplicadores, fatores, politica.margem_adicional
+        )
+        
+        resultados = {}
+        for k, posicao in enumerate(posicoes.tolist()):
+            requisicao = lote[posicao]
+            resultado = ResultadoCotacao(origem=requisicao['origem'], destino=requisicao['destino'],
+                                         modo_calculo=requisicao.get('modo_calculo', 'modulos'))
+            resultado.distancia_km = float(distancias[k])
+            resultado.multiplicador_regional = float(multiplicadores_regionais[k])
+            resultado.fator_correcao_rota = float(fatores[k])
+            self._preencher_frete_curto(resultado, resultado.distancia_km, valor_base, ajustes[k], margens[k], valores_estimados[k])
+            resultados[posicao] = resultado
+        return resultados
+    
+    def calcular_fretes_stream(self, requisicoes, tamanho_lote=TAMANHO_LOTE_STREAM):
+        """
+        Calcula fretes de forma preguiçosa a partir de qualquer iterável de requisições.
+        
+        As requisições são consumidas em micro-lotes de até `tamanho_lote`: as
+        rotas conhecidas usam a distância já registrada, os endereços distintos
+        das demais são geocodificados uma única vez antes da precificação, e
+        apenas um lote fica em memória por vez. Os resultados de cada lote são
+        entregues depois de o lote inteiro ser calculado.
+        
+        Args:
+            requisicoes: Iterável de dicionários com os argumentos de calcular_frete
+                (origem, destino, num_modulos, peso_kg, data_prevista, modo_calculo, cliente)
+            tamanho_lote: Número máximo de requisições mantidas em memória
+        
+        Com o modo de intervalos, os intervalos do micro-lote são estimados de
+        uma vez (uma única matriz de reamostragem) antes de os resultados do
+        lote serem entregues.
+        
+        Yields:
+            Resultado de cada requisição, na mesma ordem da entrada
+        """
+        iterador = iter(requisicoes)
+        while True:
+            lote = list(itertools.islice(iterador, tamanho_lote))
+            if not lote:
+                return
+            
+            distancias_lote = {}
+            rotas_novas = []
+            for rota in dict.fromkeys((r['origem'], r['destino']) for r in lote):
+                distancia = self._distancia_conhecida(*rota)
+                if distancia is not None:
+                    distancias_lote[rota] = distancia
+                else:
+                    rotas_novas.append(rota)
+            
+            # Geocodifica uma única vez cada endereço distinto das rotas novas, com o
+            # orçamento de uma cotação para cada rota
+            coordenadas = {}
+            for rota in rotas_novas:
+                prazo = time.monotonic() + ORCAMENTO_COTACAO_S
+                for endereco in rota:
+                    if endereco not in coordenadas:
+                        coordenadas[endereco] = self._obter_coordenadas(endereco, prazo)
+            
+            # Distâncias das rotas novas em uma única chamada vetorizada; as que não puderam
+            # ser geocodificadas ficam com None, sem nova consulta no restante do lote
+            distancias_lote.update((rota, None) for rota in rotas_novas)
+            rotas = [rota for rota in rotas_novas if coordenadas[rota[0]] and coordenadas[rota[1]]]
+            if rotas:
+                distancias = self.calcular_distancias(
+                    [coordenadas[origem] for origem, _ in rotas],
+                    [coordenadas[destino] for _, destino in rotas]
+                )
+                distancias_lote.update((rota, float(d)) for rota, d in zip(rotas, distancias))
+            
+            yield from self._calcular_lote(lote, distancias_lote, coordenadas)
+    
+    def _calcular_lote(self, lote, distancias_lote, coordenadas_lote):
+        """
+        Calcula um micro-lote de calcular_fretes_stream.
+        
+        O estado do lote (distâncias pré-calculadas de todas as rotas, coordenadas
+        dos endereços geocodificados e intervalos pendentes) vale só para a
+        thread atual e só enquanto o lote é calculado: nunca atravessa um `yield`
+        do gerador, de modo que outras cotações da mesma calculadora, nesta ou
+        em outra thread, não o enxergam.
+        
+        Returns:
+            Lista de resultados, na ordem do lote
+        """
+        self._lote.distancias = distancias_lote
+        self._lote.coordenadas = coordenadas_lote
+        self._lote.intervalos = [] if self.intervalos else None
+        try:
+            # Fretes curtos do lote precificados de uma vez (sem rastro, que é por cotação)
+            curtos = self._precificar_curtos_lote(lote) if self.rastros is None else {}
+            resultados = []
+            for posicao, requisicao in enumerate(lote):
+                resultado = curtos.get(posicao)
+                if resultado is None:
+                    resultado = self.calcular_frete(**requisicao)
+                else:
+                    self._registrar_diario(resultado, requisicao.get('num_modulos'), requisicao.get('peso_kg'),
+                                           requisicao.get('cliente'))
+                resultados.append(resultado)
+            if self._lote.intervalos:
+                self._preencher_intervalos(self._lote.intervalos)
+            return resultados
+        finally:
+            self._lote.distancias = None
+            self._lote.coordenadas = None
+            self._lote.intervalos = None
+    
 
 def main():
     """Função principal para uso via linha de comando."""
-    parser = argparse.ArgumentParser(description='Calculadora de Fretes')
+    # Subcomando de reprecificação em lote: calculadora_frete.py reprice entrada saida [opções]
+    if len(sys.argv) > 1 and sys.argv[1] == 'reprice':
+        from reprecificacao import main as main_reprecificacao
+        main_reprecificacao(sys.argv[2:])
+        return
+    
+    parser = argparse.ArgumentParser(description='Calculadora de Fretes (use "reprice" para reprecificar um arquivo em lote)')
     parser.add_argument('--origem', required=True, help='Endereço de origem')
     parser.add_argument('--destino', required=True, help='Endereço de destino')
     parser.add_argument('--modulos', type=int, help='Número de módulos')
@@ -859,8 +1491,14 @@ def main():
     parser.add_argument('--modo', choices=['modulos', 'peso'], default='modulos', help='Modo de cálculo')
     parser.add_argument('--excel', help='Caminho para o arquivo Excel')
     parser.add_argument('--usar-url', action='store_true', help='Usar URL do GitHub para carregar dados')
+    parser.add_argument('--historico', help='Arquivo do histórico mapeado em memória (criado se não existir)')
+    parser.add_argument('--busca', choices=['filtros', 'knn'], default='filtros', help='Estratégia de busca de fretes similares')
+    parser.add_argument('--distancia-exata', action='store_true', help='Calcular a distância pela geodésica exata')
+    parser.add_argument('--agregacao', choices=ESTRATEGIAS_AGREGACAO, default='media', help='Estratégia de agregação dos fretes similares')
+    parser.add_argument('--intervalos', action='store_true', help='Estimar os percentis P10/P50/P90 do valor por bootstrap')
     
     args = parser.parse_args()
+    configurar_logging(logging.WARNING)
     
     # Converter data se fornecida
     data_prevista = None
@@ -872,7 +1510,8 @@ def main():
             sys.exit(1)
     
     # Inicializar calculadora
-    calculadora = CalculadoraFrete(args.excel, args.usar_url)
+    calculadora = CalculadoraFrete(args.excel, args.usar_url, args.historico, args.busca, args.distancia_exata,
+                                   estrategia_agregacao=args.agregacao, intervalos=args.intervalos)
     
     # Calcular frete
     resultado = calculadora.calcular_frete(
@@ -895,6 +1534,9 @@ def main():
             print(f"Peso: {args.peso} kg")
         print(f"\nValor estimado: R$ {resultado['valor_estimado']:.2f}")
         print(f"Valor por km: R$ {resultado['valor_por_km']:.2f}")
+        if 'valor_p10' in resultado:
+            print(f"Intervalo (P10-P90): R$ {resultado['valor_p10']:.2f} a R$ {resultado['valor_p90']:.2f} "
+                  f"(P50: R$ {resultado['valor_p50']:.2f})")
         
         if resultado.get('valor_absoluto', False):
             print("\nValor baseado em caso conhecido do histórico.")
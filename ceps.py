@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Índice de CEPs
+--------------
+Resolve o CEP contido em um endereço ("04538-133, São Paulo, SP") para
+cidade, UF e posição aproximada sem consultar o geocodificador.
+
+O índice é formado por níveis de faixas de CEP, do mais específico ao mais
+geral, cada um guardado em arrays ordenados e consultado por busca binária:
+
+- prefixos de 5 dígitos observados no histórico ("CEP origem" e
+  "Cidade/Estado"), aceitos apenas quando o CEP pertence à UF informada
+- faixas das capitais e das cidades de referência
+- faixas de CEP de cada UF
+
+Só a cidade tem posição (centro da tabela offline de geografia); um CEP
+resolvido apenas até a UF informa a UF, mas não a posição.
+"""
+
+import re
+from typing import NamedTuple
+
+import numpy as np
+
+from geografia import coordenadas_cidade
+from historico import chave_cidade
+
+# CEP com ou sem pontuação: "04538-133", "04538133", "12.285-465"
+_PADRAO_CEP = re.compile(r'(?<!\d)(\d{2})\.?(\d{3})-?(\d{3})(?!\d)')
+
+# Faixas de CEP de cada UF (Correios)
+FAIXAS_UF = (
+    ('01000000', '19999999', 'SP'), ('20000000', '28999999', 'RJ'), ('29000000', '29999999', 'ES'),
+    ('30000000', '39999999', 'MG'), ('40000000', '48999999', 'BA'), ('49000000', '49999999', 'SE'),
+    ('50000000', '56999999', 'PE'), ('57000000', '57999999', 'AL'), ('58000000', '58999999', 'PB'),
+    ('59000000', '59999999', 'RN'), ('60000000', '63999999', 'CE'), ('64000000', '64999999', 'PI'),
+    ('65000000', '65999999', 'MA'), ('66000000', '68899999', 'PA'), ('68900000', '68999999', 'AP'),
+    ('69000000', '69299999', 'AM'), ('69300000', '69399999', 'RR'), ('69400000', '69899999', 'AM'),
+    ('69900000', '69999999', 'AC'), ('70000000', '72799999', 'DF'), ('72800000', '72999999', 'GO'),
+    ('73000000', '73699999', 'DF'), ('73700000', '76799999', 'GO'), ('76800000', '76999999', 'RO'),
+    ('77000000', '77999999', 'TO'), ('78000000', '78899999', 'MT'), ('79000000', '79999999', 'MS'),
+    ('80000000', '87999999', 'PR'), ('88000000', '89999999', 'SC'), ('90000000', '99999999', 'RS')
+)
+
+# Faixas de CEP das capitais e das cidades de referência
+FAIXAS_CIDADES = (
+    ('01000000', '05999999', 'São Paulo', 'SP'), ('08000000', '08499999', 'São Paulo', 'SP'),
+    ('13000000', '13139999', 'Campinas', 'SP'), ('13200000', '13219999', 'Jundiaí', 'SP'),
+    ('13270000', '13279999', 'Valinhos', 'SP'), ('13280000', '13289999', 'Vinhedo', 'SP'),
+    ('20000000', '23799999', 'Rio de Janeiro', 'RJ'), ('29000000', '29099999', 'Vitória', 'ES'),
+    ('30000000', '31999999', 'Belo Horizonte', 'MG'), ('39400000', '39409999', 'Montes Claros', 'MG'),
+    ('40000000', '42599999', 'Salvador', 'BA'), ('49000000', '49098999', 'Aracaju', 'SE'),
+    ('50000000', '52999999', 'Recife', 'PE'), ('57000000', '57099999', 'Maceió', 'AL'),
+    ('58000000', '58099999', 'João Pessoa', 'PB'), ('59000000', '59139999', 'Natal', 'RN'),
+    ('60000000', '61599999', 'Fortaleza', 'CE'), ('64000000', '64099999', 'Teresina', 'PI'),
+    ('65000000', '65109999', 'São Luís', 'MA'), ('66000000', '66999999', 'Belém', 'PA'),
+    ('68900000', '68911999', 'Macapá', 'AP'), ('69000000', '69099999', 'Manaus', 'AM'),
+    ('69300000', '69339999', 'Boa Vista', 'RR'), ('69900000', '69923999', 'Rio Branco', 'AC'),
+    ('70000000', '70999999', 'Brasília', 'DF'), ('74000000', '74899999', 'Goiânia', 'GO'),
+    ('76800000', '76834999', 'Porto Velho', 'RO'), ('77000000', '77249999', 'Palmas', 'TO'),
+    ('78000000', '78109999', 'Cuiabá', 'MT'), ('79000000', '79129999', 'Campo Grande', 'MS'),
+    ('80000000', '82999999', 'Curitiba', 'PR'), ('88000000', '88099999', 'Florianópolis', 'SC'),
+    ('90000000', '91999999', 'Porto Alegre', 'RS')
+)
+
+
+class LocalizacaoCep(NamedTuple):
+    """Resultado da resolução de um CEP."""
+    cidade: str
+    uf: str
+    # (lat, lon) do centro da cidade, ou None se a posição não for conhecida
+    centroide: tuple
+
+
+def extrair_cep(endereco):
+    """Retorna o CEP contido no texto como inteiro de 8 dígitos (ou None)."""
+    if not isinstance(endereco, str):
+        return None
+    match = _PADRAO_CEP.search(endereco)
+    return int(''.join(match.groups())) if match else None
+
+
+def _localizacao(cidade, uf):
+    if cidade is None:
+        return LocalizacaoCep(None, uf, None)
+    return LocalizacaoCep(cidade, uf, coordenadas_cidade(cidade, uf))
+
+
+class FaixasCep:
+    """Faixas de CEP sem sobreposição, em arrays ordenados para busca binária."""
+
+    def __init__(self, inicios, fins, localizacoes):
+        """
+        Args:
+            inicios: Array int64 ordenado com o primeiro CEP de cada faixa
+            fins: Array int64 com o último CEP de cada faixa
+            localizacoes: LocalizacaoCep de cada faixa
+        """
+        self.inicios = inicios
+        self.fins = fins
+        self.localizacoes = localizacoes
+
+    def __len__(self):
+        return len(self.inicios)
+
+    @classmethod
+    def construir(cls, faixas):
+        """
+        Ordena e valida as faixas.
+
+        Args:
+            faixas: Iterável de tuplas (primeiro CEP, último CEP, LocalizacaoCep)
+
+        Raises:
+            ValueError: se alguma faixa estiver invertida ou se sobrepuser a outra
+        """
+        faixas = sorted((int(inicio), int(fim), localizacao) for inicio, fim, localizacao in faixas)
+        inicios = np.array([f[0] for f in faixas], dtype=np.int64)
+        fins = np.array([f[1] for f in faixas], dtype=np.int64)
+        if np.any(fins < inicios):
+            raise ValueError("Faixa de CEP com fim anterior ao início")
+        if np.any(inicios[1:] <= fins[:-1]):
+            raise ValueError("Faixas de CEP sobrepostas")
+        return cls(inicios, fins, [f[2] for f in faixas])
+
+    def localizar(self, cep):
+        """Retorna a localização da faixa que contém o CEP (ou None)."""
+        posicao = int(np.searchsorted(self.inicios, cep, side='right')) - 1
+        if posicao >= 0 and cep <= self.fins[posicao]:
+            return self.localizacoes[posicao]
+        return None
+
+
+class IndiceCep:
+    """Níveis de faixas de CEP, consultados do mais específico ao mais geral."""
+
+    def __init__(self, niveis):
+        """
+        Args:
+            niveis: Lista de FaixasCep, do nível mais específico ao mais geral
+        """
+        self.niveis = niveis
+
+    @classmethod
+    def construir(cls, historico=None):
+        """
+        Monta o índice com as faixas fixas e, se houver, os CEPs do histórico.
+
+        Args:
+            historico: HistoricoFretes com as colunas "CEP origem" e "Cidade/Estado" (opcional)
+        """
+        ufs = FaixasCep.construir((inicio, fim, _localizacao(None, uf)) for inicio, fim, uf in FAIXAS_UF)
+        cidades = FaixasCep.construir(
+            (inicio, fim, _localizacao(cidade, uf)) for inicio, fim, cidade, uf in FAIXAS_CIDADES
+        )
+        niveis = [cidades, ufs]
+        if historico is not None:
+            niveis.insert(0, FaixasCep.construir(_faixas_historico(historico, ufs)))
+        return cls(niveis)
+
+    def localizar(self, cep):
+        """Retorna a LocalizacaoCep mais específica do CEP (ou None)."""
+        for nivel in self.niveis:
+            localizacao = nivel.localizar(cep)
+            if localizacao is not None:
+                return localizacao
+        return None
+
+
+def _faixas_historico(historico, ufs):
+    """
+    Faixas de 5 dígitos de CEP com cidade conhecida no histórico.
+
+    Descarta os CEPs fora da faixa da UF informada na cidade e os prefixos
+    associados a mais de uma cidade.
+    """
+    ceps = historico.vocabularios['CEP origem']
+    cidades = historico.vocabularios['Cidade/Estado']
+    pares = set(zip(historico.codigos['CEP origem'].tolist(), historico.codigos['Cidade/Estado'].tolist()))
+
+    por_prefixo = {}
+    for codigo_cep, codigo_cidade in pares:
+        if codigo_cep < 0 or codigo_cidade < 0:
+            continue
+        cep = extrair_cep(ceps[codigo_cep])
+        partes = cidades[codigo_cidade].rsplit('/', 1)
+        if cep is None or len(partes) != 2:
+            continue
+        cidade, uf = partes[0].strip(), partes[1].strip().upper()
+        faixa_uf = ufs.localizar(cep)
+        if faixa_uf is None or faixa_uf.uf != uf or cidade.lower().startswith('cidade desconhecida'):
+            continue
+        # Grafias diferentes da mesma cidade ("Jundiaí"/"Jundiai") contam como uma só
+        por_prefixo.setdefault(cep // 1000, {}).setdefault(chave_cidade(cidade), (cidade, uf))
+
+    return [
+        (prefixo * 1000, prefixo * 1000 + 999, _localizacao(*next(iter(cidades_prefixo.values()))))
+        for prefixo, cidades_prefixo in por_prefixo.items()
+        if len(cidades_prefixo) == 1
+    ]
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Configuração de Logs
+--------------------
+Os módulos da calculadora registram mensagens em loggers por subsistema,
+todos abaixo de "calculadora":
+
+- calculadora.dados: carga do Excel e do histórico mapeado
+- calculadora.geocodificacao: consultas ao geocodificador
+- calculadora.politica: recarga da política de preços
+
+`configurar_logging` liga esses loggers a uma fila (QueueHandler): a thread
+que registra a mensagem apenas a enfileira, e um QueueListener em segundo
+plano formata e grava no stderr. Assim as requisições do Flask não esperam
+pela escrita dos logs.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+
+LOGGER_RAIZ = 'calculadora'
+
+FORMATO_TEXTO = '%(asctime)s %(levelname)s [%(name)s] %(message)s'
+
+# Atributos padrão de um LogRecord (os demais vêm de `extra` e são campos estruturados)
+_ATRIBUTOS_PADRAO = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+
+
+class FormatadorJson(logging.Formatter):
+    """Formata cada registro como uma linha JSON, incluindo os campos passados em `extra`."""
+
+    def format(self, record):
+        dados = {
+            'momento': self.formatTime(record),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensagem': record.getMessage()
+        }
+        dados.update({
+            chave: valor for chave, valor in vars(record).items()
+            if chave not in _ATRIBUTOS_PADRAO and not chave.startswith('_')
+        })
+        if record.exc_info:
+            dados['excecao'] = self.formatException(record.exc_info)
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+def configurar_logging(nivel=logging.INFO, formato_json=False, handler=None):
+    """
+    Direciona os logs da calculadora para uma fila atendida em segundo plano.
+
+    Chamadas repetidas não criam novos handlers.
+
+    Args:
+        nivel: Nível mínimo registrado pelos loggers da calculadora
+        formato_json: Se True, grava uma linha JSON por registro
+        handler: Handler de destino (padrão: StreamHandler no stderr)
+
+    Returns:
+        O QueueListener em execução
+    """
+    global _listener
+    logger = logging.getLogger(LOGGER_RAIZ)
+    logger.setLevel(nivel)
+    if _listener is not None:
+        return _listener
+
+    destino = handler or logging.StreamHandler()
+    destino.setFormatter(FormatadorJson() if formato_json else logging.Formatter(FORMATO_TEXTO))
+
+    fila = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(fila))
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(fila, destino, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Diário de Cotações
+------------------
+Registro de todas as cotações calculadas em um banco SQLite local (modo
+WAL), consultado pela página /historico.
+
+`registrar` apenas enfileira a cotação: uma thread em segundo plano retira
+as cotações da fila e as grava em lotes, uma transação por lote, de modo
+que a requisição nunca espera pelo disco. As consultas usam índices por
+data, por rota (chaves normalizadas de origem e destino) e por cliente, e
+são paginadas.
+
+Ao reiniciar, as distâncias das cotações mais recentes servem para aquecer
+o cache de distâncias da calculadora (ver `distancias_recentes`); só entram
+as distâncias exatas, nunca as calculadas sobre posições aproximadas do
+geocodificador indisponível.
+"""
+
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from typing import NamedTuple
+
+logger = logging.getLogger('calculadora.diario')
+
+# Cotações gravadas por transação
+TAMANHO_LOTE_GRAVACAO = 256
+
+# Espera máxima da thread de gravação por novas cotações antes de gravar o lote parcial (s)
+INTERVALO_GRAVACAO_S = 0.5
+
+COTACOES_POR_PAGINA = 50
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS cotacoes (
+    id INTEGER PRIMARY KEY,
+    momento REAL NOT NULL,
+    origem TEXT,
+    destino TEXT,
+    chave_origem TEXT,
+    chave_destino TEXT,
+    cliente TEXT,
+    modo_calculo TEXT,
+    num_modulos REAL,
+    peso_kg REAL,
+    status TEXT,
+    valor_estimado REAL,
+    distancia_km REAL,
+    id_cotacao TEXT,
+    distancia_aproximada INTEGER
+);
+CREATE INDEX IF NOT EXISTS cotacoes_momento ON cotacoes (momento);
+CREATE INDEX IF NOT EXISTS cotacoes_rota ON cotacoes (chave_origem, chave_destino, momento);
+CREATE INDEX IF NOT EXISTS cotacoes_cliente ON cotacoes (cliente, momento);
+"""
+
+COLUNAS = ('momento', 'origem', 'destino', 'chave_origem', 'chave_destino', 'cliente', 'modo_calculo',
+           'num_modulos', 'peso_kg', 'status', 'valor_estimado', 'distancia_km', 'id_cotacao',
+           'distancia_aproximada')
+
+_INSERCAO = f"INSERT INTO cotacoes ({', '.join(COLUNAS)}) VALUES ({', '.join('?' * len(COLUNAS))})"
+
+# Marca de encerramento da thread de gravação
+_FIM = object()
+
+
+class PaginaCotacoes(NamedTuple):
+    """Uma página da consulta ao diário."""
+    # Cotações da página (dicionários com as COLUNAS), da mais recente para a mais antiga
+    cotacoes: list
+    # Total de cotações que atendem aos filtros
+    total: int
+    pagina: int
+    por_pagina: int
+
+    @property
+    def paginas(self):
+        return max(1, -(-self.total // self.por_pagina))
+
+
+class DiarioCotacoes:
+    """Diário de cotações em SQLite com gravação em lotes por uma thread em segundo plano."""
+
+    def __init__(self, caminho, tamanho_lote=TAMANHO_LOTE_GRAVACAO, intervalo_s=INTERVALO_GRAVACAO_S):
+        """
+        Args:
+            caminho: Arquivo do banco SQLite (criado se não existir)
+            tamanho_lote: Número máximo de cotações gravadas por transação
+            intervalo_s: Espera máxima por novas cotações antes de gravar um lote parcial
+        """
+        self.caminho = caminho
+        self.tamanho_lote = tamanho_lote
+        self.intervalo_s = intervalo_s
+        self._fila = queue.SimpleQueue()
+        self._leitura = threading.local()
+
+        conexao = self._conectar()
+        conexao.execute('PRAGMA journal_mode=WAL')
+        conexao.executescript(ESQUEMA)
+        self._migrar(conexao)
+        self._escrita = conexao
+
+        self._thread = threading.Thread(target=self._gravar, name='diario-cotacoes', daemon=True)
+        self._thread.start()
+        atexit.register(self.fechar)
+
+    def _conectar(self):
+        # A conexão de escrita é criada aqui e usada apenas pela thread de gravação
+        conexao = sqlite3.connect(self.caminho, check_same_thread=False, timeout=30)
+        conexao.execute('PRAGMA synchronous=NORMAL')
+        return conexao
+
+    @staticmethod
+    def _migrar(conexao):
+        """Acrescenta as colunas ausentes em diários criados por versões anteriores."""
+        existentes = {linha[1] for linha in conexao.execute('PRAGMA table_info(cotacoes)')}
+        if 'distancia_aproximada' not in existentes:
+            # Cotações antigas ficam com origem da distância desconhecida (NULL)
+            conexao.execute('ALTER TABLE cotacoes ADD COLUMN distancia_aproximada INTEGER')
+            conexao.commit()
+
+    def registrar(self, resultado, num_modulos=None, peso_kg=None, cliente=None, chave_origem=None, chave_destino=None,
+                  distancia_aproximada=False):
+        """
+        Enfileira uma cotação para gravação (não espera pelo disco).
+
+        Args:
+            resultado: ResultadoCotacao calculado
+            num_modulos: Módulos informados na cotação
+            peso_kg: Peso informado na cotação
+            cliente: Identificação do cliente (opcional)
+            chave_origem: Chave normalizada da origem (ver enderecos.Endereco.chave)
+            chave_destino: Chave normalizada do destino
+            distancia_aproximada: Se a distância usou uma posição aproximada (geocodificador indisponível)
+        """
+        self._fila.put((
+            time.time(), resultado.origem, resultado.destino, chave_origem, chave_destino, cliente or None,
+            resultado.modo_calculo, num_modulos, peso_kg, resultado.status, float(resultado.valor_estimado),
+            float(resultado.distancia_km), resultado.id_cotacao, int(bool(distancia_aproximada))
+        ))
+
+    def _gravar(self):
+        """Laço da thread de gravação: grava as cotações da fila em lotes."""
+        while True:
+            try:
+                lote = [self._fila.get(timeout=self.intervalo_s)]
+            except queue.Empty:
+                continue
+            while len(lote) < self.tamanho_lote:
+                try:
+                    lote.append(self._fila.get_nowait())
+                except queue.Empty:
+                    break
+
+            fim = lote[-1] is _FIM
+            linhas = [linha for linha in lote if linha is not _FIM]
+            if linhas:
+                try:
+                    with self._escrita:
+                        self._escrita.executemany(_INSERCAO, linhas)
+                except sqlite3.Error as e:
+                    logger.error("Erro ao gravar %d cotações no diário %s: %s", len(linhas), self.caminho, e)
+            if fim:
+                return
+
+    def fechar(self):
+        """Grava as cotações pendentes e encerra a thread de gravação."""
+        if self._thread.is_alive():
+            self._fila.put(_FIM)
+            self._thread.join()
+
+    def _conexao_leitura(self):
+        """Conexão de leitura da thread atual (no modo WAL, as leituras não bloqueiam a gravação)."""
+        conexao = getattr(self._leitura, 'conexao', None)
+        if conexao is None:
+            conexao = sqlite3.connect(self.caminho, timeout=30)
+            conexao.row_factory = sqlite3.Row
+            self._leitura.conexao = conexao
+        return conexao
+
+    def consultar(self, pagina=1, por_pagina=COTACOES_POR_PAGINA, inicio=None, fim=None,
+                  chave_origem=None, chave_destino=None, cliente=None):
+        """
+        Consulta as cotações gravadas, da mais recente para a mais antiga.
+
+        Args:
+            pagina: Número da página (a partir de 1)
+            por_pagina: Cotações por página
+            inicio: datetime inicial (inclusive) do período
+            fim: datetime final (exclusive) do período
+            chave_origem: Chave normalizada da origem
+            chave_destino: Chave normalizada do destino
+            cliente: Identificação do cliente
+
+        Returns:
+            PaginaCotacoes
+        """
+        condicoes, parametros = [], []
+        for coluna, operador, valor in (
+            ('momento', '>=', inicio.timestamp() if inicio is not None else None),
+            ('momento', '<', fim.timestamp() if fim is not None else None),
+            ('chave_origem', '=', chave_origem),
+            ('chave_destino', '=', chave_destino),
+            ('cliente', '=', cliente)
+        ):
+            if valor is not None:
+                condicoes.append(f"{coluna} {operador} ?")
+                parametros.append(valor)
+        onde = f"WHERE {' AND '.join(condicoes)}" if condicoes else ''
+
+        pagina = max(1, int(pagina))
+        por_pagina = max(1, int(por_pagina))
+        conexao = self._conexao_leitura()
+        total = conexao.execute(f"SELECT COUNT(*) FROM cotacoes {onde}", parametros).fetchone()[0]
+        linhas = conexao.execute(
+            f"SELECT {', '.join(COLUNAS)} FROM cotacoes {onde} ORDER BY momento DESC, id DESC LIMIT ? OFFSET ?",
+            parametros + [por_pagina, (pagina - 1) * por_pagina]
+        ).fetchall()
+        return PaginaCotacoes([dict(linha) for linha in linhas], total, pagina, por_pagina)
+
+    def distancias_recentes(self, limite):
+        """
+        Distâncias exatas das rotas cotadas com sucesso mais recentemente.
+
+        Distâncias sobre posições aproximadas e as de cotações gravadas antes
+        do registro da origem da distância ficam de fora.
+
+        Args:
+            limite: Número máximo de rotas
+
+        Returns:
+            Dicionário (origem, destino) -> distância em km, com os textos informados nas cotações
+        """
+        linhas = self._conexao_leitura().execute(
+            "SELECT origem, destino, distancia_km FROM cotacoes "
+            "WHERE status = 'sucesso' AND distancia_km > 0 AND distancia_aproximada = 0 "
+            "ORDER BY momento DESC LIMIT ?",
+            (limite,)
+        ).fetchall()
+        distancias = {}
+        for origem, destino, distancia in linhas:
+            distancias.setdefault((origem, destino), distancia)
+        return distancias
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Distâncias de Rotas Conhecidas
+------------------------------
+O histórico já registra a distância rodoviária de cada origem até o destino
+do frete (colunas "Distancia Valinhos (km)" e "Distancia-MC (km)"). Este
+módulo indexa essas distâncias por rota (origem normalizada, destino de
+referência) para que as cotações de rotas já atendidas não precisem
+geocodificar os endereços: o geocodificador só é consultado para rotas que
+não aparecem no histórico.
+
+Quando a mesma rota aparece em vários fretes, vale a mediana das distâncias
+registradas, o que descarta digitações erradas isoladas. Linhas cujas duas
+distâncias somam menos que a distância entre Valinhos e Montes Claros são
+impossíveis (em geral milhares digitados com ponto, "1.479" por 1479 km) e
+ficam de fora.
+"""
+
+import numpy as np
+
+from geografia import COORDENADAS_DESTINOS, distancia_haversine_km
+from historico import chave_cidade
+
+# Destinos cuja coluna de distância mede até outro ponto (Vinhedo usa a coluna de Valinhos)
+DESTINOS_SEM_DISTANCIA_PROPRIA = ('vinhedo',)
+
+# Distância em linha reta entre Valinhos e Montes Claros: a soma das distâncias
+# de uma origem até os dois destinos não pode ser menor que ela
+DISTANCIA_ENTRE_DESTINOS_KM = float(distancia_haversine_km(*COORDENADAS_DESTINOS['valinhos'],
+                                                            *COORDENADAS_DESTINOS['montes claros']))
+
+
+def _chave_origem(texto):
+    """Chave normalizada da origem, ou None para origens sem cidade identificada."""
+    chave = chave_cidade(texto)
+    if chave is None or '/' not in chave or chave.startswith('cidade desconhecida'):
+        return None
+    return chave
+
+
+class DistanciasRotas:
+    """Distância registrada no histórico para cada rota (origem, destino de referência)."""
+
+    def __init__(self, distancias):
+        """
+        Args:
+            distancias: Dicionário (chave da origem, chave do destino) -> distância em km
+        """
+        self.distancias = distancias
+
+    def __len__(self):
+        return len(self.distancias)
+
+    @classmethod
+    def construir(cls, historico, indice_cidades=None):
+        """
+        Indexa as distâncias preenchidas de um HistoricoFretes.
+
+        Com `indice_cidades`, as origens são identificadas pela chave da cidade canônica.
+        """
+        if indice_cidades is not None:
+            chaves = indice_cidades.chaves_vocabulario()
+        else:
+            chaves = [_chave_origem(c) for c in historico.vocabularios['Cidade/Estado']]
+        origens = np.array(chaves + [None], dtype=object)[historico.codigos['Cidade/Estado']]
+        destinos = historico.destinos_referencia()
+        distancias = historico.distancias_rota()
+
+        soma = historico.numericas['Distancia Valinhos (km)'] + historico.numericas['Distancia-MC (km)']
+        validos = (distancias > 0) & ~np.isin(destinos, DESTINOS_SEM_DISTANCIA_PROPRIA)
+        # Soma NaN (uma das colunas vazia) não permite conferir a linha, que é mantida
+        validos &= ~(soma < DISTANCIA_ENTRE_DESTINOS_KM)
+        validos &= np.array([o is not None and d is not None for o, d in zip(origens, destinos)], dtype=bool)
+
+        por_rota = {}
+        for origem, destino, distancia in zip(origens[validos], destinos[validos], distancias[validos]):
+            por_rota.setdefault((origem, destino), []).append(distancia)
+        return cls({rota: round(float(np.median(valores)), 2) for rota, valores in por_rota.items()})
+
+    def distancia(self, origem, destino):
+        """
+        Retorna a distância registrada da rota, em qualquer sentido.
+
+        Args:
+            origem: Endereco de origem (ver enderecos.NormalizadorEnderecos)
+            destino: Endereco de destino
+
+        Returns:
+            Distância em km ou None se a rota não estiver no histórico
+        """
+        distancia = self.distancias.get((origem.chave, destino.destino))
+        if distancia is None:
+            # Rota no sentido inverso (saindo do destino de referência)
+            distancia = self.distancias.get((destino.chave, origem.destino))
+        return distancia
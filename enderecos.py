@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Normalização de Endereços
+-------------------------
+Converte o texto de origem/destino de uma cotação em um registro
+`Endereco` com cidade, UF, chave normalizada, cidade canônica do histórico
+e destino de referência,
+usado por todas as etapas da precificação (busca no histórico, distâncias,
+região, fatores de rota e valores absolutos).
+
+Cada texto distinto é analisado uma única vez: os registros ficam em um
+cache LRU limitado e as chaves são internadas, de modo que as cotações
+repetidas reutilizam o mesmo registro.
+"""
+
+import functools
+import re
+import sys
+from typing import NamedTuple
+
+from ceps import extrair_cep
+from geografia import INDICE_UF, destino_da_cidade, identificar_uf
+from historico import chave_cidade
+
+# Limite de textos distintos mantidos no cache de endereços
+TAMANHO_CACHE_ENDERECOS = 4096
+
+# "Cidade, UF", "Cidade/UF" ou "Cidade - UF": o separador é obrigatório e a sigla
+# não pode continuar em outra letra, senão "RIO DE JANEIRO" viraria "RIO DE JANEI"/"RO"
+_PADRAO_CIDADE_ESTADO = re.compile(r'([A-Za-zÀ-ÖØ-öø-ÿ\s]+?)\s*[,/-]\s*([A-Z]{2})(?![A-Za-zÀ-ÖØ-öø-ÿ])')
+
+
+class Endereco(NamedTuple):
+    """Endereço de uma cotação já analisado."""
+    texto: str
+    # Cidade como informada (ou a cidade do CEP), sem espaços nas pontas
+    cidade: str
+    # Sigla da UF (None se não identificada)
+    uf: str
+    # "Cidade/UF" (apenas a cidade se a UF não for identificada)
+    cidade_estado: str
+    # cidade_estado sem acentos, em minúsculas (mesma chave do histórico);
+    # com cidade canônica, a chave dela
+    chave: str
+    # Cidade sem acentos, em minúsculas (da cidade canônica, se houver)
+    nome: str
+    # Cidade canônica das origens do histórico (ver indice_cidades), ou None
+    id_cidade: int
+    # Destino de referência do histórico que é a própria cidade ('valinhos', 'montes claros'...)
+    destino: str
+    # CEP como inteiro de 8 dígitos (None se não houver)
+    cep: int
+    # (lat, lon) da cidade do CEP, quando conhecida
+    centroide: tuple
+
+
+def _primeiro_segmento(texto):
+    """Trecho antes da primeira '/' (ou, sem '/', da primeira ',')."""
+    separador = '/' if '/' in texto else ','
+    return texto.split(separador)[0].strip()
+
+
+def _internar(valor):
+    return sys.intern(valor) if valor is not None else None
+
+
+class NormalizadorEnderecos:
+    """Analisa textos de endereço com cache LRU por texto distinto."""
+
+    def __init__(self, indice_cep=None, indice_cidades=None, tamanho_cache=TAMANHO_CACHE_ENDERECOS):
+        """
+        Args:
+            indice_cep: IndiceCep usado para resolver a cidade e a UF dos CEPs (opcional)
+            indice_cidades: IndiceCidades com as cidades canônicas do histórico (opcional)
+            tamanho_cache: Número máximo de textos distintos mantidos no cache
+        """
+        self.indice_cep = indice_cep
+        self.indice_cidades = indice_cidades
+        self.normalizar = functools.lru_cache(maxsize=tamanho_cache)(self._normalizar)
+
+    def _normalizar(self, texto):
+        """
+        Analisa um texto de endereço.
+
+        A cidade e a UF vêm, nesta ordem, do CEP (se for conhecido), do padrão
+        "Cidade, UF" e, na falta dele, do primeiro trecho do texto e da UF
+        identificada pelo nome do estado ou de uma cidade conhecida. Com o
+        índice de cidades, a cidade é associada (tolerando erros de digitação)
+        à cidade canônica do histórico, que completa a UF se ela faltar.
+
+        Returns:
+            Endereco
+        """
+        texto = texto if isinstance(texto, str) else ''
+        cep = extrair_cep(texto)
+        localizacao = None
+        if cep is not None and self.indice_cep is not None:
+            localizacao = self.indice_cep.localizar(cep)
+
+        cidade = uf = None
+        if localizacao is not None:
+            cidade, uf = localizacao.cidade, localizacao.uf
+        if cidade is None:
+            match = next((m for m in _PADRAO_CIDADE_ESTADO.finditer(texto) if m.group(2) in INDICE_UF), None)
+            if match:
+                cidade = match.group(1).strip()
+                uf = uf or match.group(2)
+            else:
+                cidade = _primeiro_segmento(texto)
+        uf = uf or identificar_uf(texto)
+
+        id_cidade = None
+        if self.indice_cidades is not None:
+            id_cidade = self.indice_cidades.identificar(chave_cidade(cidade), uf)
+            if id_cidade is not None:
+                uf = uf or self.indice_cidades.ufs[id_cidade]
+
+        cidade_estado = f"{cidade}/{uf}" if uf else cidade
+        chave = self.indice_cidades.chave(id_cidade) if id_cidade is not None else chave_cidade(cidade_estado)
+        return Endereco(
+            texto=texto,
+            cidade=cidade,
+            uf=uf,
+            cidade_estado=cidade_estado,
+            chave=_internar(chave),
+            nome=_internar(chave.split('/')[0]),
+            id_cidade=id_cidade,
+            destino=destino_da_cidade(chave.split('/')[0], uf),
+            cep=cep,
+            centroide=localizacao.centroide if localizacao is not None else None
+        )
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Fretes Curtos
+-------------
+Precificação dos fretes de menos de LIMITE_FRETE_CURTO_KM, que não usam o
+histórico: valor base da política, ajuste pela quantidade em relação a uma
+carga padrão, multiplicador, fator de correção da rota e margem.
+
+O cálculo existe em duas formas com o mesmo resultado: `precificar_curto`,
+só com floats (sem arrays nem objetos intermediários), para uma cotação, e
+`precificar_curtos`, vetorizada com NumPy, para lotes.
+
+`RotasLocais` guarda as rotas curtas já conhecidas (cidades vizinhas como
+Valinhos e Vinhedo e as rotas curtas do histórico) com a distância, para
+que essas cotações não precisem calcular a distância.
+"""
+
+import itertools
+
+import numpy as np
+
+from geografia import COORDENADAS_CIDADES, NOMES_UF, distancia_haversine_km
+
+LIMITE_FRETE_CURTO_KM = 10
+
+# Carga padrão dos fretes curtos: 200 módulos ou 6000 kg (200 módulos * 30 kg)
+MODULOS_PADRAO = 200
+PESO_PADRAO = 6000
+QUANTIDADE_PADRAO = {'modulos': MODULOS_PADRAO, 'peso': PESO_PADRAO}
+
+# Expoente da economia de escala (mesmo de _ajustar_por_modulos/_ajustar_por_peso)
+EXPOENTE_ESCALA = 0.9
+
+
+def precificar_curto(valor_base, quantidade, quantidade_padrao, multiplicador, fator_rota, margem_adicional):
+    """
+    Precifica um frete curto.
+
+    Args:
+        valor_base: Valor médio dos fretes curtos (política de preços)
+        quantidade: Módulos ou peso da cotação (None = sem ajuste de quantidade)
+        quantidade_padrao: Carga padrão do modo de cálculo
+        multiplicador: Multiplicador da rota (por distância ou regional)
+        fator_rota: Fator de correção da rota
+        margem_adicional: Fração da margem
+
+    Returns:
+        Tupla (ajuste_quantidade, valor_final, margem, valor_estimado)
+    """
+    ajuste_quantidade = 0
+    if quantidade is not None:
+        ajuste_quantidade = valor_base * ((quantidade / quantidade_padrao) ** EXPOENTE_ESCALA - 1)
+    valor_final = (valor_base + ajuste_quantidade) * multiplicador * fator_rota
+    margem = valor_final * margem_adicional
+    return ajuste_quantidade, valor_final, margem, valor_final + margem
+
+
+def precificar_curtos(valor_base, quantidades, quantidades_padrao, multiplicadores, fatores_rota, margem_adicional):
+    """
+    Versão vetorizada de `precificar_curto`.
+
+    Args:
+        quantidades: Array de quantidades (NaN = sem ajuste de quantidade)
+        quantidades_padrao: Carga padrão de cada cotação
+        multiplicadores: Multiplicador de cada rota
+        fatores_rota: Fator de correção de cada rota
+
+    Returns:
+        Tupla de arrays (ajuste_quantidade, valor_final, margem, valor_estimado)
+    """
+    quantidades = np.asarray(quantidades, dtype=np.float64)
+    ajustes = valor_base * ((quantidades / quantidades_padrao) ** EXPOENTE_ESCALA - 1)
+    ajustes = np.where(np.isnan(quantidades), 0.0, ajustes)
+    valores_finais = (valor_base + ajustes) * multiplicadores * fatores_rota
+    margens = valores_finais * margem_adicional
+    return ajustes, valores_finais, margens, valores_finais + margens
+
+
+class RotasLocais:
+    """Distância das rotas curtas conhecidas, nos dois sentidos."""
+
+    def __init__(self, distancias):
+        """
+        Args:
+            distancias: Dicionário (chave da origem, chave do destino) -> distância em km,
+                com chaves "cidade/uf" (ver historico.chave_cidade)
+        """
+        self.distancias = distancias
+
+    def __len__(self):
+        return len(self.distancias)
+
+    @classmethod
+    def construir(cls, distancias_rotas=None):
+        """
+        Reúne as cidades conhecidas a menos de LIMITE_FRETE_CURTO_KM uma da
+        outra (em linha reta) e as rotas curtas do histórico, que prevalecem.
+
+        Args:
+            distancias_rotas: DistanciasRotas com as distâncias do histórico (opcional)
+        """
+        distancias = {}
+        for cidade_a, cidade_b in itertools.combinations(COORDENADAS_CIDADES, 2):
+            distancia = round(float(distancia_haversine_km(*COORDENADAS_CIDADES[cidade_a], *COORDENADAS_CIDADES[cidade_b])), 2)
+            if 0 < distancia < LIMITE_FRETE_CURTO_KM:
+                cls._adicionar(distancias, _chave(cidade_a), _chave(cidade_b), distancia)
+
+        if distancias_rotas is not None:
+            for (origem, destino), distancia in distancias_rotas.distancias.items():
+                chave_destino = _chave(destino)
+                if distancia < LIMITE_FRETE_CURTO_KM:
+                    cls._adicionar(distancias, origem, chave_destino, distancia)
+                else:
+                    # A distância registrada mostra que a rota não é curta
+                    distancias.pop((origem, chave_destino), None)
+                    distancias.pop((chave_destino, origem), None)
+        return cls(distancias)
+
+    @staticmethod
+    def _adicionar(distancias, chave_a, chave_b, distancia):
+        if chave_a != chave_b:
+            distancias[(chave_a, chave_b)] = distancia
+            distancias[(chave_b, chave_a)] = distancia
+
+    def distancia(self, origem, destino):
+        """
+        Retorna a distância da rota curta conhecida.
+
+        Args:
+            origem: Endereco de origem (ver enderecos.NormalizadorEnderecos)
+            destino: Endereco de destino
+
+        Returns:
+            Distância em km ou None se a rota não for uma rota curta conhecida
+        """
+        return self.distancias.get((origem.chave, destino.chave))
+
+
+def _chave(cidade):
+    """Chave "cidade/uf" de uma cidade da tabela offline (sem acentos, minúsculas)."""
+    return f"{cidade}/{NOMES_UF[cidade].lower()}"
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Geocodificação Resiliente
+-------------------------
+Camada de proteção em volta do geocodificador (Nominatim):
+
+- cada consulta respeita um prazo: o timeout da chamada é limitado ao tempo
+  que ainda resta do orçamento da cotação
+- um disjuntor (circuit breaker) abre após falhas consecutivas e, enquanto
+  aberto, as consultas falham na hora, sem esperar pelo provedor; passado o
+  tempo de espera, uma única consulta de teste decide se ele volta a fechar
+
+Quando a consulta não pode ser feita, `localizar` levanta
+GeocodificadorIndisponivel e a calculadora recorre às coordenadas offline.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger('calculadora.geocodificacao')
+
+# Timeout máximo de uma consulta ao provedor (s)
+TIMEOUT_CONSULTA_S = 15
+# Orçamento de tempo de geocodificação por cotação, somando origem e destino (s)
+ORCAMENTO_COTACAO_S = 8
+# Abaixo deste tempo restante a consulta nem é tentada (s)
+TEMPO_MINIMO_CONSULTA_S = 0.5
+
+# Falhas consecutivas que abrem o disjuntor e tempo que ele fica aberto (s)
+LIMITE_FALHAS = 3
+TEMPO_ABERTO_S = 60
+
+
+class GeocodificadorIndisponivel(Exception):
+    """O geocodificador não pôde ser consultado (disjuntor aberto, prazo esgotado ou falha)."""
+
+
+class Disjuntor:
+    """Circuit breaker por falhas consecutivas, seguro para várias threads."""
+
+    def __init__(self, limite_falhas=LIMITE_FALHAS, tempo_aberto=TEMPO_ABERTO_S):
+        self.limite_falhas = limite_falhas
+        self.tempo_aberto = tempo_aberto
+        self.falhas = 0
+        self.aberto_ate = 0.0
+        self._em_teste = False
+        self._lock = threading.Lock()
+
+    @property
+    def aberto(self):
+        return self.falhas >= self.limite_falhas
+
+    def permite(self):
+        """Indica se uma consulta pode ser feita agora."""
+        with self._lock:
+            if not self.aberto:
+                return True
+            if time.monotonic() < self.aberto_ate or self._em_teste:
+                return False
+            # Meio aberto: libera uma única consulta de teste
+            self._em_teste = True
+            return True
+
+    def registrar_sucesso(self):
+        with self._lock:
+            if self.aberto:
+                logger.info("Geocodificador respondeu; disjuntor fechado")
+            self.falhas = 0
+            self._em_teste = False
+
+    def registrar_falha(self):
+        with self._lock:
+            self.falhas += 1
+            self._em_teste = False
+            if self.aberto:
+                self.aberto_ate = time.monotonic() + self.tempo_aberto
+                if self.falhas == self.limite_falhas:
+                    logger.warning("Disjuntor do geocodificador aberto após %d falhas consecutivas", self.falhas)
+
+
+class Geocodificador:
+    """Consulta o provedor de geocodificação com prazo e disjuntor."""
+
+    def __init__(self, geolocator, disjuntor=None):
+        """
+        Args:
+            geolocator: Geocodificador do geopy (ex.: Nominatim)
+            disjuntor: Disjuntor compartilhado (padrão: um novo)
+        """
+        self.geolocator = geolocator
+        self.disjuntor = disjuntor or Disjuntor()
+
+    def localizar(self, endereco, prazo=None):
+        """
+        Geocodifica um endereço.
+
+        Args:
+            endereco: Texto do endereço
+            prazo: Instante (time.monotonic) limite da consulta; None usa TIMEOUT_CONSULTA_S
+
+        Returns:
+            Tupla (lat, lon) ou None se o provedor não encontrar o endereço
+
+        Raises:
+            GeocodificadorIndisponivel: disjuntor aberto, prazo esgotado ou falha na consulta
+        """
+        timeout = TIMEOUT_CONSULTA_S
+        if prazo is not None:
+            timeout = min(timeout, prazo - time.monotonic())
+            if timeout < TEMPO_MINIMO_CONSULTA_S:
+                raise GeocodificadorIndisponivel("orçamento de tempo da cotação esgotado")
+        if not self.disjuntor.permite():
+            raise GeocodificadorIndisponivel("disjuntor aberto")
+
+        try:
+            location = self.geolocator.geocode(endereco, timeout=timeout)
+        except Exception as e:
+            self.disjuntor.registrar_falha()
+            logger.warning("Erro ao obter coordenadas para %s: %s", endereco, e, extra={'endereco': endereco})
+            raise GeocodificadorIndisponivel(str(e)) from e
+
+        self.disjuntor.registrar_sucesso()
+        if location:
+            return (location.latitude, location.longitude)
+        return None
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Referências Geográficas
+-----------------------
+Coordenadas dos destinos presentes no histórico e funções vetorizadas de
+distância entre coordenadas.
+
+O histórico não guarda coordenadas das origens, apenas a distância
+rodoviária até Valinhos e até Montes Claros. As origens são posicionadas
+pelas coordenadas da sua cidade na tabela offline (ver
+indice_espacial.coordenadas_origens); o par de distâncias não serve de
+posição, pois pontos espelhados em relação ao eixo Valinhos–Montes Claros
+teriam o mesmo par.
+
+Também identifica a UF de um endereço, usada na matriz de multiplicadores
+por par de UFs da política de preços, e traz uma tabela offline de
+coordenadas (cidades conhecidas e capitais) para quando o geocodificador
+estiver indisponível.
+"""
+
+import re
+import unicodedata
+
+import numpy as np
+
+RAIO_TERRA_KM = 6371.0088
+
+# Erro relativo máximo da haversine (esfera de raio médio) frente à geodésica
+# exata no elipsoide WGS84, medido em pares aleatórios no território brasileiro
+# (mediana de 0,2%). A 10 km isso representa no máximo 60 m; a 1000 km, 6 km.
+ERRO_RELATIVO_MAXIMO_HAVERSINE = 0.006
+
+# Razão média entre distância rodoviária e distância em linha reta
+FATOR_SINUOSIDADE = 1.3
+
+# Destinos presentes no histórico (latitude, longitude)
+COORDENADAS_DESTINOS = {
+    'valinhos': (-22.9708, -46.9958),
+    'vinhedo': (-23.0302, -46.9753),
+    'montes claros': (-16.7350, -43.8617)
+}
+
+# Coluna de distância do histórico correspondente a cada destino
+COLUNA_DISTANCIA_DESTINO = {
+    'valinhos': 'Distancia Valinhos (km)',
+    'vinhedo': 'Distancia Valinhos (km)',
+    'montes claros': 'Distancia-MC (km)'
+}
+
+
+# Unidades federativas, na ordem dos códigos inteiros (0 a 26)
+UFS = (
+    'AC', 'AL', 'AP', 'AM', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MT', 'MS', 'MG', 'PA',
+    'PB', 'PR', 'PE', 'PI', 'RJ', 'RN', 'RS', 'RO', 'RR', 'SC', 'SP', 'SE', 'TO'
+)
+INDICE_UF = {uf: i for i, uf in enumerate(UFS)}
+
+REGIOES = ('Norte', 'Nordeste', 'Centro-Oeste', 'Sudeste', 'Sul')
+
+REGIAO_POR_UF = {
+    'AC': 'Norte', 'AP': 'Norte', 'AM': 'Norte', 'PA': 'Norte', 'RO': 'Norte', 'RR': 'Norte', 'TO': 'Norte',
+    'AL': 'Nordeste', 'BA': 'Nordeste', 'CE': 'Nordeste', 'MA': 'Nordeste', 'PB': 'Nordeste',
+    'PE': 'Nordeste', 'PI': 'Nordeste', 'RN': 'Nordeste', 'SE': 'Nordeste',
+    'DF': 'Centro-Oeste', 'GO': 'Centro-Oeste', 'MT': 'Centro-Oeste', 'MS': 'Centro-Oeste',
+    'ES': 'Sudeste', 'MG': 'Sudeste', 'RJ': 'Sudeste', 'SP': 'Sudeste',
+    'PR': 'Sul', 'RS': 'Sul', 'SC': 'Sul'
+}
+
+# Nomes de estados e cidades conhecidas (sem acentos, minúsculos), usados
+# quando o endereço não traz a sigla da UF. Nomes compostos vêm antes dos
+# nomes que os contêm ("rio grande do sul" antes de "rio grande").
+NOMES_UF = {
+    'rio grande do sul': 'RS', 'rio grande do norte': 'RN', 'mato grosso do sul': 'MS',
+    'mato grosso': 'MT', 'sao paulo': 'SP', 'rio de janeiro': 'RJ', 'minas gerais': 'MG',
+    'espirito santo': 'ES', 'santa catarina': 'SC', 'distrito federal': 'DF', 'parana': 'PR',
+    'bahia': 'BA', 'pernambuco': 'PE', 'ceara': 'CE', 'paraiba': 'PB', 'alagoas': 'AL',
+    'sergipe': 'SE', 'piaui': 'PI', 'maranhao': 'MA', 'goias': 'GO', 'tocantins': 'TO',
+    'amazonas': 'AM', 'amapa': 'AP', 'roraima': 'RR', 'rondonia': 'RO', 'acre': 'AC',
+    'valinhos': 'SP', 'vinhedo': 'SP', 'jundiai': 'SP', 'campinas': 'SP', 'santos': 'SP',
+    'ribeirao preto': 'SP', 'sorocaba': 'SP', 'montes claros': 'MG', 'araxa': 'MG',
+    'belo horizonte': 'MG', 'uberlandia': 'MG', 'paracatu': 'MG', 'niteroi': 'RJ', 'vitoria': 'ES',
+    'vila velha': 'ES', 'limoeiro do norte': 'CE', 'fortaleza': 'CE', 'juazeiro do norte': 'CE',
+    'assu': 'RN', 'natal': 'RN', 'mossoro': 'RN', 'salvador': 'BA', 'feira de santana': 'BA',
+    'recife': 'PE', 'olinda': 'PE', 'joao pessoa': 'PB', 'maceio': 'AL', 'aracaju': 'SE',
+    'teresina': 'PI', 'sao luis': 'MA', 'porto alegre': 'RS', 'caxias do sul': 'RS',
+    'florianopolis': 'SC', 'joinville': 'SC', 'curitiba': 'PR', 'londrina': 'PR',
+    'cuiaba': 'MT', 'campo grande': 'MS', 'goiania': 'GO', 'brasilia': 'DF',
+    'manaus': 'AM', 'belem': 'PA', 'palmas': 'TO'
+}
+
+# Coordenadas das capitais, usadas como posição aproximada de endereços da UF
+COORDENADAS_CAPITAIS = {
+    'AC': (-9.975, -67.810), 'AL': (-9.665, -35.735), 'AP': (0.035, -51.070), 'AM': (-3.119, -60.022),
+    'BA': (-12.971, -38.511), 'CE': (-3.732, -38.527), 'DF': (-15.794, -47.882), 'ES': (-20.315, -40.312),
+    'GO': (-16.686, -49.265), 'MA': (-2.530, -44.303), 'MT': (-15.601, -56.097), 'MS': (-20.469, -54.620),
+    'MG': (-19.917, -43.935), 'PA': (-1.456, -48.490), 'PB': (-7.115, -34.864), 'PR': (-25.429, -49.271),
+    'PE': (-8.048, -34.877), 'PI': (-5.089, -42.802), 'RJ': (-22.907, -43.173), 'RN': (-5.795, -35.209),
+    'RS': (-30.035, -51.218), 'RO': (-8.762, -63.904), 'RR': (2.820, -60.672), 'SC': (-27.595, -48.548),
+    'SP': (-23.550, -46.633), 'SE': (-10.947, -37.073), 'TO': (-10.184, -48.334)
+}
+
+# Nome de cada capital (sem acentos, minúsculo)
+NOMES_CAPITAIS = {
+    'AC': 'rio branco', 'AL': 'maceio', 'AP': 'macapa', 'AM': 'manaus', 'BA': 'salvador',
+    'CE': 'fortaleza', 'DF': 'brasilia', 'ES': 'vitoria', 'GO': 'goiania', 'MA': 'sao luis',
+    'MT': 'cuiaba', 'MS': 'campo grande', 'MG': 'belo horizonte', 'PA': 'belem', 'PB': 'joao pessoa',
+    'PR': 'curitiba', 'PE': 'recife', 'PI': 'teresina', 'RJ': 'rio de janeiro', 'RN': 'natal',
+    'RS': 'porto alegre', 'RO': 'porto velho', 'RR': 'boa vista', 'SC': 'florianopolis',
+    'SP': 'sao paulo', 'SE': 'aracaju', 'TO': 'palmas'
+}
+
+# Coordenadas de cidades conhecidas fora das capitais (sem acentos, minúsculas)
+COORDENADAS_CIDADES = {
+    'valinhos': COORDENADAS_DESTINOS['valinhos'], 'vinhedo': COORDENADAS_DESTINOS['vinhedo'],
+    'montes claros': COORDENADAS_DESTINOS['montes claros'], 'jundiai': (-23.186, -46.884),
+    'campinas': (-22.906, -47.061), 'santos': (-23.961, -46.333), 'ribeirao preto': (-21.178, -47.810),
+    'sorocaba': (-23.502, -47.458), 'araxa': (-19.593, -46.941), 'uberlandia': (-18.918, -48.277),
+    'paracatu': (-17.222, -46.875), 'niteroi': (-22.883, -43.104), 'vila velha': (-20.330, -40.292),
+    'limoeiro do norte': (-5.145, -38.098), 'juazeiro do norte': (-7.213, -39.315), 'assu': (-5.577, -36.909),
+    'mossoro': (-5.188, -37.344), 'feira de santana': (-12.267, -38.967), 'olinda': (-8.010, -34.855),
+    'caxias do sul': (-29.168, -51.179), 'joinville': (-26.304, -48.846), 'londrina': (-23.310, -51.163)
+}
+
+_PADRAO_SIGLA_UF = re.compile(r'(?<![^\W\d_])(' + '|'.join(UFS) + r')(?![^\W\d_])')
+_PADRAO_NOME_UF = re.compile(r'\b(' + '|'.join(re.escape(nome) for nome in NOMES_UF) + r')\b')
+_PADRAO_CIDADE = re.compile(r'\b(' + '|'.join(re.escape(nome) for nome in COORDENADAS_CIDADES) + r')\b')
+
+
+def _sem_acentos(texto):
+    return unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+
+
+def identificar_uf(endereco):
+    """
+    Retorna a sigla da UF de um endereço (ou None).
+
+    Usa a última sigla em maiúsculas do texto ("Campinas, SP", "Paracatu/MG");
+    sem sigla, procura o nome do estado ou de uma cidade conhecida.
+    """
+    if not isinstance(endereco, str):
+        return None
+    siglas = _PADRAO_SIGLA_UF.findall(endereco)
+    if siglas:
+        return siglas[-1]
+    nome = _PADRAO_NOME_UF.search(_sem_acentos(endereco).lower())
+    return NOMES_UF[nome.group(1)] if nome else None
+
+
+def coordenadas_aproximadas(endereco):
+    """
+    Posição aproximada de um endereço sem consultar o geocodificador.
+
+    Usa a tabela de cidades conhecidas (se a cidade for da UF do endereço)
+    e, na falta dela, a capital da UF.
+
+    Returns:
+        Tupla (lat, lon) ou None se nem a cidade nem a UF forem identificadas
+    """
+    if not isinstance(endereco, str):
+        return None
+    uf = identificar_uf(endereco)
+    for cidade in _PADRAO_CIDADE.findall(_sem_acentos(endereco).lower()):
+        if uf is None or NOMES_UF[cidade] == uf:
+            return COORDENADAS_CIDADES[cidade]
+    return COORDENADAS_CAPITAIS.get(uf)
+
+
+def coordenadas_cidade(cidade, uf):
+    """
+    Coordenadas de uma cidade da tabela offline (cidade conhecida ou capital).
+
+    Returns:
+        Tupla (lat, lon) ou None se a cidade não estiver na tabela
+    """
+    nome = ' '.join(_sem_acentos(cidade).lower().split())
+    if nome in COORDENADAS_CIDADES and NOMES_UF.get(nome) == uf:
+        return COORDENADAS_CIDADES[nome]
+    if NOMES_CAPITAIS.get(uf) == nome:
+        return COORDENADAS_CAPITAIS[uf]
+    return None
+
+
+def destino_da_cidade(cidade, uf=None):
+    """
+    Chave do destino de referência que é a própria cidade informada (ou None).
+
+    Compara a cidade já extraída do endereço, não o texto inteiro: "Rua
+    Valinhos, 100, São Paulo, SP" não é o destino Valinhos.
+
+    Args:
+        cidade: Nome da cidade
+        uf: Sigla da UF (None = não conferir a UF)
+    """
+    if not isinstance(cidade, str):
+        return None
+    nome = ' '.join(_sem_acentos(cidade).lower().split())
+    if nome in COORDENADAS_DESTINOS and uf in (None, NOMES_UF.get(nome)):
+        return nome
+    return None
+
+
+def identificar_destino(destino):
+    """
+    Retorna a chave do destino de referência contido no texto (ou None).
+
+    Usado na coluna "Destino" do histórico, que só traz destinos; para o
+    endereço de uma cotação, ver destino_da_cidade.
+    """
+    if not isinstance(destino, str):
+        return None
+    texto = destino.lower()
+    posicoes = [(texto.find(chave), chave) for chave in COORDENADAS_DESTINOS if chave in texto]
+    # Em destinos múltiplos ("Valinhos, Montes Claros") vale o primeiro citado
+    return min(posicoes)[1] if posicoes else None
+
+
+def distancia_haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Distância em linha reta (haversine) entre arrays de coordenadas em graus.
+
+    Aceita escalares ou arrays NumPy (com broadcast). O erro em relação à
+    geodésica exata é limitado por ERRO_RELATIVO_MAXIMO_HAVERSINE.
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Histórico de Fretes em Memória Compartilhada
+--------------------------------------------
+Este módulo guarda as colunas de precificação já limpas do histórico em
+arrays NumPy contíguos e permite gravá-las uma única vez em um arquivo
+binário que cada processo (por exemplo, os workers do Flask) mapeia em
+modo somente leitura. Assim a memória residente por worker não cresce com
+o tamanho do histórico e novos workers iniciam sem reprocessar o Excel.
+
+Formato do arquivo (ver `gravar_secoes`, também usado pelo instantâneo da
+calculadora):
+    [8 bytes: assinatura][8 bytes: tamanho do cabeçalho][cabeçalho JSON]
+    [dados de cada coluna, alinhados em ALINHAMENTO bytes]
+"""
+
+import json
+import os
+import struct
+import tempfile
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from geografia import COLUNA_DISTANCIA_DESTINO, COORDENADAS_DESTINOS, identificar_destino
+
+ASSINATURA = b'CFHIST01'
+# Versão 2: fretes atípicos removidos por segmento (ver outliers) em vez do corte no percentil 95
+VERSAO_FORMATO = 2
+ALINHAMENTO = 64
+
+# Colunas utilizadas pela precificação
+COLUNAS_NUMERICAS = [
+    '(R$) Frete',
+    'Distancia Valinhos (km)',
+    'Distancia-MC (km)',
+    'Núm. Módulos',
+    'Peso real (kg)'
+]
+COLUNAS_TEXTO = ['Cidade/Estado', 'Destino', 'CEP origem']
+COLUNAS_DATA = ['Data Envio Proposta', 'Data de Orçamento', 'Previsão para descarte']
+
+
+def chave_cidade(texto):
+    """Normaliza "Cidade/UF" para comparação: sem acentos, em minúsculas e sem espaços extras."""
+    if not isinstance(texto, str):
+        return None
+    sem_acentos = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    partes = [' '.join(parte.split()) for parte in sem_acentos.lower().split('/')]
+    return '/'.join(partes)
+
+
+def _alinhar(posicao):
+    """Retorna a próxima posição múltipla de ALINHAMENTO."""
+    return (posicao + ALINHAMENTO - 1) // ALINHAMENTO * ALINHAMENTO
+
+
+class HistoricoFretes:
+    """Colunas de precificação do histórico como arrays NumPy contíguos."""
+
+    def __init__(self, numericas, codigos, vocabularios, datas):
+        """
+        Inicializa o histórico a partir dos arrays já preparados.
+
+        Args:
+            numericas: Dicionário coluna -> array float64
+            codigos: Dicionário coluna -> array int32 com o código de cada valor (-1 = vazio)
+            vocabularios: Dicionário coluna -> lista de valores distintos
+            datas: Dicionário coluna -> array datetime64[ns]
+        """
+        self.numericas = numericas
+        self.codigos = codigos
+        self.vocabularios = vocabularios
+        self.datas = datas
+        # Impressão digital dos dados de origem gravada no arquivo mapeado (None se não houver)
+        self.impressao_dados = None
+        self._mapa = None
+
+    def __len__(self):
+        return len(self.numericas['(R$) Frete'])
+
+    @classmethod
+    def de_dataframe(cls, df):
+        """Extrai as colunas de precificação de um DataFrame já limpo."""
+        n = len(df)
+        numericas = {}
+        for col in COLUNAS_NUMERICAS:
+            if col in df.columns:
+                valores = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+            else:
+                valores = np.full(n, np.nan)
+            numericas[col] = np.ascontiguousarray(valores)
+
+        codigos = {}
+        vocabularios = {}
+        for col in COLUNAS_TEXTO:
+            if col in df.columns:
+                serie = df[col].astype('string')
+                codigos_col, categorias = pd.factorize(serie, use_na_sentinel=True)
+                codigos[col] = np.ascontiguousarray(codigos_col, dtype=np.int32)
+                vocabularios[col] = [str(c) for c in categorias]
+            else:
+                codigos[col] = np.full(n, -1, dtype=np.int32)
+                vocabularios[col] = []
+
+        datas = {}
+        for col in COLUNAS_DATA:
+            if col in df.columns:
+                valores = pd.to_datetime(df[col], errors='coerce').to_numpy(dtype='datetime64[ns]')
+            else:
+                valores = np.full(n, np.datetime64('NaT'), dtype='datetime64[ns]')
+            datas[col] = np.ascontiguousarray(valores)
+
+        return cls(numericas, codigos, vocabularios, datas)
+
+    def filtrar(self, mascara):
+        """Retorna um novo histórico apenas com as linhas marcadas (os vocabulários são mantidos)."""
+        return HistoricoFretes(
+            {col: np.ascontiguousarray(valores[mascara]) for col, valores in self.numericas.items()},
+            {col: np.ascontiguousarray(codigos[mascara]) for col, codigos in self.codigos.items()},
+            self.vocabularios,
+            {col: np.ascontiguousarray(valores[mascara]) for col, valores in self.datas.items()}
+        )
+
+    def datas_referencia(self):
+        """Retorna, por linha, a primeira data disponível entre as colunas de data."""
+        datas = np.full(len(self), np.datetime64('NaT'), dtype='datetime64[ns]')
+        for col in COLUNAS_DATA:
+            datas = np.where(np.isnat(datas), self.datas[col], datas)
+        return datas
+
+    def destinos_referencia(self):
+        """Retorna, por linha, a chave do destino de referência (None se desconhecido)."""
+        chaves = np.array([identificar_destino(d) for d in self.vocabularios['Destino']] + [None], dtype=object)
+        # Código -1 (destino vazio) aponta para o último elemento, None
+        return chaves[self.codigos['Destino']]
+
+    def coordenadas_destino(self):
+        """Retorna arrays (lat, lon) do destino de cada linha (NaN se desconhecido)."""
+        destinos = self.destinos_referencia()
+        lat = np.full(len(self), np.nan)
+        lon = np.full(len(self), np.nan)
+        for chave, (lat_destino, lon_destino) in COORDENADAS_DESTINOS.items():
+            mascara = destinos == chave
+            lat[mascara] = lat_destino
+            lon[mascara] = lon_destino
+        return lat, lon
+
+    def distancias_rota(self):
+        """Retorna, por linha, a distância da origem até o destino registrado (NaN se ausente)."""
+        destinos = self.destinos_referencia()
+        distancias = np.full(len(self), np.nan)
+        for chave, coluna in COLUNA_DISTANCIA_DESTINO.items():
+            mascara = destinos == chave
+            distancias[mascara] = self.numericas[coluna][mascara]
+        return distancias
+
+    def para_dataframe(self):
+        """
+        Monta um DataFrame com os nomes de coluna originais sem copiar os arrays.
+
+        As colunas de texto viram categorias sobre os códigos compartilhados.
+        """
+        colunas = {}
+        for col, valores in self.numericas.items():
+            colunas[col] = pd.Series(valores, copy=False)
+        for col, codigos in self.codigos.items():
+            categorias = pd.Categorical.from_codes(codigos, categories=self.vocabularios[col])
+            colunas[col] = pd.Series(categorias, copy=False)
+        for col, valores in self.datas.items():
+            colunas[col] = pd.Series(valores, copy=False)
+        return pd.DataFrame(colunas, copy=False)
+
+    def secoes(self):
+        """Lista (grupo, coluna, array) de tudo que é gravado no arquivo."""
+        secoes = []
+        for col, valores in self.numericas.items():
+            secoes.append(('numericas', col, valores))
+        for col, codigos in self.codigos.items():
+            secoes.append(('codigos', col, codigos))
+        for col, valores in self.datas.items():
+            secoes.append(('datas', col, valores.view(np.int64)))
+        return secoes
+
+    def salvar(self, caminho, impressao_dados=None):
+        """
+        Grava o histórico no arquivo indicado.
+
+        A gravação é feita em um arquivo temporário e renomeada no final, de
+        modo que workers concorrentes nunca mapeiem um arquivo incompleto.
+
+        Args:
+            caminho: Arquivo de destino
+            impressao_dados: Impressão digital dos dados de origem (ex.: ETag da
+                planilha), comparada por `mapear`
+        """
+        gravar_secoes(caminho, ASSINATURA, {
+            'versao': VERSAO_FORMATO,
+            'linhas': len(self),
+            'impressao_dados': impressao_dados,
+            'vocabularios': self.vocabularios
+        }, self.secoes())
+
+    @classmethod
+    def mapear(cls, caminho, impressao_dados=None):
+        """
+        Mapeia um arquivo gravado por `salvar` em modo somente leitura.
+
+        Os arrays retornados são views sobre o mapa de memória, de modo que
+        as páginas são compartilhadas entre todos os processos que mapearem
+        o mesmo arquivo.
+
+        Args:
+            caminho: Arquivo gravado por `salvar`
+            impressao_dados: Impressão digital atual dos dados de origem; se
+                informada, o arquivo precisa ter sido gravado a partir dela
+
+        Raises:
+            ValueError: arquivo de outra versão do formato ou de outros dados de origem
+        """
+        cabecalho, secoes, mapa = mapear_secoes(caminho, ASSINATURA)
+        if cabecalho.get('versao') != VERSAO_FORMATO:
+            raise ValueError(f"Versão de histórico não suportada: {cabecalho.get('versao')}")
+        if impressao_dados is not None and cabecalho.get('impressao_dados') != impressao_dados:
+            raise ValueError("Histórico gravado a partir de outra versão dos dados de origem")
+        historico = cls.de_secoes(cabecalho['vocabularios'], secoes, mapa)
+        historico.impressao_dados = cabecalho.get('impressao_dados')
+        return historico
+
+    @classmethod
+    def de_secoes(cls, vocabularios, secoes, mapa=None):
+        """
+        Monta o histórico a partir das seções de um arquivo mapeado.
+
+        Args:
+            vocabularios: Vocabulários das colunas de texto
+            secoes: Dicionário grupo -> {coluna: array}, como retornado por `mapear_secoes`
+            mapa: Mapa de memória que contém os arrays (mantido vivo pelo histórico)
+        """
+        datas = {col: valores.view('datetime64[ns]') for col, valores in secoes['datas'].items()}
+        historico = cls(secoes['numericas'], secoes['codigos'], vocabularios, datas)
+        historico._mapa = mapa
+        return historico
+
+
+def gravar_secoes(caminho, assinatura, metadados, secoes):
+    """
+    Grava arrays em um arquivo binário mapeável, de forma atômica.
+
+    Formato:
+        [8 bytes: assinatura][8 bytes: tamanho do cabeçalho][cabeçalho JSON]
+        [dados de cada seção, alinhados em ALINHAMENTO bytes]
+
+    Args:
+        caminho: Arquivo de destino (substituído apenas ao final da gravação)
+        assinatura: 8 bytes que identificam o tipo de arquivo
+        metadados: Dicionário serializável em JSON gravado no cabeçalho
+        secoes: Lista (grupo, nome, array) com os arrays a gravar
+    """
+    colunas = []
+    posicao = 0
+    for grupo, col, valores in secoes:
+        colunas.append({
+            'grupo': grupo,
+            'nome': col,
+            'dtype': valores.dtype.str,
+            'tamanho': int(valores.size),
+            'offset': posicao
+        })
+        posicao = _alinhar(posicao + valores.nbytes)
+
+    cabecalho = json.dumps({**metadados, 'colunas': colunas}, ensure_ascii=False).encode('utf-8')
+    inicio_dados = _alinhar(len(assinatura) + 8 + len(cabecalho))
+
+    diretorio = os.path.dirname(os.path.abspath(caminho))
+    fd, temporario = tempfile.mkstemp(dir=diretorio, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(assinatura)
+            f.write(struct.pack('<Q', len(cabecalho)))
+            f.write(cabecalho)
+            for (grupo, col, valores), meta in zip(secoes, colunas):
+                f.seek(inicio_dados + meta['offset'])
+                f.write(np.ascontiguousarray(valores).tobytes())
+            f.truncate(inicio_dados + posicao)
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+
+def mapear_secoes(caminho, assinatura):
+    """
+    Mapeia em modo somente leitura um arquivo gravado por `gravar_secoes`.
+
+    Returns:
+        Tupla (cabeçalho, seções, mapa): o cabeçalho JSON, um dicionário
+        grupo -> {nome: array} com views sobre o mapa e o próprio mapa
+
+    Raises:
+        ValueError: se a assinatura não corresponder
+    """
+    with open(caminho, 'rb') as f:
+        if f.read(len(assinatura)) != assinatura:
+            raise ValueError(f"Arquivo inválido (assinatura diferente de {assinatura!r}): {caminho}")
+        (tamanho_cabecalho,) = struct.unpack('<Q', f.read(8))
+        cabecalho = json.loads(f.read(tamanho_cabecalho).decode('utf-8'))
+
+    inicio_dados = _alinhar(len(assinatura) + 8 + tamanho_cabecalho)
+    mapa = np.memmap(caminho, dtype=np.uint8, mode='r')
+
+    secoes = {}
+    for meta in cabecalho['colunas']:
+        dtype = np.dtype(meta['dtype'])
+        inicio = inicio_dados + meta['offset']
+        fim = inicio + meta['tamanho'] * dtype.itemsize
+        secoes.setdefault(meta['grupo'], {})[meta['nome']] = np.asarray(mapa[inicio:fim]).view(dtype)
+    return cabecalho, secoes, mapa
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Índice de Cidades
+-----------------
+Identifica a cidade de um endereço entre as origens do histórico tolerando
+erros de digitação ("Arraxa" e "Araxá") e variações de grafia ("Jundiai",
+"Jundiaí").
+
+Na carga, as grafias distintas de "Cidade/Estado" são normalizadas (sem
+acentos, minúsculas) e agrupadas em cidades canônicas, cada uma com um
+identificador inteiro: grafias da mesma UF a uma distância de edição
+pequena viram a mesma cidade. As consultas procuram candidatos por
+trigramas em um índice invertido e confirmam o melhor pela distância de
+Levenshtein, sem varrer os nomes do histórico.
+"""
+
+import numpy as np
+
+from historico import chave_cidade
+
+# Candidatos (com mais trigramas em comum) conferidos pela distância de edição
+NUM_CANDIDATOS = 5
+
+# Origens do histórico sem cidade identificada
+_ORIGENS_SEM_CIDADE = ('cidade desconhecida', 'sem coordenadas')
+
+
+def limite_edicoes(nome):
+    """Distância de edição tolerada para um nome: nenhuma até 4 letras, 1 até 10 e 2 acima disso."""
+    if len(nome) <= 4:
+        return 0
+    return 1 if len(nome) <= 10 else 2
+
+
+def distancia_edicao(a, b, limite=None):
+    """
+    Distância de Levenshtein entre dois textos.
+
+    Com `limite`, interrompe o cálculo assim que a distância o ultrapassa
+    (retornando limite + 1).
+    """
+    if abs(len(a) - len(b)) > (limite if limite is not None else len(a) + len(b)):
+        return limite + 1
+    anterior = list(range(len(b) + 1))
+    for i, letra_a in enumerate(a, 1):
+        atual = [i]
+        for j, letra_b in enumerate(b, 1):
+            atual.append(min(anterior[j] + 1, atual[j - 1] + 1, anterior[j - 1] + (letra_a != letra_b)))
+        if limite is not None and min(atual) > limite:
+            return limite + 1
+        anterior = atual
+    return anterior[-1]
+
+
+def trigramas(nome):
+    """Trigramas do nome, com espaços marcando o início e o fim."""
+    texto = f"  {nome} "
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+def separar_cidade_uf(texto):
+    """Separa "Cidade/UF" em (nome normalizado, UF); (None, None) se não houver cidade."""
+    chave = chave_cidade(texto)
+    if chave is None or '/' not in chave:
+        return None, None
+    nome, uf = chave.rsplit('/', 1)
+    if not nome or nome.startswith(_ORIGENS_SEM_CIDADE):
+        return None, None
+    return nome, uf.upper()
+
+
+class IndiceCidades:
+    """Cidades canônicas das origens do histórico, com busca aproximada por trigramas."""
+
+    def __init__(self):
+        self.nomes = []
+        self.ufs = []
+        # Cidade canônica de cada grafia do vocabulário e de cada linha do histórico (-1 = sem cidade)
+        self.ids_vocabulario = np.empty(0, dtype=np.int32)
+        self.ids_linhas = np.empty(0, dtype=np.int32)
+        self._exatos = {}
+        self._postagens = {}
+        self._arrays = None
+
+    def __len__(self):
+        return len(self.nomes)
+
+    @classmethod
+    def construir(cls, historico):
+        """
+        Agrupa as grafias de "Cidade/Estado" do histórico em cidades canônicas.
+
+        As grafias mais frequentes são processadas primeiro e dão o nome da
+        cidade; as demais se juntam a ela quando ficam dentro do limite de
+        edições na mesma UF.
+        """
+        indice = cls()
+        vocabulario = historico.vocabularios['Cidade/Estado']
+        codigos = historico.codigos['Cidade/Estado']
+        frequencias = np.bincount(codigos[codigos >= 0], minlength=len(vocabulario))
+
+        ids_vocabulario = np.full(len(vocabulario) + 1, -1, dtype=np.int32)
+        for codigo in np.argsort(-frequencias, kind='stable'):
+            nome, uf = separar_cidade_uf(vocabulario[codigo])
+            if nome is not None:
+                id_cidade = indice.identificar(nome, uf)
+                ids_vocabulario[codigo] = id_cidade if id_cidade is not None else indice._adicionar(nome, uf)
+
+        # Código -1 (origem vazia) aponta para o último elemento, -1
+        indice.ids_vocabulario = ids_vocabulario[:-1]
+        indice.ids_linhas = ids_vocabulario[codigos]
+        return indice
+
+    @classmethod
+    def restaurar(cls, nomes, ufs, ids_vocabulario, ids_linhas):
+        """
+        Recria o índice a partir das cidades canônicas já agrupadas (ver instantaneo).
+
+        Apenas as listas invertidas de trigramas são refeitas; o agrupamento
+        das grafias não é repetido.
+        """
+        indice = cls()
+        for nome, uf in zip(nomes, ufs):
+            indice._adicionar(nome, uf)
+        indice.ids_vocabulario = ids_vocabulario
+        indice.ids_linhas = ids_linhas
+        return indice
+
+    def _adicionar(self, nome, uf):
+        id_cidade = len(self.nomes)
+        self.nomes.append(nome)
+        self.ufs.append(uf)
+        self._exatos[(nome, uf)] = id_cidade
+        for trigrama in trigramas(nome):
+            self._postagens.setdefault(trigrama, []).append(id_cidade)
+        self._arrays = None
+        return id_cidade
+
+    def _postagens_arrays(self):
+        """Listas invertidas e UFs como arrays (refeitos apenas após novas cidades)."""
+        if self._arrays is None:
+            postagens = {t: np.array(ids, dtype=np.intp) for t, ids in self._postagens.items()}
+            self._arrays = (postagens, np.array(self.ufs, dtype=object))
+        return self._arrays
+
+    def chave(self, id_cidade):
+        """Chave "cidade/uf" da cidade canônica (mesmo formato de historico.chave_cidade)."""
+        return f"{self.nomes[id_cidade]}/{self.ufs[id_cidade].lower()}"
+
+    def chaves_vocabulario(self):
+        """Chave da cidade canônica de cada grafia do vocabulário (None se não houver cidade)."""
+        return [self.chave(id_cidade) if id_cidade >= 0 else None for id_cidade in self.ids_vocabulario]
+
+    def identificar(self, nome, uf=None):
+        """
+        Retorna o identificador da cidade canônica mais próxima do nome.
+
+        Args:
+            nome: Nome da cidade, já sem acentos e em minúsculas
+            uf: Sigla da UF (opcional); se informada, só aceita cidades dessa UF
+
+        Returns:
+            Identificador inteiro da cidade ou None se nenhuma estiver dentro do limite de edições
+        """
+        if not nome:
+            return None
+        if uf is not None:
+            exato = self._exatos.get((nome, uf))
+            if exato is not None:
+                return exato
+
+        postagens, ufs = self._postagens_arrays()
+        listas = [postagens[t] for t in trigramas(nome) if t in postagens]
+        if not listas:
+            return None
+        comuns = np.bincount(np.concatenate(listas), minlength=len(self.nomes))
+        if uf is not None:
+            comuns[ufs != uf] = 0
+        candidatos = np.argsort(-comuns, kind='stable')[:NUM_CANDIDATOS]
+
+        limite = limite_edicoes(nome)
+        melhor, menor = None, limite + 1
+        for id_cidade in candidatos[comuns[candidatos] > 0]:
+            distancia = distancia_edicao(nome, self.nomes[id_cidade], limite)
+            if distancia < menor:
+                melhor, menor = int(id_cidade), distancia
+        return melhor
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Índice Espacial de Origens e Destinos
+-------------------------------------
+Grade regular (latitude × longitude) sobre as origens do histórico para
+responder rapidamente a "fretes com origem a até R km da origem consultada
+e destino a até R km do destino consultado", sem varrer o histórico inteiro.
+
+Cada origem é posicionada pelas coordenadas reais da sua cidade canônica
+(ver indice_cidades), tiradas da tabela offline de `geografia`; origens de
+cidades fora da tabela não entram na grade. A consulta examina as células
+vizinhas e confirma cada candidato pela distância haversine, de modo que
+todo frete devolvido tem a origem de fato a até R km (em linha reta) da
+origem consultada.
+"""
+
+import math
+
+import numpy as np
+
+from geografia import COORDENADAS_DESTINOS, RAIO_TERRA_KM, coordenadas_cidade, distancia_haversine_km
+
+RAIO_PROXIMIDADE_KM = 30
+
+# Comprimento de um grau de latitude (km)
+KM_POR_GRAU = math.pi * RAIO_TERRA_KM / 180
+
+
+def coordenadas_origens(indice_cidades):
+    """
+    Coordenadas da origem de cada linha do histórico, pela cidade canônica.
+
+    Returns:
+        Arrays (latitudes, longitudes); NaN nas linhas sem cidade canônica ou
+        cuja cidade não está na tabela offline
+    """
+    posicoes_cidades = np.full((len(indice_cidades) + 1, 2), np.nan)
+    for id_cidade, (nome, uf) in enumerate(zip(indice_cidades.nomes, indice_cidades.ufs)):
+        coordenadas = coordenadas_cidade(nome, uf)
+        if coordenadas is not None:
+            posicoes_cidades[id_cidade] = coordenadas
+    # Linhas sem cidade canônica (-1) apontam para a última posição, NaN
+    latitudes, longitudes = posicoes_cidades[indice_cidades.ids_linhas].T.copy()
+    return latitudes, longitudes
+
+
+class IndiceEspacial:
+    """Grade (latitude × longitude) das origens com posição conhecida."""
+
+    def __init__(self, tamanho_celula, celulas, latitudes, longitudes, destinos):
+        """
+        Args:
+            tamanho_celula: Lado de cada célula da grade (graus)
+            celulas: Dicionário (i, j) -> array de posições no histórico
+            latitudes: Latitude da origem de cada linha (NaN se desconhecida)
+            longitudes: Longitude da origem de cada linha (NaN se desconhecida)
+            destinos: Chave do destino de referência de cada linha
+        """
+        self.tamanho_celula = tamanho_celula
+        self.celulas = celulas
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.destinos = destinos
+
+    @classmethod
+    def construir(cls, historico, indice_cidades, tamanho_celula_km=RAIO_PROXIMIDADE_KM):
+        """
+        Constrói a grade a partir de um HistoricoFretes.
+
+        Args:
+            historico: HistoricoFretes
+            indice_cidades: IndiceCidades com a cidade canônica de cada linha
+            tamanho_celula_km: Lado de cada célula, em km de latitude
+        """
+        latitudes, longitudes = coordenadas_origens(indice_cidades)
+        destinos = historico.destinos_referencia()
+
+        tamanho_celula = tamanho_celula_km / KM_POR_GRAU
+        validos = np.isfinite(latitudes) & (destinos != None)  # noqa: E711 - comparação elemento a elemento
+        posicoes = np.flatnonzero(validos)
+        i = np.floor(latitudes[posicoes] / tamanho_celula).astype(np.int64)
+        j = np.floor(longitudes[posicoes] / tamanho_celula).astype(np.int64)
+
+        # Agrupa as posições por célula com uma única ordenação
+        ordem = np.lexsort((j, i))
+        i, j, posicoes = i[ordem], j[ordem], posicoes[ordem]
+        inicio_grupo = np.flatnonzero(np.r_[True, (np.diff(i) != 0) | (np.diff(j) != 0)])
+        celulas = {
+            (int(i[inicio]), int(j[inicio])): grupo
+            for inicio, grupo in zip(inicio_grupo, np.split(posicoes, inicio_grupo[1:]))
+        } if len(posicoes) else {}
+        return cls(tamanho_celula, celulas, latitudes, longitudes, destinos)
+
+    def buscar_raio(self, coord_origem, coord_destino, raio_km=RAIO_PROXIMIDADE_KM):
+        """
+        Retorna as posições dos fretes com origem e destino a até `raio_km` da cotação.
+
+        Args:
+            coord_origem: Tupla (lat, lon) da origem consultada
+            coord_destino: Tupla (lat, lon) do destino consultado
+            raio_km: Raio de busca em km (distância em linha reta)
+
+        Returns:
+            Array ordenado de posições no histórico
+        """
+        destinos_proximos = [
+            chave for chave, (lat, lon) in COORDENADAS_DESTINOS.items()
+            if distancia_haversine_km(coord_destino[0], coord_destino[1], lat, lon) <= raio_km
+        ]
+        if not destinos_proximos:
+            return np.empty(0, dtype=np.intp)
+
+        lat, lon = coord_origem
+        raio_graus = raio_km / KM_POR_GRAU
+        # Um grau de longitude encolhe com a latitude: vale o paralelo mais afastado do equador no raio
+        cosseno = max(math.cos(math.radians(min(abs(lat) + raio_graus, 89.0))), 1e-6)
+        alcance_i = math.ceil(raio_graus / self.tamanho_celula)
+        alcance_j = math.ceil(raio_graus / cosseno / self.tamanho_celula)
+        i0 = int(math.floor(lat / self.tamanho_celula))
+        j0 = int(math.floor(lon / self.tamanho_celula))
+
+        grupos = [
+            self.celulas[(i, j)]
+            for i in range(i0 - alcance_i, i0 + alcance_i + 1)
+            for j in range(j0 - alcance_j, j0 + alcance_j + 1)
+            if (i, j) in self.celulas
+        ]
+        if not grupos:
+            return np.empty(0, dtype=np.intp)
+
+        candidatos = np.concatenate(grupos)
+        distancias = distancia_haversine_km(lat, lon, self.latitudes[candidatos], self.longitudes[candidatos])
+        proximos = (distancias <= raio_km) & np.isin(self.destinos[candidatos], destinos_proximos)
+        return np.sort(candidatos[proximos])
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Índice de Similaridade de Fretes
+--------------------------------
+Busca os k fretes históricos mais parecidos com uma cotação em um espaço de
+atributos normalizado:
+
+- posição da origem (latitude/longitude da cidade canônica, ver
+  indice_espacial.coordenadas_origens)
+- posição do destino (latitude/longitude)
+- log da distância da rota
+- log da quantidade (módulos ou peso)
+- idade do frete
+
+Usa uma KD-tree (scipy) construída na carga quando disponível; sem scipy,
+cai para uma busca exaustiva vetorizada, adequada ao tamanho do histórico.
+"""
+
+import numpy as np
+
+from geografia import FATOR_SINUOSIDADE
+from indice_espacial import coordenadas_origens
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+K_VIZINHOS = 8
+
+# Escala de cada atributo: uma unidade no espaço normalizado
+ESCALA_POSICAO_KM = 150
+ESCALA_LOG_DISTANCIA = 0.35
+ESCALA_LOG_QUANTIDADE = 0.5
+ESCALA_IDADE_ANOS = 2.0
+
+# Vizinhos além deste raio (no espaço normalizado) são descartados
+RAIO_MAXIMO = 4.0
+
+# Suavização dos pesos inversamente proporcionais à distância
+SUAVIZACAO_PESO = 0.25
+
+KM_POR_GRAU = 111.195
+PESO_POR_MODULO_KG = 30
+
+
+def _posicao(lat, lon):
+    """Projeta uma posição em km (equiretangular) e normaliza."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    y = lat * KM_POR_GRAU
+    x = lon * KM_POR_GRAU * np.cos(np.radians(lat))
+    return x / ESCALA_POSICAO_KM, y / ESCALA_POSICAO_KM
+
+
+def _montar_atributos(lat_origem, lon_origem, lat_destino, lon_destino, distancia_rota, quantidade, idade_anos):
+    """Empilha os atributos normalizados em uma matriz (n, 7)."""
+    x_origem, y_origem = _posicao(lat_origem, lon_origem)
+    x_destino, y_destino = _posicao(lat_destino, lon_destino)
+    return np.column_stack([
+        x_origem,
+        y_origem,
+        x_destino,
+        y_destino,
+        np.log1p(distancia_rota) / ESCALA_LOG_DISTANCIA,
+        np.log1p(quantidade) / ESCALA_LOG_QUANTIDADE,
+        np.asarray(idade_anos, dtype=np.float64) / ESCALA_IDADE_ANOS
+    ])
+
+
+class _Arvore:
+    """Conjunto de atributos indexado para consulta dos k vizinhos."""
+
+    def __init__(self, posicoes, atributos):
+        self.posicoes = posicoes
+        self.atributos = atributos
+        self.kdtree = cKDTree(atributos) if cKDTree is not None and len(atributos) else None
+
+    def consultar(self, ponto, k):
+        """Retorna (distâncias, posições no histórico) dos k vizinhos mais próximos."""
+        k = min(k, len(self.posicoes))
+        if k == 0:
+            return np.empty(0), np.empty(0, dtype=np.intp)
+        if self.kdtree is not None:
+            distancias, indices = self.kdtree.query(ponto, k=k, distance_upper_bound=RAIO_MAXIMO)
+            distancias = np.atleast_1d(distancias)
+            indices = np.atleast_1d(indices)
+        else:
+            distancias = np.sqrt(np.sum((self.atributos - ponto) ** 2, axis=1))
+            indices = np.argpartition(distancias, k - 1)[:k]
+            indices = indices[np.argsort(distancias[indices])]
+            distancias = distancias[indices]
+        validos = distancias <= RAIO_MAXIMO
+        return distancias[validos], self.posicoes[indices[validos]]
+
+
+class IndiceSimilaridade:
+    """Índice de vizinhos mais próximos sobre o histórico, por modo de cálculo."""
+
+    def __init__(self, arvores):
+        self.arvores = arvores
+
+    @classmethod
+    def construir(cls, historico, indice_cidades, hoje=None):
+        """
+        Constrói o índice a partir de um HistoricoFretes.
+
+        Linhas sem origem posicionada (cidade fora da tabela offline),
+        destino conhecido, distância da rota ou quantidade ficam fora do
+        índice.
+
+        Args:
+            historico: HistoricoFretes
+            indice_cidades: IndiceCidades com a cidade canônica de cada linha
+            hoje: Data de referência da idade dos fretes (padrão: hoje)
+        """
+        hoje = np.datetime64(hoje if hoje is not None else 'today', 'D')
+        datas = historico.datas_referencia().astype('datetime64[D]')
+        idade_anos = np.where(np.isnat(datas), 1.0, (hoje - datas).astype(np.float64) / 365)
+        idade_anos = np.clip(idade_anos, 0, None)
+
+        lat_origem, lon_origem = coordenadas_origens(indice_cidades)
+        lat_destino, lon_destino = historico.coordenadas_destino()
+        distancia_rota = historico.distancias_rota()
+
+        modulos = historico.numericas['Núm. Módulos']
+        peso = historico.numericas['Peso real (kg)']
+        quantidades = {
+            'modulos': modulos,
+            'peso': np.where(np.isfinite(peso) & (peso > 0), peso, modulos * PESO_POR_MODULO_KG)
+        }
+
+        base_valida = (
+            np.isfinite(lat_origem) &
+            np.isfinite(lat_destino) &
+            np.isfinite(distancia_rota) & (distancia_rota > 0)
+        )
+
+        arvores = {}
+        for modo, quantidade in quantidades.items():
+            validos = base_valida & np.isfinite(quantidade) & (quantidade > 0)
+            posicoes = np.flatnonzero(validos)
+            atributos = _montar_atributos(
+                lat_origem[posicoes], lon_origem[posicoes],
+                lat_destino[posicoes], lon_destino[posicoes],
+                distancia_rota[posicoes], quantidade[posicoes], idade_anos[posicoes]
+            )
+            arvores[modo] = _Arvore(posicoes, atributos)
+        return cls(arvores)
+
+    def buscar(self, coord_origem, coord_destino, distancia, quantidade, modo_calculo="modulos", k=K_VIZINHOS,
+               distancia_rodoviaria=False):
+        """
+        Busca os k fretes mais similares a uma cotação.
+
+        Args:
+            coord_origem: Tupla (lat, lon) da origem
+            coord_destino: Tupla (lat, lon) do destino
+            distancia: Distância da cotação (km)
+            quantidade: Número de módulos ou peso em kg, conforme o modo
+            modo_calculo: "modulos" ou "peso"
+            k: Número máximo de vizinhos
+            distancia_rodoviaria: Se True, `distancia` já é rodoviária (como as do
+                histórico); senão é em linha reta e recebe o FATOR_SINUOSIDADE
+
+        Returns:
+            Tupla (posições no histórico, pesos normalizados); vazia se não houver vizinhos
+        """
+        arvore = self.arvores.get(modo_calculo)
+        if arvore is None or quantidade is None or not quantidade > 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        distancia_rota = distancia if distancia_rodoviaria else distancia * FATOR_SINUOSIDADE
+        ponto = _montar_atributos(
+            [coord_origem[0]], [coord_origem[1]],
+            [coord_destino[0]], [coord_destino[1]],
+            [distancia_rota], [quantidade], [0.0]
+        )[0]
+
+        distancias, posicoes = arvore.consultar(ponto, k)
+        if len(posicoes) == 0:
+            return posicoes, distancias
+        pesos = 1 / (distancias + SUAVIZACAO_PESO)
+        return posicoes, pesos / pesos.sum()
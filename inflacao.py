@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Índice de Inflação Mensal (IPCA)
+--------------------------------
+Carrega a tabela local de variações mensais do IPCA e calcula, de forma
+vetorizada, o fator que leva um valor de uma data qualquer para o valor de
+hoje. Meses fora da tabela são extrapolados com a taxa anual padrão.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+ARQUIVO_IPCA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ipca_mensal.csv')
+
+# Meses sem data de referência são tratados como de um ano atrás
+MESES_SEM_DATA = 12
+
+
+class IndiceInflacao:
+    """Índice acumulado mês a mês com consulta vetorizada por data."""
+
+    def __init__(self, primeiro_mes, indices, taxa_anual):
+        """
+        Args:
+            primeiro_mes: Primeiro mês da tabela, em meses desde 1970-01
+            indices: Índice acumulado ao final de cada mês (array float64)
+            taxa_anual: Taxa usada para extrapolar meses fora da tabela
+        """
+        self.primeiro_mes = int(primeiro_mes)
+        self.indices = np.asarray(indices, dtype=np.float64)
+        self.taxa_mensal = (1 + taxa_anual) ** (1 / 12)
+
+    @classmethod
+    def carregar(cls, taxa_anual, caminho=ARQUIVO_IPCA):
+        """
+        Carrega a tabela de variações mensais (colunas `mes` e `variacao_pct`).
+
+        Se o arquivo não existir, retorna um índice vazio que usa apenas a
+        taxa anual informada.
+        """
+        if not os.path.exists(caminho):
+            mes_atual = np.datetime64('today', 'M').astype(np.int64)
+            return cls(mes_atual, [1.0], taxa_anual)
+
+        tabela = pd.read_csv(caminho, dtype={'mes': str})
+        meses = pd.to_datetime(tabela['mes'], format='%Y-%m').to_numpy(dtype='datetime64[M]').astype(np.int64)
+        ordem = np.argsort(meses)
+        meses = meses[ordem]
+        if len(meses) == 0 or np.any(np.diff(meses) != 1):
+            raise ValueError(f"Tabela de IPCA deve ter meses consecutivos: {caminho}")
+
+        variacoes = tabela['variacao_pct'].to_numpy(dtype=np.float64)[ordem] / 100
+        return cls(meses[0], np.cumprod(1 + variacoes), taxa_anual)
+
+    def indice(self, meses):
+        """Retorna o índice acumulado para um array de meses desde 1970-01."""
+        posicao = np.asarray(meses, dtype=np.int64) - self.primeiro_mes
+        dentro = np.clip(posicao, 0, len(self.indices) - 1)
+        return self.indices[dentro] * self.taxa_mensal ** (posicao - dentro)
+
+    def fatores(self, datas, hoje=None):
+        """
+        Calcula, para cada data, o fator que corrige um valor até hoje.
+
+        Args:
+            datas: Array datetime64 (NaT = sem data, assume um ano atrás)
+            hoje: Data de referência (padrão: data atual)
+
+        Returns:
+            Array float64 com os fatores de correção
+        """
+        mes_hoje = np.datetime64(hoje if hoje is not None else 'today', 'M').astype(np.int64)
+        datas = np.asarray(datas, dtype='datetime64[M]')
+        meses = np.where(np.isnat(datas), mes_hoje - MESES_SEM_DATA, datas.astype(np.int64))
+        meses = np.minimum(meses, mes_hoje)
+        return self.indice(np.array([mes_hoje]))[0] / self.indice(meses)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Instantâneo da Calculadora
+--------------------------
+Grava em um único arquivo versionado o estado derivado da calculadora, para
+que um novo processo (reinício do Flask ou do Streamlit) comece a cotar sem
+baixar o Excel, sem refazer o agrupamento das cidades e sem geocodificar de
+novo os endereços já consultados:
+
+- colunas do histórico já limpas (mesmas seções de historico.HistoricoFretes)
+- cidades canônicas do índice de cidades
+- distâncias das rotas do histórico
+- coordenadas já geocodificadas
+
+O arquivo usa o formato de `historico.gravar_secoes`: os arrays são mapeados
+em memória na carga e o restante fica no cabeçalho JSON. Os índices baratos
+(CEPs, grade espacial, agregados por rota, rotas locais) são refeitos a
+partir do histórico restaurado. Um instantâneo de outra versão do formato é
+ignorado e a calculadora é montada do zero, assim como um instantâneo com o
+histórico de outra versão (por exemplo, com outro filtro de outliers) ou
+gravado a partir de outra versão da planilha: o cabeçalho guarda a
+impressão digital dos dados de origem (ETag da URL ou tamanho e data de
+modificação do arquivo local), comparada com a atual na carga.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from typing import NamedTuple
+
+from distancias_rotas import DistanciasRotas
+from historico import VERSAO_FORMATO as VERSAO_HISTORICO, HistoricoFretes, gravar_secoes, mapear_secoes
+from indice_cidades import IndiceCidades
+
+logger = logging.getLogger('calculadora.dados')
+
+ASSINATURA = b'CFINST01'
+VERSAO_FORMATO = 1
+
+# Intervalo padrão entre gravações periódicas (s)
+INTERVALO_GRAVACAO_S = 300
+
+
+class EstadoCalculadora(NamedTuple):
+    """Estado derivado da calculadora gravado no instantâneo."""
+    historico: HistoricoFretes
+    indice_cidades: IndiceCidades
+    distancias_rotas: DistanciasRotas
+    # Endereço -> (lat, lon)
+    coordenadas: dict
+    # Impressão digital dos dados de origem do histórico (None se desconhecida)
+    impressao_dados: str = None
+
+
+def salvar(caminho, estado):
+    """
+    Grava o estado no arquivo indicado (de forma atômica, ver historico.gravar_secoes).
+
+    Args:
+        caminho: Arquivo do instantâneo
+        estado: EstadoCalculadora
+    """
+    historico = estado.historico
+    secoes = historico.secoes()
+    secoes.append(('cidades', 'ids_vocabulario', estado.indice_cidades.ids_vocabulario))
+    secoes.append(('cidades', 'ids_linhas', estado.indice_cidades.ids_linhas))
+    gravar_secoes(caminho, ASSINATURA, {
+        'versao': VERSAO_FORMATO,
+        'versao_historico': VERSAO_HISTORICO,
+        'criado_em': time.time(),
+        'linhas': len(historico),
+        'impressao_dados': estado.impressao_dados,
+        'vocabularios': historico.vocabularios,
+        'cidades': {'nomes': estado.indice_cidades.nomes, 'ufs': estado.indice_cidades.ufs},
+        'distancias_rotas': [[origem, destino, distancia]
+                             for (origem, destino), distancia in estado.distancias_rotas.distancias.items()],
+        'coordenadas': [[endereco, float(lat), float(lon)] for endereco, (lat, lon) in estado.coordenadas.items()]
+    }, secoes)
+
+
+def carregar(caminho, impressao_dados=None):
+    """
+    Mapeia um instantâneo gravado por `salvar`.
+
+    Args:
+        caminho: Arquivo do instantâneo
+        impressao_dados: Impressão digital atual dos dados de origem; se
+            informada, o instantâneo precisa ter sido gravado a partir dela
+
+    Returns:
+        EstadoCalculadora
+
+    Raises:
+        ValueError: se o arquivo não for um instantâneo, for de outra versão do formato
+            (ou do histórico) ou tiver sido gravado a partir de outros dados de origem
+    """
+    cabecalho, secoes, mapa = mapear_secoes(caminho, ASSINATURA)
+    if cabecalho.get('versao') != VERSAO_FORMATO:
+        raise ValueError(f"Versão de instantâneo não suportada: {cabecalho.get('versao')}")
+    if cabecalho.get('versao_historico') != VERSAO_HISTORICO:
+        raise ValueError(f"Instantâneo com histórico de outra versão: {cabecalho.get('versao_historico')}")
+    if impressao_dados is not None and cabecalho.get('impressao_dados') != impressao_dados:
+        raise ValueError("Instantâneo gravado a partir de outra versão dos dados de origem")
+
+    historico = HistoricoFretes.de_secoes(cabecalho['vocabularios'], secoes, mapa)
+    cidades = cabecalho['cidades']
+    indice_cidades = IndiceCidades.restaurar(cidades['nomes'], cidades['ufs'],
+                                             secoes['cidades']['ids_vocabulario'], secoes['cidades']['ids_linhas'])
+    distancias_rotas = DistanciasRotas({(origem, destino): distancia
+                                        for origem, destino, distancia in cabecalho['distancias_rotas']})
+    coordenadas = {endereco: (lat, lon) for endereco, lat, lon in cabecalho['coordenadas']}
+    return EstadoCalculadora(historico, indice_cidades, distancias_rotas, coordenadas, cabecalho.get('impressao_dados'))
+
+
+def gravacao_vencida(caminho, intervalo_s=INTERVALO_GRAVACAO_S):
+    """
+    Indica se o instantâneo não existe ou foi gravado há mais de `intervalo_s`.
+
+    Usado por quem não mantém uma calculadora viva entre os cálculos (e, portanto,
+    não tem uma GravacaoPeriodica) para não regravar o arquivo a cada cotação.
+    """
+    try:
+        return time.time() - os.path.getmtime(caminho) >= intervalo_s
+    except OSError:
+        return True
+
+
+class GravacaoPeriodica:
+    """Chama uma função de gravação a cada intervalo, em segundo plano, e uma última vez ao encerrar."""
+
+    def __init__(self, gravar, intervalo_s=INTERVALO_GRAVACAO_S):
+        """
+        Args:
+            gravar: Função sem argumentos que grava o instantâneo
+            intervalo_s: Intervalo entre gravações (s)
+        """
+        self.gravar = gravar
+        self.intervalo_s = intervalo_s
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name='instantaneo', daemon=True)
+        self._thread.start()
+        atexit.register(self.encerrar)
+
+    def _gravar(self):
+        try:
+            self.gravar()
+        except Exception as e:
+            logger.error("Erro ao gravar instantâneo: %s", e)
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo_s):
+            self._gravar()
+
+    def encerrar(self):
+        """Interrompe as gravações periódicas e grava o estado final."""
+        if not self._parar.is_set():
+            self._parar.set()
+            self._thread.join()
+            self._gravar()
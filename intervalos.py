@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Intervalos de Confiança por Bootstrap
+-------------------------------------
+Estima a incerteza do valor cotado reamostrando os fretes candidatos: cada
+reamostragem sorteia os candidatos com reposição, recalcula a estatística
+da estratégia de agregação (média, média ponderada ou média aparada dos
+fretes normalizados, ver agregacao) e os percentis PERCENTIS dessas
+estatísticas formam o intervalo.
+
+Os percentis são devolvidos como razões sobre a estatística da amostra
+completa, para serem aplicados ao valor estimado da cotação já com
+multiplicadores e margem (a estatística do bootstrap pode diferir do valor
+base da estratégia "media", que ajusta pela quantidade média).
+
+Todas as reamostragens de um bloco de cotações saem de uma única matriz de
+índices (cotação × reamostragem × frete), sem laços em Python. O custo é
+limitado em duas frentes:
+
+- cada reamostragem usa no máximo MAXIMO_AMOSTRA fretes; com mais
+  candidatos, usa-se o bootstrap "m de n" e o desvio em relação à
+  estatística completa é reduzido por sqrt(m/n), o que mantém a largura do
+  intervalo de uma média;
+- o lote recebe ORCAMENTO_COTACAO_S por cotação; cada bloco é limitado ao
+  número de elementos que cabe no tempo restante (pela vazão medida nos
+  blocos anteriores) e as cotações que não couberem ficam sem intervalo.
+
+Os sorteios são gerados uma única vez, com semente fixa, e compartilhados
+por todas as cotações: a mesma cotação recebe sempre o mesmo intervalo,
+sozinha ou em qualquer lote.
+"""
+
+import time
+
+import numpy as np
+
+# Percentis do intervalo (P10, P50, P90)
+PERCENTIS = (10, 50, 90)
+
+# Reamostragens por cotação
+REAMOSTRAGENS = 200
+
+# Fretes sorteados por reamostragem (acima disso, bootstrap "m de n")
+MAXIMO_AMOSTRA = 100
+
+# Elementos da matriz de índices processados por bloco (cotações × reamostragens × fretes)
+ELEMENTOS_POR_BLOCO = 500_000
+
+# Mínimo de fretes candidatos para estimar um intervalo
+MINIMO_FRETES = 3
+
+# Tempo máximo gasto com os intervalos, por cotação do lote (s)
+ORCAMENTO_COTACAO_S = 0.005
+
+# Vazão presumida antes do primeiro bloco medido (elementos/s), propositalmente baixa
+VAZAO_INICIAL = 10_000_000
+
+SEMENTE = 20240601
+
+# Sorteios uniformes em [0, 1) compartilhados (reamostragem × frete)
+_SORTEIO = np.random.default_rng(SEMENTE).random((REAMOSTRAGENS, MAXIMO_AMOSTRA))
+
+
+def _estatistica(valores, pesos, fracao_aparada):
+    """Estatística da amostra completa (mesma regra aplicada às reamostragens)."""
+    if fracao_aparada > 0:
+        descartados = int(len(valores) * fracao_aparada)
+        ordenados = np.sort(valores)
+        return float(np.mean(ordenados[descartados:len(ordenados) - descartados]))
+    return float(np.average(valores, weights=pesos))
+
+
+def _preparar(valores, pesos):
+    """Mantém os fretes com valor finito e peso positivo; pesos ausentes valem 1."""
+    valores = np.asarray(valores, dtype=np.float64)
+    pesos = np.ones(len(valores)) if pesos is None else np.asarray(pesos, dtype=np.float64)
+    mantidos = np.isfinite(valores) & np.isfinite(pesos) & (pesos > 0)
+    return valores[mantidos], pesos[mantidos]
+
+
+def _estatisticas_bloco(valores, pesos, tamanhos, amostras, fracao_aparada):
+    """
+    Estatística de cada reamostragem de um bloco de cotações.
+
+    Args:
+        valores: Matriz (cotações × n máximo) com os fretes de cada cotação, preenchida com zeros
+        pesos: Matriz de pesos no mesmo formato (zeros no preenchimento)
+        tamanhos: Número de fretes de cada cotação
+        amostras: Fretes sorteados por reamostragem em cada cotação (<= tamanhos)
+
+    Returns:
+        Matriz (cotações × REAMOSTRAGENS)
+    """
+    largura = int(amostras.max())
+    # Índices uniformes em [0, tamanho) de cada cotação; colunas além de `amostras` são descartadas
+    indices = (_SORTEIO[None, :, :largura] * tamanhos[:, None, None]).astype(np.intp)
+    validos = np.arange(largura) < amostras[:, None, None]
+
+    sorteados = np.take_along_axis(valores[:, None, :], indices, axis=2)
+    if fracao_aparada > 0:
+        ordenados = np.sort(np.where(validos, sorteados, np.inf), axis=2)
+        descartados = (amostras * fracao_aparada).astype(np.intp)[:, None, None]
+        posicao = np.arange(largura)
+        mantidos = (posicao >= descartados) & (posicao < amostras[:, None, None] - descartados)
+        return np.where(mantidos, ordenados, 0).sum(axis=2) / mantidos.sum(axis=2)
+
+    pesos_sorteados = np.where(validos, np.take_along_axis(pesos[:, None, :], indices, axis=2), 0)
+    return (pesos_sorteados * sorteados).sum(axis=2) / pesos_sorteados.sum(axis=2)
+
+
+def percentis_lote(conjuntos, fracao_aparada=0.0, percentis=PERCENTIS, orcamento_s=None):
+    """
+    Razões percentil / estatística completa de cada cotação de um lote.
+
+    Args:
+        conjuntos: Lista de pares (valores normalizados dos fretes candidatos,
+            pesos de cada frete ou None) com um par por cotação
+        fracao_aparada: Fração descartada em cada ponta de cada reamostragem
+            (0 = média, ponderada pelos pesos)
+        percentis: Percentis calculados
+        orcamento_s: Tempo máximo total (padrão: ORCAMENTO_COTACAO_S por cotação)
+
+    Returns:
+        Lista com um array de razões (uma por percentil) por cotação, ou None
+        para as cotações com menos de MINIMO_FRETES fretes ou fora do prazo
+    """
+    prazo = time.monotonic() + (orcamento_s if orcamento_s is not None else ORCAMENTO_COTACAO_S * len(conjuntos))
+    razoes = [None] * len(conjuntos)
+
+    preparados = [_preparar(valores, pesos) for valores, pesos in conjuntos]
+    elegiveis = [i for i, (valores, _) in enumerate(preparados) if len(valores) >= MINIMO_FRETES]
+    if not elegiveis:
+        return razoes
+
+    # Cotações de tamanho parecido no mesmo bloco, para reduzir o preenchimento
+    tamanhos = np.array([len(preparados[i][0]) for i in elegiveis])
+    ordem = [elegiveis[k] for k in np.argsort(tamanhos, kind='stable')]
+    vazao = VAZAO_INICIAL
+
+    inicio = 0
+    while inicio < len(ordem):
+        comeco_bloco = time.monotonic()
+        limite = min(ELEMENTOS_POR_BLOCO, (prazo - comeco_bloco) * vazao)
+        # O bloco cresce enquanto couber no limite (as larguras só aumentam, pela ordenação)
+        fim = inicio
+        while fim < len(ordem):
+            largura = min(len(preparados[ordem[fim]][0]), MAXIMO_AMOSTRA)
+            if (fim - inicio + 1) * REAMOSTRAGENS * largura > limite:
+                break
+            fim += 1
+        if fim == inicio:
+            # Nem uma cotação cabe no tempo restante
+            break
+        bloco = ordem[inicio:fim]
+        inicio = fim
+
+        tamanhos_bloco = np.array([len(preparados[i][0]) for i in bloco])
+        valores = np.zeros((len(bloco), tamanhos_bloco.max()))
+        pesos = np.zeros_like(valores)
+        for linha, i in enumerate(bloco):
+            valores[linha, :tamanhos_bloco[linha]], pesos[linha, :tamanhos_bloco[linha]] = preparados[i]
+        amostras = np.minimum(tamanhos_bloco, MAXIMO_AMOSTRA)
+
+        estatisticas = _estatisticas_bloco(valores, pesos, tamanhos_bloco, amostras, fracao_aparada)
+        completas = np.array([_estatistica(*preparados[i], fracao_aparada) for i in bloco])
+        # Bootstrap "m de n": desvios reduzidos por sqrt(m/n)
+        escala = np.sqrt(amostras / tamanhos_bloco)[:, None]
+        estatisticas = completas[:, None] + (estatisticas - completas[:, None]) * escala
+        valores_percentis = np.percentile(estatisticas, percentis, axis=1).T
+        for linha, i in enumerate(bloco):
+            if completas[linha] > 0:
+                razoes[i] = valores_percentis[linha] / completas[linha]
+        vazao = len(bloco) * REAMOSTRAGENS * int(amostras.max()) / max(time.monotonic() - comeco_bloco, 1e-6)
+    return razoes
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Filtro de Outliers do Histórico
+-------------------------------
+Marca os fretes atípicos do histórico por segmento (faixa de distância ×
+faixa de módulos), em vez de um corte global: um frete de longa distância
+caro é normal entre os de longa distância, enquanto um valor irrisório ou
+digitado com zeros a mais destoa do seu segmento.
+
+Cada frete é comparado à mediana do seu segmento pelo escore z modificado
+(Iglewicz e Hoaglin) sobre o logaritmo do valor, com a escala dada pelo MAD
+(ou pelo IQR, quando mais da metade dos valores é igual à mediana), limitada
+a ESCALA_MINIMA.
+Segmentos com poucos fretes usam as estatísticas da faixa de módulos (a
+quantidade pesa mais no valor que a distância) e, se ainda forem poucos, as
+do histórico inteiro.
+
+As estatísticas são calculadas uma única vez na carga, com agregações
+vetorizadas por grupo; a máscara resultante é aplicada ao histórico antes
+de ele ser gravado (ver historico.HistoricoFretes.filtrar).
+"""
+
+import numpy as np
+import pandas as pd
+
+# Limites das faixas de distância (mesmas faixas de valores_referencia_distancia em politica_precos.json)
+LIMITES_FAIXA_DISTANCIA = np.array([10, 50, 100, 500, 1000], dtype=np.float64)
+
+# Limites das faixas de módulos (mesmas faixas de valores_referencia_modulos em politica_precos.json)
+LIMITES_FAIXA_MODULOS = np.array([50, 100, 200, 500, 1000], dtype=np.float64)
+
+# Escore z modificado acima do qual o frete é considerado atípico
+LIMITE_ESCORE = 3.5
+
+# Mínimo de fretes para um segmento usar as próprias estatísticas
+MINIMO_FRETES_SEGMENTO = 5
+
+# Escala mínima (no logaritmo do valor): segmentos com muitos valores repetidos
+# não tornam atípico um frete que difere da mediana por um fator de até ~3,4
+ESCALA_MINIMA = 0.35
+
+# Razão entre o desvio padrão e o MAD / o IQR de uma distribuição normal
+_ESCALA_MAD = 1.4826
+_ESCALA_IQR = 1.349
+
+
+def _faixas(valores, limites):
+    """Índice da faixa de cada valor; valores ausentes ficam em uma faixa própria (len(limites) + 1)."""
+    faixas = np.searchsorted(limites, valores, side='right')
+    return np.where(np.isfinite(valores), faixas, len(limites) + 1)
+
+
+def _estatisticas(log_fretes, grupos):
+    """Contagem, mediana e escala robusta de cada grupo, alinhadas às linhas."""
+    por_grupo = pd.Series(log_fretes).groupby(grupos)
+    contagem = por_grupo.transform('size').to_numpy()
+    mediana = por_grupo.transform('median').to_numpy()
+    mad = pd.Series(np.abs(log_fretes - mediana)).groupby(grupos).transform('median').to_numpy()
+    iqr = (por_grupo.transform('quantile', 0.75) - por_grupo.transform('quantile', 0.25)).to_numpy()
+    escala = np.where(mad > 0, _ESCALA_MAD * mad, iqr / _ESCALA_IQR)
+    return contagem, mediana, escala
+
+
+def mascara_fretes_tipicos(fretes, distancias, modulos, limite_escore=LIMITE_ESCORE,
+                           minimo_fretes=MINIMO_FRETES_SEGMENTO):
+    """
+    Retorna a máscara dos fretes mantidos no histórico.
+
+    Args:
+        fretes: Valor de cada frete (valores não positivos ou ausentes são descartados)
+        distancias: Distância da rota de cada frete (NaN se ausente)
+        modulos: Número de módulos de cada frete (NaN se ausente)
+        limite_escore: Escore z modificado máximo de um frete típico
+        minimo_fretes: Mínimo de fretes para um segmento usar as próprias estatísticas
+
+    Returns:
+        Array booleano, True para os fretes típicos
+    """
+    fretes = np.asarray(fretes, dtype=np.float64)
+    validos = np.isfinite(fretes) & (fretes > 0)
+    mascara = np.zeros(len(fretes), dtype=bool)
+    if not validos.any():
+        return mascara
+
+    log_fretes = np.log(fretes[validos])
+    faixa_distancia = _faixas(np.asarray(distancias, dtype=np.float64)[validos], LIMITES_FAIXA_DISTANCIA)
+    faixa_modulos = _faixas(np.asarray(modulos, dtype=np.float64)[validos], LIMITES_FAIXA_MODULOS)
+    segmentos = faixa_distancia * (len(LIMITES_FAIXA_MODULOS) + 2) + faixa_modulos
+
+    # Do nível mais geral ao mais específico: cada faixa substitui o nível anterior onde tiver fretes suficientes
+    _, mediana, escala = _estatisticas(log_fretes, np.zeros(len(log_fretes), dtype=np.int64))
+    for grupos in (faixa_modulos, segmentos):
+        contagem, mediana_grupo, escala_grupo = _estatisticas(log_fretes, grupos)
+        suficientes = contagem >= minimo_fretes
+        mediana = np.where(suficientes, mediana_grupo, mediana)
+        escala = np.where(suficientes, escala_grupo, escala)
+
+    escore = np.abs(log_fretes - mediana) / np.maximum(escala, ESCALA_MINIMA)
+    mascara[validos] = escore <= limite_escore
+    return mascara
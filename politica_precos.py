@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Política de Preços
+------------------
+Carrega as tabelas de referência da precificação (valores por faixa de
+distância, módulos e peso, multiplicadores regionais e por distância no
+Sudeste) de um arquivo JSON e as compila em arrays NumPy:
+
+- cada tabela por faixa vira um array de limites e arrays de valores,
+  consultados com `np.searchsorted`
+- os multiplicadores regionais e por par de UFs viram uma única matriz
+  densa de localidades, indexada por códigos inteiros
+
+O arquivo distribuído (ARQUIVO_POLITICA) é a única fonte das tabelas
+padrão (ver `carregar_tabelas`). As tabelas são validadas na carga e a
+`FontePolitica` recarrega o arquivo quando ele é alterado, sem reiniciar o
+processo. Todas as consultas aceitam
+escalares ou arrays, para uso em cotações em lote.
+"""
+
+import json
+import logging
+import os
+import re
+import time
+
+import numpy as np
+
+from geografia import INDICE_UF, REGIAO_POR_UF, REGIOES, UFS
+
+logger = logging.getLogger('calculadora.politica')
+
+ARQUIVO_POLITICA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'politica_precos.json')
+
+# Intervalo mínimo entre verificações de alteração do arquivo
+INTERVALO_VERIFICACAO_S = 2.0
+
+INDICE_REGIAO = {regiao: i for i, regiao in enumerate(REGIOES)}
+REGIAO_DESCONHECIDA = len(REGIOES)
+
+# Códigos de localidade da matriz de multiplicadores: 0-26 são as UFs,
+# os seguintes são regiões cuja UF não foi identificada e o último é a
+# localidade desconhecida (multiplicador 1.0)
+CODIGO_PRIMEIRA_REGIAO = len(UFS)
+CODIGO_DESCONHECIDO = len(UFS) + len(REGIOES)
+NUM_CODIGOS = CODIGO_DESCONHECIDO + 1
+
+# Região (índice em REGIOES) de cada código de localidade
+REGIAO_DO_CODIGO = np.array(
+    [INDICE_REGIAO[REGIAO_POR_UF[uf]] for uf in UFS] + list(range(len(REGIOES))) + [REGIAO_DESCONHECIDA],
+    dtype=np.intp
+)
+
+# Peso do valor por distância na média com o valor por quantidade (60% / 40%)
+PESO_VALOR_DISTANCIA = 0.6
+# Fração do valor unitário usada no ajuste fino por quantidade
+FRACAO_AJUSTE_FINO = 0.1
+# Quantidade base da última faixa (aberta): limite inferior × 1,5
+FATOR_BASE_FAIXA_ABERTA = 1.5
+
+# Chaves do arquivo e campo de valor unitário de cada tabela por quantidade
+TABELAS_QUANTIDADE = {
+    'modulos': ('valores_referencia_modulos', 'valor_por_modulo'),
+    'peso': ('valores_referencia_peso', 'valor_por_kg')
+}
+
+_PADRAO_FAIXA = re.compile(r'(\d+(?:\.\d+)?)(?:-(\d+(?:\.\d+)?)|(\+))')
+
+
+class FaixasCompiladas:
+    """Tabela por faixas: limites superiores e um array de valores por campo."""
+
+    def __init__(self, inicios, limites, valores):
+        """
+        Args:
+            inicios: Limite inferior de cada faixa
+            limites: Limite superior de cada faixa, exceto a última (aberta)
+            valores: Dicionário campo -> array com um valor por faixa
+        """
+        self.inicios = inicios
+        self.limites = limites
+        self.valores = valores
+
+    def indices(self, x):
+        """Retorna o índice da faixa de cada valor (limite superior exclusivo)."""
+        return np.searchsorted(self.limites, x, side='right')
+
+    def base(self):
+        """Quantidade representativa de cada faixa (ponto médio; a aberta usa o início × 1,5)."""
+        bases = (self.inicios[:-1] + self.limites) / 2
+        return np.append(bases, self.inicios[-1] * FATOR_BASE_FAIXA_ABERTA)
+
+
+def _compilar_faixas(tabela, nome, campos=None):
+    """
+    Compila uma tabela com chaves no formato '100-500' / '1000+'.
+
+    Args:
+        tabela: Dicionário faixa -> valor (ou faixa -> dicionário de campos)
+        nome: Nome da tabela, usado nas mensagens de erro
+        campos: Campos exigidos em cada faixa; None para tabelas de valor único
+
+    Returns:
+        FaixasCompiladas
+    """
+    if not isinstance(tabela, dict) or not tabela:
+        raise ValueError(f"Tabela '{nome}' deve ser um dicionário não vazio")
+
+    faixas = []
+    for chave, valor in tabela.items():
+        match = _PADRAO_FAIXA.fullmatch(str(chave).strip())
+        if not match:
+            raise ValueError(f"Faixa inválida em '{nome}': {chave!r} (use '10-50' ou '1000+')")
+        inicio = float(match.group(1))
+        fim = np.inf if match.group(3) else float(match.group(2))
+        if fim <= inicio:
+            raise ValueError(f"Faixa vazia em '{nome}': {chave!r}")
+        faixas.append((inicio, fim, chave, valor))
+    faixas.sort(key=lambda faixa: faixa[0])
+
+    if faixas[0][0] != 0:
+        raise ValueError(f"Primeira faixa de '{nome}' deve começar em 0")
+    if not np.isinf(faixas[-1][1]):
+        raise ValueError(f"Última faixa de '{nome}' deve ser aberta (por exemplo '1000+')")
+    for anterior, seguinte in zip(faixas, faixas[1:]):
+        if anterior[1] != seguinte[0]:
+            raise ValueError(f"Faixas de '{nome}' não são contíguas: {anterior[2]!r} e {seguinte[2]!r}")
+
+    colunas = campos if campos is not None else [None]
+    valores = {}
+    for campo in colunas:
+        lista = []
+        for _, _, chave, valor in faixas:
+            item = valor if campo is None else (valor.get(campo) if isinstance(valor, dict) else None)
+            if isinstance(item, bool) or not isinstance(item, (int, float)) or not np.isfinite(item) or item < 0:
+                rotulo = chave if campo is None else f"{chave}.{campo}"
+                raise ValueError(f"Valor inválido em '{nome}' ({rotulo}): {item!r}")
+            lista.append(float(item))
+        valores[campo] = np.array(lista)
+
+    inicios = np.array([faixa[0] for faixa in faixas])
+    limites = np.array([faixa[1] for faixa in faixas[:-1]])
+    return FaixasCompiladas(inicios, limites, valores)
+
+
+def _compilar_pares(multiplicadores, indices, nome):
+    """Valida os multiplicadores 'Origem->Destino' e retorna a lista (i, j, valor)."""
+    if not isinstance(multiplicadores, dict):
+        raise ValueError(f"Tabela '{nome}' deve ser um dicionário")
+    pares = []
+    for chave, valor in multiplicadores.items():
+        origem, separador, destino = chave.partition('->')
+        if not separador or origem not in indices or destino not in indices:
+            raise ValueError(f"Combinação inválida em '{nome}': {chave!r}")
+        if isinstance(valor, bool) or not isinstance(valor, (int, float)) or not valor > 0:
+            raise ValueError(f"Multiplicador inválido em '{nome}' ({chave}): {valor!r}")
+        pares.append((indices[origem], indices[destino], float(valor)))
+    return pares
+
+
+def _preencher_pares(matriz, pares):
+    """
+    Grava os pares na matriz; cada combinação sem valor próprio recebe o
+    multiplicador da combinação inversa.
+    """
+    definidos = np.zeros(matriz.shape, dtype=bool)
+    for i, j, valor in pares:
+        matriz[i, j] = valor
+        definidos[i, j] = True
+    for i, j, valor in pares:
+        if not definidos[j, i]:
+            matriz[j, i] = valor
+
+
+def _compilar_matriz_localidades(multiplicadores_regionais, multiplicadores_uf):
+    """
+    Compila a matriz de multiplicadores por código de localidade.
+
+    A matriz região × região (combinações ausentes valem 1.0) preenche todos
+    os pares de localidades; os pares de UFs definidos na política
+    sobrescrevem o valor da sua combinação de regiões.
+    """
+    regional = np.ones((len(REGIOES) + 1, len(REGIOES) + 1))
+    _preencher_pares(regional, _compilar_pares(multiplicadores_regionais, INDICE_REGIAO, 'multiplicadores_regionais'))
+
+    matriz = regional[np.ix_(REGIAO_DO_CODIGO, REGIAO_DO_CODIGO)]
+    _preencher_pares(matriz, _compilar_pares(multiplicadores_uf, INDICE_UF, 'multiplicadores_uf'))
+    return matriz
+
+
+def _validar_fator(valor, nome, maximo=None):
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)) or not np.isfinite(valor) or valor < 0:
+        raise ValueError(f"Valor inválido para '{nome}': {valor!r}")
+    if maximo is not None and valor > maximo:
+        raise ValueError(f"Valor de '{nome}' deve ser no máximo {maximo}: {valor!r}")
+    return float(valor)
+
+
+class PoliticaPrecos:
+    """Tabelas de precificação compiladas em arrays para consulta vetorizada."""
+
+    def __init__(self, tabelas, versao='padrao'):
+        """
+        Compila e valida as tabelas.
+
+        Args:
+            tabelas: Dicionário com as chaves margem_adicional, valor_medio_frete_curto,
+                valores_referencia_distancia, valores_referencia_modulos,
+                valores_referencia_peso, multiplicadores_regionais,
+                multiplicadores_uf e multiplicadores_distancia_sudeste
+            versao: Identificação da política (exibida nos logs de recarga)
+        """
+        self.versao = str(versao)
+        self.margem_adicional = _validar_fator(tabelas['margem_adicional'], 'margem_adicional', maximo=1)
+        self.valor_medio_frete_curto = _validar_fator(tabelas['valor_medio_frete_curto'], 'valor_medio_frete_curto')
+        self.distancia = _compilar_faixas(
+            tabelas['valores_referencia_distancia'], 'valores_referencia_distancia', ['valor_medio', 'valor_por_km']
+        )
+        self.quantidade = {}
+        self.base_quantidade = {}
+        for modo, (chave, campo_unitario) in TABELAS_QUANTIDADE.items():
+            self.quantidade[modo] = _compilar_faixas(tabelas[chave], chave, ['valor_medio', campo_unitario])
+            self.quantidade[modo].valores['valor_unitario'] = self.quantidade[modo].valores.pop(campo_unitario)
+            self.base_quantidade[modo] = self.quantidade[modo].base()
+        self.sudeste = _compilar_faixas(tabelas['multiplicadores_distancia_sudeste'], 'multiplicadores_distancia_sudeste')
+        self.matriz_localidades = _compilar_matriz_localidades(
+            tabelas['multiplicadores_regionais'], tabelas['multiplicadores_uf']
+        )
+
+    @classmethod
+    def carregar(cls, caminho, padrao):
+        """
+        Carrega a política de um arquivo JSON.
+
+        Chaves ausentes no arquivo usam as tabelas de `padrao`.
+        """
+        with open(caminho, encoding='utf-8') as arquivo:
+            conteudo = json.load(arquivo)
+        if not isinstance(conteudo, dict):
+            raise ValueError(f"Política de preços deve ser um objeto JSON: {caminho}")
+        desconhecidas = set(conteudo) - set(padrao) - {'versao'}
+        if desconhecidas:
+            raise ValueError(f"Chaves desconhecidas na política de preços: {', '.join(sorted(desconhecidas))}")
+        return cls({**padrao, **conteudo}, conteudo.get('versao', os.path.basename(caminho)))
+
+    def valor_referencia(self, distancia, quantidade=None, modo_calculo="modulos"):
+        """
+        Valor de referência por distância e quantidade (escalares ou arrays).
+
+        Com quantidade, é a média ponderada (60% distância, 40% quantidade)
+        mais um ajuste fino de 10% do valor unitário pela diferença até a
+        quantidade base da faixa; sem quantidade (None/NaN), só a distância.
+        """
+        valor_distancia = self.distancia.valores['valor_medio'][self.distancia.indices(distancia)]
+        faixas = self.quantidade.get(modo_calculo)
+        if faixas is None or quantidade is None:
+            return valor_distancia
+
+        quantidade = np.asarray(quantidade, dtype=np.float64)
+        informada = np.isfinite(quantidade)
+        indices = faixas.indices(np.where(informada, quantidade, 0))
+        valor = (
+            valor_distancia * PESO_VALOR_DISTANCIA +
+            faixas.valores['valor_medio'][indices] * (1 - PESO_VALOR_DISTANCIA) +
+            (quantidade - self.base_quantidade[modo_calculo][indices]) * faixas.valores['valor_unitario'][indices] * FRACAO_AJUSTE_FINO
+        )
+        return np.where(informada, valor, valor_distancia)
+
+    def multiplicador_regional(self, codigo_origem, codigo_destino):
+        """Multiplicador entre localidades (códigos escalares ou arrays de codigo_localidade)."""
+        return self.matriz_localidades[codigo_origem, codigo_destino]
+
+    def multiplicador_distancia_sudeste(self, distancia):
+        """Multiplicador por faixa de distância das rotas Sudeste->Sudeste."""
+        return self.sudeste.valores[None][self.sudeste.indices(distancia)]
+
+    def multiplicador(self, codigo_origem, codigo_destino, distancia):
+        """
+        Multiplicador aplicado ao valor da rota: por distância dentro do
+        Sudeste e da matriz de localidades nas demais combinações.
+        """
+        sudeste = INDICE_REGIAO['Sudeste']
+        return np.where(
+            (REGIAO_DO_CODIGO[codigo_origem] == sudeste) & (REGIAO_DO_CODIGO[codigo_destino] == sudeste),
+            self.multiplicador_distancia_sudeste(distancia),
+            self.matriz_localidades[codigo_origem, codigo_destino]
+        )
+
+
+def carregar_tabelas(caminho=ARQUIVO_POLITICA):
+    """
+    Lê as tabelas de um arquivo da política, sem compilá-las.
+
+    Returns:
+        Dicionário chave -> tabela, sem a chave 'versao'
+    """
+    with open(caminho, encoding='utf-8') as arquivo:
+        conteudo = json.load(arquivo)
+    if not isinstance(conteudo, dict):
+        raise ValueError(f"Política de preços deve ser um objeto JSON: {caminho}")
+    return {chave: tabela for chave, tabela in conteudo.items() if chave != 'versao'}
+
+
+def codigo_localidade(uf, regiao=None):
+    """
+    Código da localidade na matriz de multiplicadores.
+
+    Args:
+        uf: Sigla da UF (ou None)
+        regiao: Região, usada quando a UF não foi identificada
+
+    Returns:
+        Código inteiro entre 0 e NUM_CODIGOS - 1
+    """
+    if uf in INDICE_UF:
+        return INDICE_UF[uf]
+    if regiao in INDICE_REGIAO:
+        return CODIGO_PRIMEIRA_REGIAO + INDICE_REGIAO[regiao]
+    return CODIGO_DESCONHECIDO
+
+
+class FontePolitica:
+    """Mantém a política de preços atualizada com o arquivo, recarregando-o quando alterado."""
+
+    def __init__(self, caminho, padrao, intervalo=INTERVALO_VERIFICACAO_S):
+        """
+        Args:
+            caminho: Arquivo JSON da política (se não existir, usa `padrao`)
+            padrao: Tabelas padrão, usadas para chaves ausentes no arquivo
+            intervalo: Intervalo mínimo (s) entre verificações do arquivo
+        """
+        self.caminho = caminho
+        self.padrao = padrao
+        self.intervalo = intervalo
+        self._assinatura = self._assinatura_arquivo()
+        # Na inicialização, uma política inválida é um erro de configuração
+        if self._assinatura is not None:
+            self.politica = PoliticaPrecos.carregar(caminho, padrao)
+        else:
+            self.politica = PoliticaPrecos(padrao)
+        self._ultima_verificacao = time.monotonic()
+
+    def _assinatura_arquivo(self):
+        try:
+            estado = os.stat(self.caminho)
+        except (OSError, TypeError):
+            return None
+        return estado.st_mtime_ns, estado.st_size
+
+    def atual(self):
+        """Retorna a política vigente, recarregando o arquivo se ele mudou."""
+        agora = time.monotonic()
+        if agora - self._ultima_verificacao >= self.intervalo:
+            self._ultima_verificacao = agora
+            assinatura = self._assinatura_arquivo()
+            if assinatura is not None and assinatura != self._assinatura:
+                self._assinatura = assinatura
+                try:
+                    self.politica = PoliticaPrecos.carregar(self.caminho, self.padrao)
+                    logger.info("Política de preços recarregada: versão %s", self.politica.versao)
+                except (OSError, ValueError) as e:
+                    logger.error("Política de preços inválida em %s, mantendo a versão %s: %s", self.caminho, self.politica.versao, e)
+        return self.politica
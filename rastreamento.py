@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Rastreamento de Cotações
+------------------------
+Registro opcional de como cada cotação foi precificada: ramo do cálculo
+(valor absoluto, frete curto, valores de referência ou histórico), fretes
+históricos usados, multiplicadores e valores intermediários.
+
+Os rastros ficam em um buffer circular de tamanho fixo, alocado na criação,
+e podem ser consultados pelo identificador da cotação. Com o rastreamento
+desligado a calculadora não cria rastros e o custo se limita a testes
+`rastro is not None`.
+
+O buffer é local ao processo: com vários workers, o rastro fica no worker
+que atendeu a cotação.
+"""
+
+import threading
+import time
+import uuid
+
+import numpy as np
+
+CAPACIDADE_PADRAO = 1024
+
+
+def _valor_simples(valor):
+    """Converte arrays e escalares NumPy em tipos nativos (serializáveis em JSON)."""
+    if isinstance(valor, np.ndarray):
+        return valor.tolist()
+    if isinstance(valor, np.generic):
+        return valor.item()
+    if isinstance(valor, tuple) and hasattr(valor, '_asdict'):
+        return {chave: _valor_simples(v) for chave, v in valor._asdict().items()}
+    return valor
+
+
+class Rastro:
+    """Etapas registradas durante o cálculo de uma cotação."""
+
+    __slots__ = ('id_cotacao', 'entradas', 'inicio', 'duracao_ms', 'etapas')
+
+    def __init__(self, id_cotacao, entradas):
+        self.id_cotacao = id_cotacao
+        self.entradas = entradas
+        self.inicio = time.time()
+        self.duracao_ms = None
+        self.etapas = []
+
+    def registrar(self, etapa, **dados):
+        """Acrescenta uma etapa com os dados informados."""
+        self.etapas.append((etapa, dados))
+
+    def concluir(self, resultado):
+        """Registra o resultado final e a duração do cálculo."""
+        self.duracao_ms = (time.time() - self.inicio) * 1000
+        self.registrar('resultado', status=resultado.status, mensagem=resultado.mensagem,
+                       valor_estimado=resultado.valor_estimado)
+
+    def to_dict(self):
+        """Converte o rastro em dicionário com tipos nativos."""
+        return {
+            'id_cotacao': self.id_cotacao,
+            'inicio': self.inicio,
+            'duracao_ms': self.duracao_ms,
+            'entradas': {chave: _valor_simples(valor) for chave, valor in self.entradas.items()},
+            'etapas': [
+                {'etapa': etapa, **{chave: _valor_simples(valor) for chave, valor in dados.items()}}
+                for etapa, dados in self.etapas
+            ]
+        }
+
+
+class RegistroRastros:
+    """Buffer circular com os rastros das cotações mais recentes."""
+
+    def __init__(self, capacidade=CAPACIDADE_PADRAO):
+        """
+        Args:
+            capacidade: Número máximo de rastros mantidos (os mais antigos são descartados)
+        """
+        if capacidade < 1:
+            raise ValueError(f"Capacidade do registro de rastros inválida: {capacidade}")
+        self.capacidade = capacidade
+        self._posicoes = [None] * capacidade
+        self._proxima = 0
+        self._indice = {}
+        self._lock = threading.Lock()
+
+    def novo(self, **entradas):
+        """Cria o rastro de uma nova cotação, descartando o mais antigo se o buffer estiver cheio."""
+        rastro = Rastro(uuid.uuid4().hex, entradas)
+        with self._lock:
+            antigo = self._posicoes[self._proxima]
+            if antigo is not None:
+                del self._indice[antigo.id_cotacao]
+            self._posicoes[self._proxima] = rastro
+            self._indice[rastro.id_cotacao] = rastro
+            self._proxima = (self._proxima + 1) % self.capacidade
+        return rastro
+
+    def obter(self, id_cotacao):
+        """Retorna o rastro da cotação (ou None se não existir ou já tiver sido descartado)."""
+        with self._lock:
+            return self._indice.get(id_cotacao)
+
+    def recentes(self, limite=50):
+        """Retorna os rastros mais recentes, do mais novo para o mais antigo."""
+        with self._lock:
+            ordem = self._posicoes[self._proxima:] + self._posicoes[:self._proxima]
+        return [rastro for rastro in reversed(ordem) if rastro is not None][:limite]
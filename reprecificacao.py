@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Reprecificação em Lote
+----------------------
+Reprecifica um arquivo CSV ou Parquet de cotações usando vários processos.
+Cada worker carrega a calculadora uma única vez (mapeando o histórico
+compartilhado em memória), a entrada é lida em lotes e a saída é gravada na
+mesma ordem da entrada, com o progresso e a vazão informados no stderr.
+
+Uso:
+    python calculadora_frete.py reprice entrada.csv saida.csv --workers 8
+
+Colunas da entrada: origem, destino, modulos, peso, modo (modulos/peso).
+Apenas origem e destino são obrigatórias.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from calculadora_frete import ESTRATEGIAS_AGREGACAO, CalculadoraFrete
+from configuracao_logs import configurar_logging
+from resultado_cotacao import CAMPOS_PERCENTIS, LoteResultados, ResultadoCotacao
+
+TAMANHO_LOTE_PADRAO = 500
+
+# Lotes em processamento por worker (limita a memória usada pela leitura antecipada)
+LOTES_POR_WORKER = 2
+
+COLUNAS_RESULTADO = ['status', 'mensagem', 'valor_estimado', 'valor_por_km', 'distancia_km', 'fretes_base']
+
+# Calculadora do processo worker, criada pelo inicializador
+_calculadora = None
+
+
+def _inicializar_worker(arquivo_excel, usar_url, arquivo_historico, estrategia_busca, distancia_exata,
+                        estrategia_agregacao="media", intervalos=False):
+    """Cria a calculadora uma única vez por processo worker."""
+    global _calculadora
+    _calculadora = CalculadoraFrete(arquivo_excel, usar_url, arquivo_historico, estrategia_busca, distancia_exata,
+                                    estrategia_agregacao=estrategia_agregacao, intervalos=intervalos)
+
+
+def _valor_opcional(valor, tipo):
+    """Converte um valor da entrada, tratando vazios como None."""
+    if valor is None or pd.isna(valor) or valor == '':
+        return None
+    return tipo(valor)
+
+
+def _requisicao(cotacao):
+    """Converte uma linha da entrada nos argumentos de calcular_frete."""
+    modo = cotacao.get('modo')
+    return {
+        'origem': str(cotacao['origem']),
+        'destino': str(cotacao['destino']),
+        'num_modulos': _valor_opcional(cotacao.get('modulos'), int),
+        'peso_kg': _valor_opcional(cotacao.get('peso'), float),
+        'modo_calculo': 'modulos' if modo is None or pd.isna(modo) else modo
+    }
+
+
+def _erro(e):
+    """Resultado de erro de uma cotação."""
+    return ResultadoCotacao(mensagem=f"Erro ao calcular frete: {e}")
+
+
+def _precificar_lote(lote):
+    """
+    Precifica um lote de cotações e retorna as colunas de resultado na mesma ordem.
+
+    Uma linha inválida ou que falhe no cálculo recebe um resultado de erro
+    sem afetar as demais: se o cálculo em lote falhar, as cotações ainda sem
+    resultado são calculadas uma a uma.
+    """
+    resultados = [None] * len(lote)
+    requisicoes = []
+    for posicao, cotacao in enumerate(lote.to_dict('records')):
+        try:
+            requisicoes.append((posicao, _requisicao(cotacao)))
+        except Exception as e:
+            resultados[posicao] = _erro(e)
+
+    try:
+        stream = _calculadora.calcular_fretes_stream(requisicao for _, requisicao in requisicoes)
+        for (posicao, _), resultado in zip(requisicoes, stream):
+            resultados[posicao] = resultado
+    except Exception:
+        for posicao, requisicao in requisicoes:
+            if resultados[posicao] is None:
+                try:
+                    resultados[posicao] = _calculadora.calcular_frete(**requisicao)
+                except Exception as e:
+                    resultados[posicao] = _erro(e)
+
+    colunas = COLUNAS_RESULTADO + list(CAMPOS_PERCENTIS) if _calculadora.intervalos else COLUNAS_RESULTADO
+    return LoteResultados.de_resultados(resultados).para_dataframe(colunas, index=lote.index)
+
+
+def ler_cotacoes(caminho, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """Lê o arquivo de cotações (CSV ou Parquet) em lotes de DataFrames."""
+    if caminho.lower().endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            # Sem pyarrow, lê o arquivo inteiro e divide em lotes
+            df = pd.read_parquet(caminho)
+            for inicio in range(0, len(df), tamanho_lote):
+                yield df.iloc[inicio:inicio + tamanho_lote]
+            return
+        arquivo = pq.ParquetFile(caminho)
+        for batch in arquivo.iter_batches(batch_size=tamanho_lote):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(caminho, chunksize=tamanho_lote, dtype={'origem': str, 'destino': str})
+
+
+class _GravadorSaida:
+    """Grava os lotes de saída em CSV ou Parquet conforme a extensão do arquivo."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.parquet = caminho.lower().endswith('.parquet')
+        self._escritor = None
+        self._primeiro = True
+
+    def gravar(self, lote):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            tabela = pa.Table.from_pandas(lote, preserve_index=False)
+            if self._escritor is None:
+                self._escritor = pq.ParquetWriter(self.caminho, tabela.schema)
+            self._escritor.write_table(tabela)
+        else:
+            lote.to_csv(self.caminho, mode='w' if self._primeiro else 'a', header=self._primeiro, index=False)
+        self._primeiro = False
+
+    def fechar(self):
+        if self._escritor is not None:
+            self._escritor.close()
+
+
+def reprecificar(entrada, saida, workers=None, tamanho_lote=TAMANHO_LOTE_PADRAO, arquivo_excel=None,
+                 usar_url=True, arquivo_historico=None, estrategia_busca="filtros", distancia_exata=False,
+                 estrategia_agregacao="media", intervalos=False):
+    """
+    Reprecifica todas as cotações do arquivo de entrada.
+
+    Com `intervalos`, a saída inclui as colunas valor_p10, valor_p50 e valor_p90.
+
+    Returns:
+        Número de cotações processadas
+    """
+    workers = workers or os.cpu_count() or 1
+    if arquivo_historico is None:
+        arquivo_historico = os.path.join(tempfile.gettempdir(), 'calculadora_frete_historico.bin')
+
+    # Garante o histórico mapeado antes de criar os workers, que apenas o mapeiam
+    CalculadoraFrete(arquivo_excel, usar_url, arquivo_historico, estrategia_busca, distancia_exata,
+                     estrategia_agregacao=estrategia_agregacao, intervalos=intervalos)
+
+    gravador = _GravadorSaida(saida)
+    processadas = 0
+    inicio = time.monotonic()
+    pendentes = deque()
+
+    def concluir_proximo():
+        nonlocal processadas
+        lote, futuro = pendentes.popleft()
+        gravador.gravar(pd.concat([lote, futuro.result()], axis=1))
+        processadas += len(lote)
+        decorrido = time.monotonic() - inicio
+        vazao = processadas / decorrido if decorrido > 0 else 0
+        print(f"{processadas} cotações processadas ({vazao:.1f} cotações/s)", file=sys.stderr)
+
+    argumentos = (arquivo_excel, usar_url, arquivo_historico, estrategia_busca, distancia_exata, estrategia_agregacao,
+                  intervalos)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_worker, initargs=argumentos) as executor:
+            for lote in ler_cotacoes(entrada, tamanho_lote):
+                lote = lote.reset_index(drop=True)
+                pendentes.append((lote, executor.submit(_precificar_lote, lote)))
+                # Os lotes são concluídos na ordem de leitura, preservando a ordem da saída
+                while len(pendentes) >= workers * LOTES_POR_WORKER:
+                    concluir_proximo()
+            while pendentes:
+                concluir_proximo()
+    finally:
+        gravador.fechar()
+
+    return processadas
+
+
+def main(argv=None):
+    """Ponto de entrada do subcomando `reprice`."""
+    parser = argparse.ArgumentParser(prog='calculadora_frete.py reprice', description='Reprecificação de cotações em lote')
+    parser.add_argument('entrada', help='Arquivo CSV ou Parquet com as cotações')
+    parser.add_argument('saida', help='Arquivo CSV ou Parquet de saída')
+    parser.add_argument('--workers', type=int, help='Número de processos (padrão: número de CPUs)')
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE_PADRAO, help='Cotações por lote')
+    parser.add_argument('--excel', help='Caminho para o arquivo Excel')
+    parser.add_argument('--usar-url', action='store_true', help='Usar URL do GitHub para carregar dados')
+    parser.add_argument('--historico', help='Arquivo do histórico mapeado em memória (criado se não existir)')
+    parser.add_argument('--busca', choices=['filtros', 'knn'], default='filtros', help='Estratégia de busca de fretes similares')
+    parser.add_argument('--distancia-exata', action='store_true', help='Calcular a distância pela geodésica exata')
+    parser.add_argument('--agregacao', choices=ESTRATEGIAS_AGREGACAO, default='media', help='Estratégia de agregação dos fretes similares')
+    parser.add_argument('--intervalos', action='store_true', help='Incluir os percentis P10/P50/P90 do valor (bootstrap)')
+
+    args = parser.parse_args(argv)
+    configurar_logging(logging.WARNING)
+
+    inicio = time.monotonic()
+    total = reprecificar(
+        args.entrada, args.saida, args.workers, args.lote, args.excel, args.usar_url,
+        args.historico, args.busca, args.distancia_exata, args.agregacao, args.intervalos
+    )
+    decorrido = time.monotonic() - inicio
+    print(f"\nReprecificação concluída: {total} cotações em {decorrido:.1f} s -> {args.saida}")
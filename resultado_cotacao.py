@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Resultado de Cotação
+--------------------
+Registro compacto (com __slots__) devolvido por `calcular_frete` e sua
+versão colunar para lotes. O registro continua aceitando o acesso por chave
+(`resultado['valor_estimado']`, `resultado.get(...)`, `'fretes_base' in
+resultado`) usado pelas interfaces, e só é convertido em dicionário ou JSON
+quando necessário, com orjson quando disponível.
+"""
+
+import json
+from dataclasses import dataclass, fields
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+@dataclass(slots=True)
+class ResultadoCotacao:
+    """Resultado do cálculo de frete de uma cotação."""
+    origem: str = ''
+    destino: str = ''
+    modo_calculo: str = 'modulos'
+    status: str = 'erro'
+    mensagem: str = 'Erro ao calcular frete'
+    valor_estimado: float = 0
+    valor_por_km: float = 0
+    distancia_km: float = 0
+    valor_medio_original: float = 0
+    ajuste_quantidade: float = 0
+    ajuste_inflacao: float = 0
+    margem_aplicada: float = 0
+    multiplicador_regional: float = 1.0
+    fator_correcao_rota: float = 1.0
+    valor_absoluto: bool = False
+    # Número de fretes históricos usados (None quando a cotação não usou o histórico)
+    fretes_base: int = None
+    # Percentis do valor estimado pelo bootstrap dos fretes candidatos (None sem o modo de intervalos)
+    valor_p10: float = None
+    valor_p50: float = None
+    valor_p90: float = None
+    # Identificador do rastro da cotação (None com o rastreamento desligado)
+    id_cotacao: str = None
+
+    # Acesso por chave, compatível com o antigo dicionário de resultado
+
+    def __getitem__(self, chave):
+        if chave not in self:
+            raise KeyError(chave)
+        return getattr(self, chave)
+
+    def __contains__(self, chave):
+        if chave in CAMPOS_OPCIONAIS:
+            return getattr(self, chave) is not None
+        return chave in CAMPOS_RESULTADO
+
+    def get(self, chave, padrao=None):
+        return getattr(self, chave) if chave in self else padrao
+
+    def keys(self):
+        return [campo for campo in CAMPOS_RESULTADO if campo in self]
+
+    def to_dict(self):
+        """Converte o resultado em dicionário (sem os campos opcionais ausentes)."""
+        return {campo: getattr(self, campo) for campo in self.keys()}
+
+    def to_json(self):
+        """Serializa o resultado em JSON (bytes com orjson, str sem ele)."""
+        return _serializar_json(self.to_dict())
+
+
+CAMPOS_RESULTADO = tuple(campo.name for campo in fields(ResultadoCotacao))
+# Percentis do modo de intervalos (ver intervalos.PERCENTIS)
+CAMPOS_PERCENTIS = ('valor_p10', 'valor_p50', 'valor_p90')
+# Campos omitidos do dicionário quando None
+CAMPOS_OPCIONAIS = ('fretes_base',) + CAMPOS_PERCENTIS + ('id_cotacao',)
+# Campos opcionais numéricos, guardados como NaN na versão colunar quando None
+CAMPOS_NUMERICOS_OPCIONAIS = ('fretes_base',) + CAMPOS_PERCENTIS
+
+# Tipo de cada coluna na versão colunar
+_TIPOS_COLUNA = {
+    'valor_estimado': np.float64,
+    'valor_por_km': np.float64,
+    'distancia_km': np.float64,
+    'valor_medio_original': np.float64,
+    'ajuste_quantidade': np.float64,
+    'ajuste_inflacao': np.float64,
+    'margem_aplicada': np.float64,
+    'multiplicador_regional': np.float64,
+    'fator_correcao_rota': np.float64,
+    'valor_absoluto': np.bool_,
+    'fretes_base': np.float64,
+    'valor_p10': np.float64,
+    'valor_p50': np.float64,
+    'valor_p90': np.float64
+}
+
+
+def _serializar_json(valor):
+    if orjson is not None:
+        return orjson.dumps(valor, option=orjson.OPT_SERIALIZE_NUMPY, default=float)
+    return json.dumps(valor, ensure_ascii=False, default=float)
+
+
+class LoteResultados:
+    """Resultados de várias cotações em colunas (um array por campo)."""
+
+    def __init__(self, colunas):
+        """
+        Args:
+            colunas: Dicionário campo -> array com um valor por cotação
+        """
+        self.colunas = colunas
+
+    @classmethod
+    def de_resultados(cls, resultados):
+        """Monta o lote a partir de um iterável de ResultadoCotacao."""
+        resultados = list(resultados)
+        colunas = {}
+        for campo in CAMPOS_RESULTADO:
+            valores = [getattr(r, campo) for r in resultados]
+            tipo = _TIPOS_COLUNA.get(campo)
+            if campo in CAMPOS_NUMERICOS_OPCIONAIS:
+                valores = [np.nan if v is None else v for v in valores]
+            colunas[campo] = np.array(valores, dtype=tipo if tipo is not None else object)
+        return cls(colunas)
+
+    def __len__(self):
+        return len(self.colunas['status'])
+
+    def __getitem__(self, indice):
+        """Reconstrói o ResultadoCotacao da posição `indice`."""
+        valores = {campo: coluna[indice] for campo, coluna in self.colunas.items()}
+        for campo, tipo in _TIPOS_COLUNA.items():
+            if campo in CAMPOS_NUMERICOS_OPCIONAIS and np.isnan(valores[campo]):
+                valores[campo] = None
+            elif campo == 'fretes_base':
+                valores[campo] = int(valores[campo])
+            else:
+                valores[campo] = bool(valores[campo]) if tipo is np.bool_ else float(valores[campo])
+        return ResultadoCotacao(**valores)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def para_dataframe(self, campos=CAMPOS_RESULTADO, index=None):
+        """Retorna os campos pedidos como DataFrame, sem copiar as colunas numéricas."""
+        return pd.DataFrame({campo: self.colunas[campo] for campo in campos}, index=index, copy=False)
+
+    def _fretes_base(self):
+        """Coluna fretes_base como inteiros (None onde ausente); a coluna é float64 por causa do NaN."""
+        return [None if np.isnan(v) else int(v) for v in self.colunas['fretes_base']]
+
+    def to_dict(self):
+        """Converte o lote em dicionário de listas (formato colunar)."""
+        dados = {campo: coluna.tolist() for campo, coluna in self.colunas.items()}
+        dados['fretes_base'] = self._fretes_base()
+        for campo in CAMPOS_PERCENTIS:
+            dados[campo] = [None if np.isnan(v) else v for v in dados[campo]]
+        return dados
+
+    def to_json(self):
+        """Serializa o lote em JSON colunar (com os mesmos tipos com ou sem orjson)."""
+        if orjson is not None:
+            colunas = {**self.colunas, 'fretes_base': self._fretes_base()}
+            return orjson.dumps(colunas, option=orjson.OPT_SERIALIZE_NUMPY, default=list)
+        return _serializar_json(self.to_dict())
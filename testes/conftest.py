@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+"""Configuração dos testes: os módulos da calculadora ficam na raiz do repositório."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from agregacao import EXPOENTE_ESCALA, SIMILARIDADE_SEM_INFORMACAO, agregar, fatores_escala, pesos_similaridade
+
+
+def test_fatores_escala():
+    fatores = fatores_escala([100.0, 200.0, np.nan, 0.0], 200)
+    np.testing.assert_allclose(fatores, [2 ** EXPOENTE_ESCALA, 1.0, 1.0, 1.0])
+    np.testing.assert_array_equal(fatores_escala([100.0, 200.0], None), [1.0, 1.0])
+
+
+def test_pesos_similaridade():
+    pesos = pesos_similaridade([100.0, 200.0, np.nan], 200, [500.0, 500.0, 250.0], 500.0)
+    np.testing.assert_allclose(pesos, [0.5, 1.0, SIMILARIDADE_SEM_INFORMACAO * 0.5])
+
+
+def test_parcelas_somam_o_valor_normalizado():
+    agregacao = agregar([1000.0, 2000.0], [1.1, 1.0], [2.0, 1.0])
+
+    assert agregacao.quantidade == 2
+    assert agregacao.valor_medio == pytest.approx(1500.0)
+    assert agregacao.ajuste_inflacao == pytest.approx(50.0)
+    assert agregacao.valor_medio + agregacao.ajuste_inflacao + agregacao.ajuste_quantidade == pytest.approx(2100.0)
+
+
+def test_media_ponderada_ignora_pesos_nulos():
+    agregacao = agregar([1000.0, 2000.0, 9000.0], np.ones(3), np.ones(3), pesos=[1.0, 3.0, 0.0])
+
+    assert agregacao.quantidade == 2
+    assert agregacao.valor_medio == pytest.approx(1750.0)
+
+
+def test_media_aparada_descarta_as_pontas():
+    valores = [100.0] + [1000.0] * 8 + [50000.0]
+    agregacao = agregar(valores, np.ones(10), np.ones(10), fracao_aparada=0.1)
+
+    assert agregacao.quantidade == 8
+    assert agregacao.valor_medio == pytest.approx(1000.0)
+
+
+def test_sem_fretes():
+    assert agregar([np.nan], [1.0], [1.0]) is None
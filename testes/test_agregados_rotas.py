@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from agregados_rotas import AgregadosRotas, FaixaQuantidade
+from calculadora_frete import CalculadoraFrete
+from historico import HistoricoFretes, chave_cidade
+from inflacao import IndiceInflacao
+
+ARQUIVO_EXCEL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'Banco de Dados - Logistica.xlsx')
+
+
+FRETES = pd.DataFrame({
+    '(R$) Frete': [1000.0, 3000.0, 5000.0, 2000.0, 7000.0, 9000.0, 4000.0],
+    'Núm. Módulos': [60, 80, 70, 90, 60, 400, 50],
+    'Cidade/Estado': ['Campinas/SP', 'Campinas/SP', 'Santos/SP', 'Campinas/SP', 'Campinas/SP', 'Campinas/SP',
+                      'Campinas/SP'],
+    'Destino': ['Valinhos/SP', 'Valinhos/SP', 'Valinhos/SP', 'Valinhos/SP', 'Montes Claros/MG', 'Valinhos/SP',
+                'Valinhos/SP'],
+    'Data de Orçamento': ['2024-01-10', '2024-03-10', None, '2024-02-10', None, None, None]
+})
+
+
+@pytest.fixture(scope='module')
+def agregados():
+    return AgregadosRotas.construir(HistoricoFretes.de_dataframe(FRETES), IndiceInflacao.carregar(0.045))
+
+
+def test_resume_os_fretes_da_rota_dentro_da_faixa(agregados):
+    resumo = agregados.resumir(FaixaQuantidade('Núm. Módulos', 50, 90), 'campinas/sp', 'valinhos')
+
+    assert resumo.quantidade == 4
+    np.testing.assert_array_equal(np.sort(resumo.posicoes), [0, 1, 3, 6])
+    assert resumo.valor_medio == pytest.approx(2500.0)
+    assert resumo.modulos_medio == pytest.approx(70.0)
+
+
+def test_limites_da_faixa_sao_inclusivos(agregados):
+    resumo = agregados.resumir(FaixaQuantidade('Núm. Módulos', 60, 80), 'campinas/sp', 'valinhos')
+
+    np.testing.assert_array_equal(np.sort(resumo.posicoes), [0, 1])
+
+
+def test_rota_ou_faixa_sem_fretes(agregados):
+    assert agregados.resumir(FaixaQuantidade('Núm. Módulos', 100, 300), 'campinas/sp', 'valinhos') is None
+    assert agregados.resumir(FaixaQuantidade('Núm. Módulos', 50, 90), 'jundiai/sp', 'valinhos') is None
+    assert agregados.resumir(FaixaQuantidade('Peso real (kg)', 1, 50000), 'campinas/sp', 'valinhos') is None
+
+
+def test_estatisticas_da_faixa(agregados):
+    estatisticas = agregados.estatisticas(FaixaQuantidade('Núm. Módulos', 50, 90), 'campinas/sp', 'valinhos')
+
+    assert estatisticas.quantidade == 4
+    assert estatisticas.valor_medio == pytest.approx(2500.0)
+    assert estatisticas.desvio_padrao == pytest.approx(np.std([1000.0, 3000.0, 2000.0, 4000.0], ddof=1))
+    assert (estatisticas.valor_minimo, estatisticas.valor_maximo) == (1000.0, 4000.0)
+    assert estatisticas.data_media == np.datetime64('2024-02-09')
+    assert (estatisticas.data_minima, estatisticas.data_maxima) == (np.datetime64('2024-01-10'),
+                                                                    np.datetime64('2024-03-10'))
+
+
+def test_adicionar_equivale_a_agregar_tudo_de_uma_vez(agregados):
+    historico = HistoricoFretes.de_dataframe(FRETES)
+    inflacao = IndiceInflacao.carregar(0.045)
+    incrementais = AgregadosRotas.construir(historico.filtrar(np.arange(len(historico)) < 4), inflacao)
+
+    novas = np.arange(4, len(historico))
+    chaves = np.array([chave_cidade(c) for c in historico.vocabularios['Cidade/Estado']] + [None], dtype=object)
+    incrementais.adicionar(
+        chaves[historico.codigos['Cidade/Estado'][novas]], historico.destinos_referencia()[novas],
+        historico.numericas['(R$) Frete'][novas], historico.numericas['Núm. Módulos'][novas],
+        historico.numericas['Peso real (kg)'][novas], historico.datas_referencia()[novas], novas
+    )
+
+    assert incrementais.rotas.keys() == agregados.rotas.keys()
+    for chave, rota in agregados.rotas.items():
+        np.testing.assert_array_equal(incrementais.rotas[chave].quantidades, rota.quantidades)
+        np.testing.assert_array_equal(incrementais.rotas[chave].posicoes, rota.posicoes)
+        np.testing.assert_allclose(incrementais.rotas[chave].acumulados, rota.acumulados)
+    # O frete de 50 módulos entrou no início da rota: a faixa passa a incluí-lo
+    resumo = incrementais.resumir(FaixaQuantidade('Núm. Módulos', 50, 90), 'campinas/sp', 'valinhos')
+    assert resumo.quantidade == 4 and resumo.valor_medio == pytest.approx(2500.0)
+
+
+@pytest.fixture(scope='module')
+def calculadora():
+    return CalculadoraFrete(ARQUIVO_EXCEL, usar_url=False)
+
+
+@pytest.mark.parametrize('num_modulos', [30, 100, 200, 450])
+def test_agregados_equivalem_a_faixa_da_busca_em_cascata(calculadora, num_modulos):
+    endereco_origem = calculadora._endereco('Paracatu/MG')
+    faixa = calculadora._faixa_quantidade(num_modulos)
+    resumo = calculadora.agregados_rotas.resumir(faixa, endereco_origem.chave, calculadora._endereco('Montes Claros/MG').destino)
+
+    esperadas = np.flatnonzero(calculadora._mascara_origem(endereco_origem)
+                               & (calculadora.historico.destinos_referencia() == 'montes claros')
+                               & calculadora._mascara_quantidade(num_modulos))
+    if len(esperadas) == 0:
+        assert resumo is None
+    else:
+        np.testing.assert_array_equal(np.sort(resumo.posicoes), esperadas)
+
+
+def test_intervalo_usa_os_fretes_que_formaram_a_cotacao(calculadora):
+    # Rota conhecida: o valor sai dos agregados e o intervalo, das mesmas linhas
+    resumo = calculadora._obter_resumo_fretes('Paracatu/MG', 'Montes Claros/MG', 200, distancia=466.0)
+
+    assert len(resumo.posicoes) == resumo.quantidade
+    assert np.isclose(calculadora.historico.numericas['(R$) Frete'][resumo.posicoes].mean(), resumo.valor_medio)
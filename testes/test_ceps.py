@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+import pandas as pd
+import pytest
+
+from ceps import FaixasCep, IndiceCep, LocalizacaoCep, extrair_cep
+from historico import HistoricoFretes
+
+
+@pytest.mark.parametrize('texto, cep', [
+    ('04538-133, São Paulo, SP', 4538133),
+    ('04538133', 4538133),
+    ('CEP 12.285-465 - Jundiaí', 12285465),
+    ('Campinas, SP', None),
+    # Número longo não é CEP
+    ('Pedido 123456789', None),
+    (None, None),
+])
+def test_extrai_cep_do_texto(texto, cep):
+    assert extrair_cep(texto) == cep
+
+
+def test_localiza_do_nivel_mais_especifico_ao_mais_geral():
+    indice = IndiceCep.construir()
+
+    valinhos = indice.localizar(13270100)
+    assert (valinhos.cidade, valinhos.uf) == ('Valinhos', 'SP')
+    assert valinhos.centroide is not None
+
+    # Fora das faixas de cidades: só a UF, sem posição
+    assert indice.localizar(36010000) == LocalizacaoCep(None, 'MG', None)
+    assert indice.localizar(99) is None
+
+
+def test_faixas_invertidas_ou_sobrepostas():
+    localizacao = LocalizacaoCep(None, 'SP', None)
+    with pytest.raises(ValueError):
+        FaixasCep.construir([(200, 100, localizacao)])
+    with pytest.raises(ValueError):
+        FaixasCep.construir([(100, 200, localizacao), (200, 300, localizacao)])
+
+
+def test_prefixos_do_historico():
+    historico = HistoricoFretes.de_dataframe(pd.DataFrame({
+        '(R$) Frete': [1000.0] * 5,
+        'CEP origem': ['38600-000', '38600-100', '13270-000', '36010-000', '36010-500'],
+        'Cidade/Estado': ['Paracatu/MG', 'Paracatu/MG', 'Campinas/MG', 'Juiz de Fora/MG', 'Juiz de Fora/MG']
+    }))
+    indice = IndiceCep.construir(historico)
+
+    # Prefixo aprendido do histórico vale para todo o bloco de 5 dígitos
+    assert indice.localizar(38600500).cidade == 'Paracatu'
+    assert indice.localizar(36010999).cidade == 'Juiz de Fora'
+    # CEP de SP informado com cidade de MG é descartado: vale a faixa fixa
+    assert indice.localizar(13270500).cidade == 'Valinhos'
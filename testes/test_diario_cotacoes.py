@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+import sqlite3
+
+from diario_cotacoes import DiarioCotacoes
+from resultado_cotacao import ResultadoCotacao
+
+
+def _cotacao(origem, destino, distancia_km, status='sucesso'):
+    return ResultadoCotacao(origem=origem, destino=destino, status=status, valor_estimado=1000.0,
+                            distancia_km=distancia_km)
+
+
+def test_aquece_apenas_distancias_exatas(tmp_path):
+    diario = DiarioCotacoes(str(tmp_path / 'diario.db'), intervalo_s=0.01)
+    diario.registrar(_cotacao('Campinas, SP', 'Santos, SP', 150.0))
+    diario.registrar(_cotacao('Chapecó, SC', 'Palmas, TO', 1900.0), distancia_aproximada=True)
+    diario.registrar(_cotacao('Natal, RN', 'Recife, PE', 0.0))
+    diario.registrar(_cotacao('Manaus, AM', 'Belém, PA', 1300.0, status='erro'))
+    diario.fechar()
+
+    assert diario.distancias_recentes(10) == {('Campinas, SP', 'Santos, SP'): 150.0}
+
+
+def test_migra_diario_sem_origem_da_distancia(tmp_path):
+    caminho = str(tmp_path / 'diario.db')
+    conexao = sqlite3.connect(caminho)
+    conexao.execute("CREATE TABLE cotacoes (id INTEGER PRIMARY KEY, momento REAL NOT NULL, origem TEXT, destino TEXT, "
+                    "chave_origem TEXT, chave_destino TEXT, cliente TEXT, modo_calculo TEXT, num_modulos REAL, "
+                    "peso_kg REAL, status TEXT, valor_estimado REAL, distancia_km REAL, id_cotacao TEXT)")
+    conexao.execute("INSERT INTO cotacoes (momento, origem, destino, status, distancia_km) "
+                    "VALUES (1, 'Campinas, SP', 'Santos, SP', 'sucesso', 150)")
+    conexao.commit()
+    conexao.close()
+
+    diario = DiarioCotacoes(caminho, intervalo_s=0.01)
+    diario.registrar(_cotacao('Natal, RN', 'Recife, PE', 290.0))
+    diario.fechar()
+
+    # A cotação antiga, de origem desconhecida, não aquece o cache
+    assert diario.distancias_recentes(10) == {('Natal, RN', 'Recife, PE'): 290.0}
+    assert diario.consultar().total == 2
+
+
+def test_consulta_paginada_com_filtros(tmp_path):
+    diario = DiarioCotacoes(str(tmp_path / 'diario.db'), tamanho_lote=2, intervalo_s=0.01)
+    for i in range(5):
+        diario.registrar(_cotacao('Campinas, SP', f'Destino {i}', 100.0 + i), cliente='acme' if i % 2 else None,
+                         chave_origem='campinas/sp', chave_destino=f'destino {i}/sp')
+    diario.fechar()
+
+    pagina = diario.consultar(pagina=1, por_pagina=2)
+    assert (pagina.total, pagina.paginas) == (5, 3)
+    # Da mais recente para a mais antiga
+    assert [c['destino'] for c in pagina.cotacoes] == ['Destino 4', 'Destino 3']
+    assert [c['destino'] for c in diario.consultar(pagina=3, por_pagina=2).cotacoes] == ['Destino 0']
+
+    assert diario.consultar(cliente='acme').total == 2
+    assert diario.consultar(chave_destino='destino 2/sp').cotacoes[0]['distancia_km'] == 102.0
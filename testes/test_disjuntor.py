@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from geocodificacao import Disjuntor, Geocodificador, GeocodificadorIndisponivel
+
+
+class _Provedor:
+    """Provedor que falha enquanto `falhando` for verdadeiro."""
+
+    def __init__(self):
+        self.falhando = True
+        self.consultas = 0
+
+    def geocode(self, endereco, timeout=None):
+        self.consultas += 1
+        if self.falhando:
+            raise TimeoutError("sem resposta")
+        return SimpleNamespace(latitude=-23.55, longitude=-46.63)
+
+
+def test_abre_apos_falhas_consecutivas():
+    disjuntor = Disjuntor(limite_falhas=2, tempo_aberto=60)
+    disjuntor.registrar_falha()
+    assert disjuntor.permite()
+    disjuntor.registrar_falha()
+
+    assert disjuntor.aberto
+    assert not disjuntor.permite()
+
+
+def test_sucesso_zera_as_falhas():
+    disjuntor = Disjuntor(limite_falhas=2, tempo_aberto=60)
+    disjuntor.registrar_falha()
+    disjuntor.registrar_sucesso()
+    disjuntor.registrar_falha()
+
+    assert not disjuntor.aberto
+
+
+def test_meio_aberto_libera_uma_unica_consulta_de_teste():
+    disjuntor = Disjuntor(limite_falhas=1, tempo_aberto=0.05)
+    disjuntor.registrar_falha()
+    assert not disjuntor.permite()
+
+    time.sleep(0.06)
+    assert disjuntor.permite()
+    assert not disjuntor.permite()
+
+    # Teste falhou: aberto de novo; teste bem-sucedido: fechado
+    disjuntor.registrar_falha()
+    assert not disjuntor.permite()
+    time.sleep(0.06)
+    assert disjuntor.permite()
+    disjuntor.registrar_sucesso()
+    assert not disjuntor.aberto
+    assert disjuntor.permite()
+
+
+def test_geocodificador_nao_consulta_com_disjuntor_aberto():
+    provedor = _Provedor()
+    geocodificador = Geocodificador(provedor, Disjuntor(limite_falhas=2, tempo_aberto=60))
+
+    for _ in range(3):
+        with pytest.raises(GeocodificadorIndisponivel):
+            geocodificador.localizar('Campinas, SP')
+    assert provedor.consultas == 2
+
+    # Prazo esgotado também não chega ao provedor
+    provedor.falhando = False
+    geocodificador.disjuntor.registrar_sucesso()
+    with pytest.raises(GeocodificadorIndisponivel):
+        geocodificador.localizar('Campinas, SP', prazo=time.monotonic())
+    assert geocodificador.localizar('Campinas, SP') == (-23.55, -46.63)
+    assert provedor.consultas == 3
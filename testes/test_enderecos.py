@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from enderecos import NormalizadorEnderecos
+
+
+@pytest.fixture
+def normalizador():
+    return NormalizadorEnderecos()
+
+
+@pytest.mark.parametrize('texto, cidade, uf', [
+    ('São Paulo, SP', 'São Paulo', 'SP'),
+    ('Paracatu/MG', 'Paracatu', 'MG'),
+    ('Limoeiro do Norte - CE', 'Limoeiro do Norte', 'CE'),
+    ('04538-133, São Paulo, SP', 'São Paulo', 'SP'),
+    ('Rua das Flores, 100, Campinas, SP', 'Campinas', 'SP'),
+])
+def test_cidade_e_uf_separadas(normalizador, texto, cidade, uf):
+    endereco = normalizador.normalizar(texto)
+    assert (endereco.cidade, endereco.uf) == (cidade, uf)
+
+
+@pytest.mark.parametrize('texto, cidade, uf', [
+    # Sem separador, as duas últimas letras da cidade não são uma UF
+    ('RIO DE JANEIRO', 'RIO DE JANEIRO', 'RJ'),
+    ('NATAL', 'NATAL', 'RN'),
+    ('RIO DE JANEIRO - RJ', 'RIO DE JANEIRO', 'RJ'),
+    ('JUNDIAÍ, SP', 'JUNDIAÍ', 'SP'),
+    ('PORTO ALEGRE/RS', 'PORTO ALEGRE', 'RS'),
+])
+def test_texto_em_maiusculas(normalizador, texto, cidade, uf):
+    endereco = normalizador.normalizar(texto)
+    assert (endereco.cidade, endereco.uf) == (cidade, uf)
+
+
+def test_maiusculas_sem_uf_identificavel(normalizador):
+    endereco = normalizador.normalizar('CIDADE INEXISTENTE')
+    assert endereco.cidade == 'CIDADE INEXISTENTE'
+    assert endereco.uf is None
+
+
+def test_regiao_de_cidade_em_maiusculas():
+    from geografia import REGIAO_POR_UF
+    normalizador = NormalizadorEnderecos()
+    assert REGIAO_POR_UF[normalizador.normalizar('RIO DE JANEIRO').uf] == 'Sudeste'
+    assert REGIAO_POR_UF[normalizador.normalizar('NATAL').uf] == 'Nordeste'
+
+
+def test_cache_reutiliza_registro(normalizador):
+    assert normalizador.normalizar('Campinas, SP') is normalizador.normalizar('Campinas, SP')
+
+
+@pytest.mark.parametrize('texto, destino', [
+    ('Valinhos, SP', 'valinhos'),
+    ('VALINHOS', 'valinhos'),
+    ('13270-000, Valinhos, SP', 'valinhos'),
+    ('Montes Claros/MG', 'montes claros'),
+    # Destino citado fora da cidade do endereço
+    ('Rua Valinhos, 100, São Paulo, SP', None),
+    ('Av. Montes Claros 55 - Belo Horizonte/MG', None),
+    # Cidade homônima em outra UF
+    ('Montes Claros, GO', None),
+])
+def test_destino_de_referencia_pela_cidade(normalizador, texto, destino):
+    assert normalizador.normalizar(texto).destino == destino
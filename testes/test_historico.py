@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from historico import HistoricoFretes, chave_cidade
+
+
+@pytest.fixture
+def historico():
+    return HistoricoFretes.de_dataframe(pd.DataFrame({
+        '(R$) Frete': [1000.0, 2500.0, None],
+        'Núm. Módulos': [60, None, 200],
+        'Cidade/Estado': ['Jundiaí/SP', None, 'Paracatu/MG'],
+        'Destino': ['Valinhos', 'Montes Claros', None],
+        'Data de Orçamento': ['2024-03-01', None, '2024-05-10']
+    }))
+
+
+def test_chave_cidade():
+    assert chave_cidade(' São  Paulo / SP') == 'sao paulo/sp'
+    assert chave_cidade(None) is None
+
+
+def test_colunas_ausentes_e_valores_vazios(historico):
+    assert len(historico) == 3
+    np.testing.assert_array_equal(np.isnan(historico.numericas['Peso real (kg)']), [True] * 3)
+    np.testing.assert_array_equal(historico.codigos['Cidade/Estado'], [0, -1, 1])
+    assert list(historico.destinos_referencia()) == ['valinhos', 'montes claros', None]
+
+
+def test_arquivo_mapeado_preserva_o_historico(historico, tmp_path):
+    caminho = str(tmp_path / 'historico.bin')
+    historico.salvar(caminho, impressao_dados='v1')
+    mapeado = HistoricoFretes.mapear(caminho, 'v1')
+
+    assert mapeado.vocabularios == historico.vocabularios
+    for grupo in ('numericas', 'codigos', 'datas'):
+        for coluna, valores in getattr(historico, grupo).items():
+            np.testing.assert_array_equal(getattr(mapeado, grupo)[coluna], valores)
+    # Arrays somente leitura, compartilhados entre processos
+    assert not mapeado.numericas['(R$) Frete'].flags.writeable
+
+    with pytest.raises(ValueError):
+        HistoricoFretes.mapear(caminho, 'v2')
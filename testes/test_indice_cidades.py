@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from historico import HistoricoFretes
+from indice_cidades import IndiceCidades, distancia_edicao, limite_edicoes, separar_cidade_uf
+
+
+@pytest.fixture(scope='module')
+def indice():
+    historico = HistoricoFretes.de_dataframe(pd.DataFrame({
+        '(R$) Frete': [1000.0] * 7,
+        'Cidade/Estado': ['Jundiaí/SP', 'Jundiai/SP', 'Jundiaí/SP', 'Araxá/MG', 'Cidade desconhecida/SP',
+                          'Jundiaí/MG', None]
+    }))
+    return IndiceCidades.construir(historico)
+
+
+def test_distancia_edicao():
+    assert distancia_edicao('kitten', 'sitting') == 3
+    assert distancia_edicao('araxa', 'araxa') == 0
+    # Com limite, para assim que o ultrapassa
+    assert distancia_edicao('abcdefgh', 'zzzzzzzz', limite=1) == 2
+
+
+def test_limite_edicoes_pelo_tamanho_do_nome():
+    assert [limite_edicoes(nome) for nome in ('ita', 'araxa', 'montes claros')] == [0, 1, 2]
+
+
+def test_separa_cidade_e_uf():
+    assert separar_cidade_uf('Araxá/MG') == ('araxa', 'MG')
+    assert separar_cidade_uf('Cidade desconhecida/SP') == (None, None)
+    assert separar_cidade_uf('Araxá') == (None, None)
+
+
+def test_grafias_da_mesma_uf_viram_uma_cidade(indice):
+    assert indice.nomes == ['jundiai', 'araxa', 'jundiai']
+    assert indice.ufs == ['SP', 'MG', 'MG']
+    # Jundiaí/SP e Jundiai/SP compartilham o identificador; a homônima de MG, não
+    np.testing.assert_array_equal(indice.ids_linhas, [0, 0, 0, 1, -1, 2, -1])
+    assert indice.chaves_vocabulario() == ['jundiai/sp', 'jundiai/sp', 'araxa/mg', None, 'jundiai/mg']
+
+
+def test_identifica_com_erros_de_digitacao(indice):
+    assert indice.identificar('arraxa', 'MG') == 1
+    assert indice.identificar('jundiai', 'MG') == 2
+    # Sem UF, a cidade mais frequente
+    assert indice.identificar('jundai') == 0
+    assert indice.identificar('jundiai', 'RJ') is None
+    assert indice.identificar('campinas', 'SP') is None
+
+
+def test_restaurar_mantem_as_consultas(indice):
+    restaurado = IndiceCidades.restaurar(indice.nomes, indice.ufs, indice.ids_vocabulario, indice.ids_linhas)
+    assert restaurado.identificar('arraxa', 'MG') == 1
+    assert restaurado.chaves_vocabulario() == indice.chaves_vocabulario()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+from types import SimpleNamespace
+
+import numpy as np
+
+from geografia import COORDENADAS_CAPITAIS, COORDENADAS_CIDADES, COORDENADAS_DESTINOS, distancia_haversine_km
+from indice_espacial import IndiceEspacial
+
+
+class _CidadesFalsas:
+    """Cidades canônicas mínimas: uma por origem distinta."""
+
+    def __init__(self, origens):
+        cidades = list(dict.fromkeys(origens))
+        self.nomes = [nome for nome, _ in cidades]
+        self.ufs = [uf for _, uf in cidades]
+        self.ids_linhas = np.array([cidades.index(origem) for origem in origens], dtype=np.int32)
+
+    def __len__(self):
+        return len(self.nomes)
+
+
+def _indice(origens, destinos):
+    historico = SimpleNamespace(destinos_referencia=lambda: np.array(destinos, dtype=object))
+    return IndiceEspacial.construir(historico, _CidadesFalsas(origens))
+
+
+def test_devolve_apenas_origens_dentro_do_raio():
+    indice = _indice(
+        [('campinas', 'SP'), ('santos', 'SP'), ('valinhos', 'SP'), ('recife', 'PE')],
+        ['valinhos', 'valinhos', 'valinhos', 'valinhos']
+    )
+    posicoes = indice.buscar_raio(COORDENADAS_CIDADES['campinas'], COORDENADAS_DESTINOS['valinhos'], 30)
+    assert posicoes.tolist() == [0, 2]
+
+
+def test_pontos_espelhados_nao_se_confundem():
+    # Santos e Bofete ficam a distâncias rodoviárias parecidas de Valinhos e de Montes Claros,
+    # mas a mais de 100 km uma da outra
+    bofete = (-23.102, -48.258)
+    assert distancia_haversine_km(*bofete, *COORDENADAS_CIDADES['santos']) > 100
+    indice = _indice([('santos', 'SP')], ['valinhos'])
+    assert len(indice.buscar_raio(bofete, COORDENADAS_DESTINOS['valinhos'], 30)) == 0
+
+
+def test_origem_encontra_a_si_mesma():
+    indice = _indice([('limoeiro do norte', 'CE'), ('natal', 'RN')], ['montes claros', 'montes claros'])
+    posicoes = indice.buscar_raio(COORDENADAS_CIDADES['limoeiro do norte'], COORDENADAS_DESTINOS['montes claros'], 30)
+    assert posicoes.tolist() == [0]
+
+
+def test_destino_distante_nao_retorna_fretes():
+    indice = _indice([('campinas', 'SP')], ['valinhos'])
+    assert len(indice.buscar_raio(COORDENADAS_CIDADES['campinas'], COORDENADAS_CAPITAIS['PE'], 30)) == 0
+
+
+def test_cidades_sem_posicao_ficam_fora_da_grade():
+    indice = _indice([('cidade inventada', 'SP')], ['valinhos'])
+    assert indice.celulas == {}
+    assert len(indice.buscar_raio(COORDENADAS_CIDADES['campinas'], COORDENADAS_DESTINOS['valinhos'], 30)) == 0
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import numpy as np
+import pytest
+
+from calculadora_frete import CalculadoraFrete
+from geografia import FATOR_SINUOSIDADE, distancia_haversine_km
+
+ARQUIVO_EXCEL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'Banco de Dados - Logistica.xlsx')
+
+PARACATU = (-17.22, -46.87)
+MONTES_CLAROS = (-16.735, -43.86)
+# Paracatu espelhada em relação ao eixo Valinhos–Montes Claros (perto de Ipatinga/MG)
+PARACATU_ESPELHADA = (-19.226, -42.349)
+VALINHOS = (-22.9708, -46.9958)
+
+
+@pytest.fixture(scope='module')
+def calculadora():
+    return CalculadoraFrete(ARQUIVO_EXCEL, usar_url=False, estrategia_busca="knn")
+
+
+def test_sinuosidade_so_na_distancia_em_linha_reta(calculadora):
+    indice = calculadora.indice_similaridade
+    rodoviaria = indice.buscar(PARACATU, MONTES_CLAROS, 466.0, 200, distancia_rodoviaria=True)
+    linha_reta = indice.buscar(PARACATU, MONTES_CLAROS, 466.0 / FATOR_SINUOSIDADE, 200)
+
+    assert len(rodoviaria[0]) > 0
+    np.testing.assert_array_equal(rodoviaria[0], linha_reta[0])
+    np.testing.assert_allclose(rodoviaria[1], linha_reta[1])
+
+
+def test_origem_posicionada_pelas_coordenadas(calculadora):
+    # O ponto espelhado está praticamente à mesma distância de Valinhos e de Montes Claros
+    for referencia in (VALINHOS, MONTES_CLAROS):
+        assert abs(distancia_haversine_km(*PARACATU, *referencia)
+                   - distancia_haversine_km(*PARACATU_ESPELHADA, *referencia)) < 5
+
+    indice = calculadora.indice_similaridade
+    posicoes, _ = indice.buscar(PARACATU, MONTES_CLAROS, 466.0, 200, distancia_rodoviaria=True)
+    espelhadas, _ = indice.buscar(PARACATU_ESPELHADA, MONTES_CLAROS, 466.0, 200, distancia_rodoviaria=True)
+
+    origens = calculadora.indice_cidades.ids_linhas[posicoes]
+    assert len(posicoes) > 0
+    assert {calculadora.indice_cidades.nomes[i] for i in origens} == {'paracatu'}
+    assert len(espelhadas) == 0
+
+
+def test_calculadora_informa_a_origem_da_distancia(calculadora, monkeypatch):
+    chamadas = []
+    buscar = calculadora.indice_similaridade.buscar
+
+    def espiar(*args, **kwargs):
+        chamadas.append(kwargs['distancia_rodoviaria'])
+        return buscar(*args, **kwargs)
+
+    monkeypatch.setattr(calculadora.indice_similaridade, 'buscar', espiar)
+    calculadora._cache_coordenadas.update({'Paracatu/MG': PARACATU, 'Montes Claros/MG': MONTES_CLAROS,
+                                           'Unaí, MG': (-16.36, -46.9)})
+
+    # Rota do histórico: distância rodoviária registrada
+    calculadora.calcular_frete('Paracatu/MG', 'Montes Claros/MG', 200)
+    # Rota nova: distância em linha reta entre as coordenadas
+    calculadora.calcular_frete('Unaí, MG', 'Montes Claros/MG', 200)
+
+    assert chamadas == [True, False]
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import calculadora_frete
+import instantaneo
+from calculadora_frete import CalculadoraFrete
+from historico import HistoricoFretes
+
+ARQUIVO_EXCEL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'Banco de Dados - Logistica.xlsx')
+
+
+@pytest.fixture
+def arquivos(tmp_path):
+    """Cópia da planilha (para poder alterá-la) e os caminhos do histórico e do instantâneo."""
+    excel = tmp_path / 'dados.xlsx'
+    shutil.copyfile(ARQUIVO_EXCEL, excel)
+    return str(excel), str(tmp_path / 'historico.bin'), str(tmp_path / 'instantaneo.bin')
+
+
+def _calculadora(arquivos):
+    excel, historico, arquivo_instantaneo = arquivos
+    return CalculadoraFrete(excel, usar_url=False, arquivo_historico=historico, arquivo_instantaneo=arquivo_instantaneo)
+
+
+def test_instantaneo_restaura_o_estado(arquivos):
+    original = _calculadora(arquivos)
+    original._cache_coordenadas['Rua Teste, Campinas, SP'] = (-22.9, -47.06)
+    assert original.salvar_instantaneo()
+
+    estado = instantaneo.carregar(arquivos[2], original.impressao_dados)
+    assert len(estado.historico) == len(original.historico)
+    np.testing.assert_array_equal(estado.historico.numericas['(R$) Frete'], original.historico.numericas['(R$) Frete'])
+    assert estado.indice_cidades.nomes == original.indice_cidades.nomes
+    assert estado.distancias_rotas.distancias == original.distancias_rotas.distancias
+    assert estado.coordenadas['Rua Teste, Campinas, SP'] == (-22.9, -47.06)
+
+    restaurada = _calculadora(arquivos)
+    assert restaurada.instantaneo_restaurado
+    assert (restaurada.calcular_frete('Paracatu/MG', 'Montes Claros/MG', 200)['valor_estimado']
+            == original.calcular_frete('Paracatu/MG', 'Montes Claros/MG', 200)['valor_estimado'])
+
+
+def test_planilha_alterada_descarta_instantaneo_e_historico(arquivos):
+    excel, arquivo_historico, arquivo_instantaneo = arquivos
+    _calculadora(arquivos).salvar_instantaneo()
+    impressao_antiga = CalculadoraFrete._impressao_arquivo(excel)
+
+    estatisticas = os.stat(excel)
+    os.utime(excel, ns=(estatisticas.st_atime_ns, estatisticas.st_mtime_ns + 10**9))
+    impressao_nova = CalculadoraFrete._impressao_arquivo(excel)
+    with pytest.raises(ValueError):
+        instantaneo.carregar(arquivo_instantaneo, impressao_nova)
+    with pytest.raises(ValueError):
+        HistoricoFretes.mapear(arquivo_historico, impressao_nova)
+
+    calculadora = _calculadora(arquivos)
+    assert not calculadora.instantaneo_restaurado
+    assert calculadora.impressao_dados == impressao_nova != impressao_antiga
+    # O histórico foi refeito a partir da planilha atual
+    HistoricoFretes.mapear(arquivo_historico, impressao_nova)
+
+
+def test_url_verificada_em_segundo_plano_depois_da_restauracao(arquivos, monkeypatch):
+    excel, arquivo_historico, arquivo_instantaneo = arquivos
+    _calculadora(arquivos).salvar_instantaneo()
+    with open(excel, 'rb') as arquivo:
+        conteudo = arquivo.read()
+    resposta = SimpleNamespace(headers={'ETag': '"v2"'}, content=conteudo, raise_for_status=lambda: None)
+    liberar_head = threading.Event()
+
+    def head(*args, **kwargs):
+        # A consulta só responde depois de a inicialização terminar
+        assert liberar_head.wait(10)
+        return resposta
+
+    monkeypatch.setattr(calculadora_frete.requests, 'head', head)
+    monkeypatch.setattr(calculadora_frete.requests, 'get', lambda *args, **kwargs: resposta)
+    calculadora = CalculadoraFrete(excel, usar_url=True, arquivo_historico=arquivo_historico,
+                                   arquivo_instantaneo=arquivo_instantaneo)
+    assert calculadora.instantaneo_restaurado
+    assert calculadora.calcular_frete('Paracatu/MG', 'Montes Claros/MG', 200)['status'] == 'sucesso'
+
+    liberar_head.set()
+    calculadora.verificacao_dados.join(10)
+    # Planilha alterada: histórico, índices e instantâneo refeitos a partir da URL
+    assert not calculadora.instantaneo_restaurado
+    assert calculadora.impressao_dados == 'url:"v2"'
+    HistoricoFretes.mapear(arquivo_historico, 'url:"v2"')
+    assert instantaneo.carregar(arquivo_instantaneo, 'url:"v2"').impressao_dados == 'url:"v2"'
+    assert calculadora.calcular_frete('Paracatu/MG', 'Montes Claros/MG', 200)['status'] == 'sucesso'
+
+
+def test_gravacao_vencida(tmp_path):
+    caminho = tmp_path / 'instantaneo.bin'
+    assert instantaneo.gravacao_vencida(str(caminho))
+    caminho.write_bytes(b'')
+    assert not instantaneo.gravacao_vencida(str(caminho))
+    assert instantaneo.gravacao_vencida(str(caminho), intervalo_s=0)
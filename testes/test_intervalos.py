@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from intervalos import MINIMO_FRETES, percentis_lote
+
+VALORES = np.linspace(800.0, 1200.0, 40)
+
+
+def test_percentis_em_torno_da_media():
+    razoes, = percentis_lote([(VALORES, None)], orcamento_s=10)
+
+    p10, p50, p90 = razoes
+    assert p10 < p50 < p90
+    assert 0.9 < p10 < 1.0 < p90 < 1.1
+
+
+def test_mesma_cotacao_mesmo_intervalo_sozinha_ou_no_lote():
+    sozinha, = percentis_lote([(VALORES, None)], orcamento_s=10)
+    outras = [(np.linspace(100.0, 300.0, n), None) for n in (5, 60, 250)]
+    no_lote = percentis_lote(outras + [(VALORES, None)], orcamento_s=10)
+
+    np.testing.assert_array_equal(no_lote[-1], sozinha)
+
+
+def test_poucos_fretes_ficam_sem_intervalo():
+    razoes = percentis_lote([(VALORES[:MINIMO_FRETES - 1], None), ([1000.0, np.nan, 1100.0], None)],
+                            orcamento_s=10)
+    assert razoes == [None, None]
+
+
+def test_pesos_e_media_aparada():
+    pesos = np.r_[np.ones(20), np.zeros(20)]
+    ponderada, = percentis_lote([(VALORES, pesos)], orcamento_s=10)
+    aparada, = percentis_lote([(VALORES, None)], fracao_aparada=0.1, orcamento_s=10)
+
+    assert ponderada is not None and aparada is not None
+    assert ponderada[0] < 1.0 < ponderada[2]
+    assert aparada[0] < 1.0 < aparada[2]
+
+
+def test_orcamento_esgotado():
+    assert percentis_lote([(VALORES, None)], orcamento_s=0) == [None]
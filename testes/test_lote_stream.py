@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+"""Estado do micro-lote de calcular_fretes_stream isolado das demais cotações."""
+
+import os
+import threading
+
+from calculadora_frete import CalculadoraFrete
+from geocodificacao import Geocodificador
+
+ARQUIVO_EXCEL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'Banco de Dados - Logistica.xlsx')
+
+REQUISICAO = dict(origem='Paracatu/MG', destino='Montes Claros/MG', num_modulos=200)
+
+
+def test_cotacao_concorrente_nao_entra_no_lote_do_stream():
+    calculadora = CalculadoraFrete(ARQUIVO_EXCEL, usar_url=False, intervalos=True)
+    dentro_do_lote, liberar = threading.Event(), threading.Event()
+    precificar_curtos_lote = calculadora._precificar_curtos_lote
+
+    def precificar_e_esperar(lote):
+        # Segura a thread do stream com o estado do lote ativo
+        dentro_do_lote.set()
+        liberar.wait(10)
+        return precificar_curtos_lote(lote)
+
+    calculadora._precificar_curtos_lote = precificar_e_esperar
+    resultados_stream = []
+    thread = threading.Thread(target=lambda: resultados_stream.extend(calculadora.calcular_fretes_stream([REQUISICAO])))
+    thread.start()
+    try:
+        assert dentro_do_lote.wait(10)
+        # Lido antes de o lote terminar: um intervalo pendente no lote só seria preenchido depois
+        p10_avulsa = calculadora.calcular_frete(**REQUISICAO)['valor_p10']
+    finally:
+        liberar.set()
+        thread.join(10)
+
+    # A cotação avulsa recebe o próprio intervalo, em vez de ficar pendente no lote do stream
+    assert p10_avulsa is not None
+    assert resultados_stream[0]['valor_p10'] == p10_avulsa
+
+
+def test_estado_do_lote_nao_atravessa_o_yield():
+    calculadora = CalculadoraFrete(ARQUIVO_EXCEL, usar_url=False, intervalos=True)
+    stream = calculadora.calcular_fretes_stream([REQUISICAO, REQUISICAO], tamanho_lote=1)
+
+    next(stream)
+    # Gerador suspenso entre lotes: cotações avulsas seguem fora do lote
+    assert calculadora.calcular_frete(**REQUISICAO)['valor_p10'] is not None
+    assert next(stream)['valor_p10'] is not None
+
+
+class _ProvedorSemResultados:
+    """Provedor que não encontra nenhum endereço."""
+
+    def __init__(self):
+        self.consultas = 0
+
+    def geocode(self, endereco, timeout=None):
+        self.consultas += 1
+        return None
+
+
+def test_endereco_nao_encontrado_consultado_uma_vez_por_lote():
+    calculadora = CalculadoraFrete(ARQUIVO_EXCEL, usar_url=False)
+    provedor = _ProvedorSemResultados()
+    calculadora.geocodificador = Geocodificador(provedor)
+    requisicao = dict(origem='Rua Inexistente 1, Lugar Nenhum', destino='Avenida Fictícia 2, Parte Alguma',
+                      num_modulos=10)
+
+    resultados = list(calculadora.calcular_fretes_stream([requisicao] * 3))
+
+    assert [resultado['status'] for resultado in resultados] == ['erro'] * 3
+    # Origem e destino consultados uma única vez, pelo stream, para as três cotações
+    assert provedor.consultas == 2
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+"""Orçamento de geocodificação por cotação (rotas conhecidas não consultam o provedor)."""
+
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import calculadora_frete
+from calculadora_frete import CalculadoraFrete
+
+ARQUIVO_EXCEL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'Banco de Dados - Logistica.xlsx')
+
+
+class _GeocodificadorLento:
+    """Provedor que só responde ao fim do timeout recebido, registrando cada consulta."""
+
+    def __init__(self):
+        self.consultas = []
+
+    def geocode(self, endereco, timeout=None):
+        self.consultas.append(endereco)
+        time.sleep(timeout)
+        return SimpleNamespace(latitude=-23.55, longitude=-46.63)
+
+
+@pytest.fixture(params=["filtros", "knn"])
+def calculadora(request):
+    calculadora = CalculadoraFrete(ARQUIVO_EXCEL, usar_url=False, estrategia_busca=request.param)
+    calculadora.geolocator = _GeocodificadorLento()
+    calculadora.geocodificador.geolocator = calculadora.geolocator
+    return calculadora
+
+
+def test_rota_conhecida_nao_consulta_o_geocodificador(calculadora):
+    resultado = calculadora.calcular_frete('Paracatu/MG', 'Montes Claros/MG', 200)
+
+    assert resultado['status'] == 'sucesso'
+    assert resultado['distancia_km'] == 466.0
+    assert calculadora.geolocator.consultas == []
+
+
+def test_rota_nova_respeita_o_orcamento_da_cotacao(calculadora, monkeypatch):
+    monkeypatch.setattr(calculadora_frete, 'ORCAMENTO_COTACAO_S', 1.0)
+
+    inicio = time.monotonic()
+    calculadora.calcular_frete('Chapecó, SC', 'Palmas, TO', 100)
+
+    assert time.monotonic() - inicio < 1.5
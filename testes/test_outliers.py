@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from outliers import mascara_fretes_tipicos
+
+
+def test_descarta_valores_invalidos():
+    mascara = mascara_fretes_tipicos([1000.0, 0.0, -5.0, np.nan], [100.0] * 4, [60.0] * 4)
+    np.testing.assert_array_equal(mascara, [True, False, False, False])
+
+
+def test_valor_destoante_do_segmento():
+    fretes = [1000.0, 1100.0, 950.0, 1050.0, 1000.0, 100000.0]
+    mascara = mascara_fretes_tipicos(fretes, [80.0] * 6, [60.0] * 6)
+    np.testing.assert_array_equal(mascara, [True] * 5 + [False])
+
+
+def test_frete_caro_e_tipico_entre_os_de_longa_distancia():
+    # Curtos baratos e longos caros: cada grupo é comparado à sua própria mediana
+    fretes = [1000.0, 1100.0, 950.0, 1050.0, 1000.0] + [30000.0, 32000.0, 29000.0, 31000.0, 30500.0]
+    distancias = [30.0] * 5 + [1500.0] * 5
+    mascara = mascara_fretes_tipicos(fretes, distancias, [60.0] * 10)
+    assert mascara.all()
+
+
+def test_segmento_pequeno_usa_a_faixa_de_modulos():
+    # O único frete de longa distância não tem segmento próprio: vale a faixa de módulos inteira
+    fretes = [1000.0, 1100.0, 950.0, 1050.0, 1000.0, 100000.0]
+    distancias = [30.0] * 5 + [1500.0]
+    mascara = mascara_fretes_tipicos(fretes, distancias, [60.0] * 6)
+    assert not mascara[-1]
+
+
+def test_valores_repetidos_nao_tornam_atipica_uma_diferenca_pequena():
+    # MAD zero: a escala mínima evita que qualquer desvio vire outlier
+    fretes = [1000.0] * 9 + [2000.0]
+    mascara = mascara_fretes_tipicos(fretes, [80.0] * 10, [60.0] * 10)
+    assert mascara.all()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from calculadora_frete import POLITICA_PADRAO
+from politica_precos import (ARQUIVO_POLITICA, CODIGO_DESCONHECIDO, FontePolitica, PoliticaPrecos, carregar_tabelas,
+                             codigo_localidade)
+
+
+def _gravar(caminho, conteudo, mtime_ns=None):
+    caminho.write_text(json.dumps(conteudo), encoding='utf-8')
+    if mtime_ns is not None:
+        os.utime(caminho, ns=(mtime_ns, mtime_ns))
+
+
+def test_padrao_vem_do_arquivo_distribuido():
+    with open(ARQUIVO_POLITICA, encoding='utf-8') as arquivo:
+        conteudo = json.load(arquivo)
+    conteudo.pop('versao')
+
+    assert carregar_tabelas() == conteudo
+    assert POLITICA_PADRAO == conteudo
+
+
+def test_consultas_por_faixa():
+    politica = PoliticaPrecos(POLITICA_PADRAO)
+    faixas = politica.distancia
+
+    # Limite superior exclusivo: 50 km já é a faixa 50-100
+    np.testing.assert_array_equal(faixas.indices([0, 49.9, 50, 5000]), [0, 1, 2, len(faixas.inicios) - 1])
+    # Sem quantidade, só a distância
+    assert politica.valor_referencia(30) == faixas.valores['valor_medio'][1]
+    valores = politica.valor_referencia(np.array([30.0, 30.0]), np.array([np.nan, 75.0]))
+    assert valores[0] == faixas.valores['valor_medio'][1]
+    assert valores[1] != valores[0]
+
+
+def test_multiplicadores_por_localidade():
+    politica = PoliticaPrecos(POLITICA_PADRAO)
+    sp, mg = codigo_localidade('SP'), codigo_localidade('MG')
+
+    assert codigo_localidade(None) == CODIGO_DESCONHECIDO
+    assert politica.multiplicador_regional(CODIGO_DESCONHECIDO, sp) == 1.0
+    # Dentro do Sudeste vale o multiplicador por distância
+    assert politica.multiplicador(sp, mg, 30) == politica.multiplicador_distancia_sudeste(30)
+
+
+@pytest.mark.parametrize('alteracao', [
+    {'margem_adicional': 1.5},
+    {'valor_medio_frete_curto': -1},
+    {'valores_referencia_distancia': {'10-50': {'valor_medio': 1, 'valor_por_km': 1},
+                                      '50+': {'valor_medio': 1, 'valor_por_km': 1}}},
+    {'valores_referencia_distancia': {'0-10': {'valor_medio': 1, 'valor_por_km': 1},
+                                      '20+': {'valor_medio': 1, 'valor_por_km': 1}}},
+    {'valores_referencia_distancia': {'0-10': {'valor_medio': 1, 'valor_por_km': 1},
+                                      '10-50': {'valor_medio': 1, 'valor_por_km': 1}}},
+    {'valores_referencia_distancia': {'0-10': {'valor_medio': 1}, '10+': {'valor_medio': 1, 'valor_por_km': 1}}},
+    {'multiplicadores_regionais': {'Sul->Marte': 1.2}},
+    {'multiplicadores_uf': {'SP->MG': 0}},
+    {'multiplicadores_uf': []},
+    {'multiplicadores_regionais': 1.2},
+    {'multiplicadores_distancia_sudeste': ['0-10', '10+']},
+])
+def test_tabela_invalida(alteracao):
+    with pytest.raises(ValueError):
+        PoliticaPrecos({**POLITICA_PADRAO, **alteracao})
+
+
+def test_chave_desconhecida_no_arquivo(tmp_path):
+    caminho = tmp_path / 'politica.json'
+    _gravar(caminho, {'margem_adcional': 0.2})
+    with pytest.raises(ValueError):
+        PoliticaPrecos.carregar(str(caminho), POLITICA_PADRAO)
+
+
+def test_recarrega_o_arquivo_alterado(tmp_path):
+    caminho = tmp_path / 'politica.json'
+    _gravar(caminho, {'versao': 'v1', 'margem_adicional': 0.1}, mtime_ns=10**18)
+    fonte = FontePolitica(str(caminho), POLITICA_PADRAO, intervalo=0)
+    assert fonte.atual().versao == 'v1'
+
+    _gravar(caminho, {'versao': 'v2', 'margem_adicional': 0.2}, mtime_ns=2 * 10**18)
+    politica = fonte.atual()
+    assert (politica.versao, politica.margem_adicional) == ('v2', 0.2)
+
+
+def test_recarga_invalida_mantem_a_politica_vigente(tmp_path):
+    caminho = tmp_path / 'politica.json'
+    _gravar(caminho, {'versao': 'v1'}, mtime_ns=10**18)
+    fonte = FontePolitica(str(caminho), POLITICA_PADRAO, intervalo=0)
+
+    _gravar(caminho, {'versao': 'v2', 'margem_adicional': 'alta'}, mtime_ns=2 * 10**18)
+    assert fonte.atual().versao == 'v1'
+    caminho.write_text('{', encoding='utf-8')
+    assert fonte.atual().versao == 'v1'
+
+
+def test_recarga_com_tabela_de_tipo_errado_mantem_a_politica_vigente(tmp_path):
+    caminho = tmp_path / 'politica.json'
+    _gravar(caminho, {'versao': 'v1'}, mtime_ns=10**18)
+    fonte = FontePolitica(str(caminho), POLITICA_PADRAO, intervalo=0)
+
+    _gravar(caminho, {'versao': 'v2', 'multiplicadores_uf': []}, mtime_ns=2 * 10**18)
+    assert fonte.atual().versao == 'v1'
+    # Corrigido o arquivo, a nova versão é carregada
+    _gravar(caminho, {'versao': 'v3'}, mtime_ns=3 * 10**18)
+    assert fonte.atual().versao == 'v3'
+
+
+def test_sem_arquivo_usa_o_padrao(tmp_path):
+    fonte = FontePolitica(str(tmp_path / 'ausente.json'), POLITICA_PADRAO, intervalo=0)
+    assert fonte.atual().margem_adicional == POLITICA_PADRAO['margem_adicional']
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pandas as pd
+import pytest
+
+import reprecificacao
+from calculadora_frete import CalculadoraFrete
+
+ARQUIVO_EXCEL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'Banco de Dados - Logistica.xlsx')
+
+
+@pytest.fixture
+def calculadora(monkeypatch):
+    calculadora = CalculadoraFrete(ARQUIVO_EXCEL, usar_url=False)
+    monkeypatch.setattr(reprecificacao, '_calculadora', calculadora)
+    return calculadora
+
+
+LOTE = pd.DataFrame({
+    'origem': ['Paracatu/MG', 'Paracatu/MG', 'Paracatu/MG'],
+    'destino': ['Montes Claros/MG', 'Montes Claros/MG', 'Montes Claros/MG'],
+    'modulos': ['200', 'duzentos', '100']
+}, index=[10, 11, 12])
+
+
+def test_linha_invalida_nao_derruba_o_lote(calculadora):
+    saida = reprecificacao._precificar_lote(LOTE)
+
+    assert list(saida.index) == [10, 11, 12]
+    assert list(saida['status']) == ['sucesso', 'erro', 'sucesso']
+    assert 'duzentos' in saida.loc[11, 'mensagem']
+
+
+def test_falha_no_calculo_afeta_so_a_cotacao(calculadora, monkeypatch):
+    calcular_frete = calculadora.calcular_frete
+
+    def falhar_com_100_modulos(**requisicao):
+        if requisicao['num_modulos'] == 100:
+            raise RuntimeError("falha simulada")
+        return calcular_frete(**requisicao)
+
+    monkeypatch.setattr(calculadora, 'calcular_frete', falhar_com_100_modulos)
+    lote = LOTE.assign(modulos=['200', '100', '300'])
+    saida = reprecificacao._precificar_lote(lote)
+
+    assert list(saida['status']) == ['sucesso', 'erro', 'sucesso']
+    assert saida.loc[12, 'valor_estimado'] > 0
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import numpy as np
+import pytest
+
+import resultado_cotacao
+from resultado_cotacao import CAMPOS_RESULTADO, LoteResultados, ResultadoCotacao
+
+
+def _resultado(**campos):
+    return ResultadoCotacao(origem='Paracatu/MG', destino='Montes Claros/MG', status='sucesso', mensagem='ok',
+                            valor_estimado=1234.5, distancia_km=466.0, **campos)
+
+
+def test_acesso_por_chave_como_dicionario():
+    resultado = _resultado(fretes_base=12)
+
+    assert resultado['valor_estimado'] == 1234.5
+    assert resultado.get('distancia_km') == 466.0
+    assert resultado.get('inexistente', 'padrao') == 'padrao'
+    assert 'fretes_base' in resultado
+    with pytest.raises(KeyError):
+        resultado['inexistente']
+
+
+def test_campos_opcionais_ausentes_ficam_fora_do_dicionario():
+    resultado = _resultado()
+
+    assert 'fretes_base' not in resultado
+    assert resultado.get('valor_p10') is None
+    with pytest.raises(KeyError):
+        resultado['valor_p10']
+    assert set(resultado.to_dict()) == set(CAMPOS_RESULTADO) - {'fretes_base', 'valor_p10', 'valor_p50',
+                                                                 'valor_p90', 'id_cotacao'}
+    assert dict(resultado.to_dict()) == {chave: resultado[chave] for chave in resultado.keys()}
+
+
+def test_json_do_resultado():
+    dados = json.loads(_resultado(valor_p10=np.float64(1000.0)).to_json())
+
+    assert dados['valor_estimado'] == 1234.5
+    assert dados['valor_p10'] == 1000.0
+    assert 'fretes_base' not in dados
+
+
+def test_lote_colunar_reconstroi_os_resultados():
+    resultados = [_resultado(fretes_base=3, valor_p10=1000.0, valor_p50=1200.0, valor_p90=1400.0),
+                  ResultadoCotacao(origem='X', destino='Y')]
+    lote = LoteResultados.de_resultados(resultados)
+
+    assert len(lote) == 2
+    assert list(lote) == resultados
+    assert lote.to_dict()['fretes_base'] == [3, None]
+    assert list(lote.para_dataframe(['status', 'valor_estimado']).columns) == ['status', 'valor_estimado']
+    assert json.loads(lote.to_json())['valor_p10'][0] == 1000.0
+
+
+@pytest.mark.parametrize('com_orjson', [True, False])
+def test_json_do_lote_nao_depende_do_orjson(monkeypatch, com_orjson):
+    if com_orjson and resultado_cotacao.orjson is None:
+        pytest.skip("orjson não instalado")
+    if not com_orjson:
+        monkeypatch.setattr(resultado_cotacao, 'orjson', None)
+    lote = LoteResultados.de_resultados([_resultado(fretes_base=3), _resultado()])
+
+    dados = json.loads(lote.to_json())
+    assert dados['fretes_base'] == [3, None]
+    assert type(dados['fretes_base'][0]) is int
+    assert dados['valor_p10'] == [None, None]